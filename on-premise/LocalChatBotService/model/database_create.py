@@ -1,15 +1,17 @@
 import os
 from PyPDF2 import PdfReader
-from langchain.text_splitter import CharacterTextSplitter
 from langchain.schema import Document  # Import Document class
 from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
+# Shared chunker: QdrantRagService/chunking.py, on PYTHONPATH in the image
+from chunking import SemanticChunker, tiktoken_counter
 
 load_dotenv()
 
 # Directories
 current_dir = os.path.dirname(os.path.abspath(__file__))
+
 pdf_dir = os.path.join(current_dir, "db_pdf")
 db_dir = os.path.join(current_dir, "db")
 persistent_directory = os.path.join(db_dir, "chroma_db_with_metadata")
@@ -35,16 +37,24 @@ if not os.path.exists(persistent_directory):
 
         # Extract text from the PDF file
         reader = PdfReader(file_path)
-        pdf_text = ""
-        for page in reader.pages:
-            pdf_text += page.extract_text()
+        pdf_text = "\n\n".join(page.extract_text() for page in reader.pages)
 
         # Add the extracted text as a Document with metadata
         documents.append(Document(page_content=pdf_text, metadata={"source": book_file}))
 
-    # Split the documents into chunks
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-    docs = text_splitter.split_documents(documents)
+    # Split the documents into token-limited chunks along headings, paragraphs and sentences
+    chunker = SemanticChunker(
+        int(os.getenv("CHUNK_MAX_TOKENS", "256")),
+        int(os.getenv("CHUNK_OVERLAP_TOKENS", "32")),
+        tiktoken_counter()
+    )
+    docs = []
+    for document in documents:
+        for index, chunk in enumerate(chunker.split(document.page_content)):
+            metadata = dict(document.metadata, chunk_index=index, char_start=chunk.char_start, char_end=chunk.char_end)
+            if chunk.section:
+                metadata["section"] = chunk.section
+            docs.append(Document(page_content=chunk.text, metadata=metadata))
     print("\n--- Document Chunks Information ---")
     print(f"Number of document chunks: {len(docs)}")
 
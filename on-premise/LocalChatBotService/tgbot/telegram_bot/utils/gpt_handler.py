@@ -1,7 +1,6 @@
 import os
 
 from PyPDF2 import PdfReader
-from langchain.text_splitter import CharacterTextSplitter
 from langchain.schema import Document  # Import Document class
 from langchain_community.vectorstores import Chroma
 
@@ -11,6 +10,13 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
+# Shared chunker: QdrantRagService/chunking.py, on PYTHONPATH in the image
+from chunking import SemanticChunker, tiktoken_counter
+
+# OpenAI embedding models use the cl100k_base tokenizer
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
 
 class GPTHandler:
     def __init__(self, persistent_directory: str, pdf_directory: str, embedding_model: str, chat_model: str, system_prompt: str, contextualization_prompt: str, k: int = 1):
@@ -130,16 +136,23 @@ class GPTHandler:
 
             # Extract text from the PDF file
             reader = PdfReader(file_path)
-            pdf_text = "".join(page.extract_text() for page in reader.pages)
+            pdf_text = "\n\n".join(page.extract_text() for page in reader.pages)
 
             # Add the extracted text as a Document with metadata
             documents.append(Document(page_content=pdf_text, metadata={"source": pdf_file}))
         return documents
 
     def split_documents(self, documents):
-        """Splits documents into chunks."""
-        text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-        return text_splitter.split_documents(documents)
+        """Splits documents into token-limited chunks along headings, paragraphs and sentences."""
+        chunker = SemanticChunker(CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, tiktoken_counter())
+        docs = []
+        for document in documents:
+            for index, chunk in enumerate(chunker.split(document.page_content)):
+                metadata = dict(document.metadata, chunk_index=index, char_start=chunk.char_start, char_end=chunk.char_end)
+                if chunk.section:
+                    metadata["section"] = chunk.section
+                docs.append(Document(page_content=chunk.text, metadata=metadata))
+        return docs
 
     def create_and_persist_vector_store(self, docs):
         """Creates and persists the vector store."""
@@ -0,0 +1,47 @@
+import os
+import re
+import zlib
+from collections import Counter
+
+from qdrant_client.models import SparseVector
+
+# Имя sparse-вектора в коллекции; IDF считает Qdrant (Modifier.IDF), здесь только TF-часть BM25
+SPARSE_VECTOR_NAME = "bm25"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Средняя длина чанка в токенах (чанк ~1000 символов)
+BM25_AVG_DOC_LENGTH = float(os.getenv("BM25_AVG_DOC_LENGTH", "150"))
+
+# Слова и составные коды вроде "CSS-301", "F-104", "1.2"
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*", re.UNICODE)
+PART_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    """Токены в нижнем регистре; составной код даёт и себя целиком, и свои части"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(PART_PATTERN.findall(token))
+    return tokens
+
+
+def token_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def document_sparse_vector(text: str) -> SparseVector:
+    """TF-компонента BM25 с нормализацией по длине документа"""
+    tokens = tokenize(text)
+    counts = Counter(token_index(token) for token in tokens)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LENGTH)
+    indices = list(counts)
+    values = [tf * (BM25_K1 + 1) / (tf + length_norm) for tf in counts.values()]
+    return SparseVector(indices=indices, values=values)
+
+
+def query_sparse_vector(text: str) -> SparseVector:
+    indices = sorted({token_index(token) for token in tokenize(text)})
+    return SparseVector(indices=indices, values=[1.0] * len(indices))
@@ -0,0 +1,219 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+# Считает токены для пачки текстов; пачкой быстрее, чем по одному (fast-токенизаторы HF, tiktoken)
+TokenCounter = Callable[[List[str]], List[int]]
+
+MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+# "1. Введение", "2.3 Registration rules" - короткая нумерованная строка без точки в конце
+NUMBERED_HEADING = re.compile(r"^\d+(\.\d+)*\.?\s+\S.{0,78}[^.;:,]$")
+# Закрывающие кавычки и скобки остаются в конце предложения (группа 1)
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])([\"»)\]]*)\s+")
+WORD = re.compile(r"\S+\s*")
+APPROXIMATE_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def approximate_token_counter(texts: List[str]) -> List[int]:
+    """Грубая оценка без токенизатора: слова и знаки препинания"""
+    return [len(APPROXIMATE_TOKEN.findall(text)) for text in texts]
+
+
+def hf_token_counter(model_name: str) -> TokenCounter:
+    """Точный счётчик по токенизатору модели эмбеддингов (без служебных токенов)"""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    return count
+
+
+def tiktoken_counter(encoding_name: str = "cl100k_base") -> TokenCounter:
+    """Счётчик для моделей OpenAI (text-embedding-ada-002 использует cl100k_base)"""
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda texts: [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+
+def is_heading(line: str) -> bool:
+    if MARKDOWN_HEADING.match(line):
+        return True
+    if len(line) > 80:
+        return False
+    if NUMBERED_HEADING.match(line):
+        return True
+    # Строка заглавными буквами: "ПРАВИЛА ПРОЖИВАНИЯ В ОБЩЕЖИТИИ"
+    return len(line) >= 4 and line.isupper() and sum(char.isalpha() for char in line) >= 3
+
+
+@dataclass
+class Segment:
+    start: int
+    end: int
+    tokens: int
+    heading: bool = False
+
+
+@dataclass
+class TextChunk:
+    text: str
+    char_start: int
+    char_end: int
+    token_count: int
+    section: Optional[str] = None
+
+
+class SemanticChunker:
+    """Разбиение текста по заголовкам, абзацам и предложениям с лимитом в токенах
+
+    Абзац, который не помещается в лимит, режется по предложениям, предложение - по словам.
+    Сегменты жадно упаковываются в чанки до max_tokens; следующий чанк начинается с последних
+    сегментов предыдущего общим размером до overlap_tokens. Заголовок всегда начинает новый чанк,
+    и перекрытие через границу раздела не переносится. Размер чанка - сумма токенов сегментов:
+    на границах по пробелам токенизаторы моделей эмбеддингов практически аддитивны.
+    """
+
+    def __init__(self, max_tokens: int = 126, overlap_tokens: int = 16, token_counter: TokenCounter = None):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = token_counter or approximate_token_counter
+
+    def blocks(self, text: str) -> Iterator[tuple]:
+        """Абзацы и заголовки как (start, end, is_heading) без краевых пробелов"""
+        position = 0
+        paragraph_start = paragraph_end = None
+        for line in text.splitlines(keepends=True):
+            line_start = position
+            position += len(line)
+            stripped = line.strip()
+            if not stripped:
+                if paragraph_start is not None:
+                    yield paragraph_start, paragraph_end, False
+                    paragraph_start = None
+                continue
+
+            start = line_start + len(line) - len(line.lstrip())
+            end = line_start + len(line.rstrip())
+            if is_heading(stripped):
+                if paragraph_start is not None:
+                    yield paragraph_start, paragraph_end, False
+                    paragraph_start = None
+                yield start, end, True
+                continue
+
+            if paragraph_start is None:
+                paragraph_start = start
+            paragraph_end = end
+
+        if paragraph_start is not None:
+            yield paragraph_start, paragraph_end, False
+
+    def split_spans(self, text: str, start: int, end: int, pattern: re.Pattern) -> List[tuple]:
+        spans = []
+        for match in pattern.finditer(text, start, end):
+            spans.append((match.start(), match.end()))
+        return spans
+
+    def fit(self, text: str, spans: List[tuple], level: int) -> List[Segment]:
+        """Сегменты, каждый не больше max_tokens; слишком длинные режутся на следующем уровне"""
+        counts = self.count_tokens([text[start:end] for start, end in spans])
+        segments = []
+        for (start, end), tokens in zip(spans, counts):
+            if tokens <= self.max_tokens:
+                segments.append(Segment(start, end, tokens))
+            elif level == 0:
+                sentences = []
+                sentence_start = start
+                for match in SENTENCE_BOUNDARY.finditer(text, start, end):
+                    sentences.append((sentence_start, match.end(1)))
+                    sentence_start = match.end()
+                if sentence_start < end:
+                    sentences.append((sentence_start, end))
+                segments.extend(self.fit(text, sentences, 1))
+            elif level == 1:
+                words = [(s, len(text[s:e].rstrip()) + s) for s, e in self.split_spans(text, start, end, WORD)]
+                segments.extend(self.fit(text, words, 2))
+            else:
+                # Одно "слово" длиннее лимита (base64, длинный URL): режем по символам
+                step = max(1, (end - start) * self.max_tokens // (tokens + 1))
+                pieces = [(s, min(s + step, end)) for s in range(start, end, step)]
+                segments.extend(
+                    Segment(s, e, n) for (s, e), n in zip(pieces, self.count_tokens([text[s:e] for s, e in pieces]))
+                )
+        return segments
+
+    def segments(self, text: str) -> Iterator[Segment]:
+        blocks = list(self.blocks(text))
+        paragraphs = [(start, end) for start, end, heading in blocks if not heading]
+        fitted = iter(self.fit(text, paragraphs, 0))
+        heading_counts = iter(self.count_tokens([text[start:end] for start, end, heading in blocks if heading]))
+
+        # fit сохраняет порядок, поэтому сегменты абзацев раскладываются обратно между заголовками
+        pending = next(fitted, None)
+        for start, end, heading in blocks:
+            if heading:
+                yield Segment(start, end, min(next(heading_counts), self.max_tokens), heading=True)
+                continue
+            while pending is not None and pending.start < end:
+                yield pending
+                pending = next(fitted, None)
+
+    def split(self, text: str) -> List[TextChunk]:
+        chunks = []
+        current: List[Segment] = []
+        current_tokens = 0
+        fresh = 0  # сегменты текущего чанка, не перенесённые из предыдущего
+        section = None
+        chunk_section = None
+
+        def emit():
+            start, end = current[0].start, current[-1].end
+            chunks.append(TextChunk(text[start:end], start, end, current_tokens, chunk_section))
+
+        for segment in self.segments(text):
+            if segment.heading:
+                if current and not all(item.heading for item in current):
+                    if fresh:
+                        emit()
+                    current, current_tokens, fresh = [], 0, 0
+                section = text[segment.start:segment.end].lstrip("#").strip()
+                chunk_section = section
+                if current_tokens + segment.tokens > self.max_tokens:
+                    if fresh:
+                        emit()
+                    current, current_tokens, fresh = [], 0, 0
+                current.append(segment)
+                current_tokens += segment.tokens
+                fresh += 1
+                continue
+
+            if current and current_tokens + segment.tokens > self.max_tokens:
+                if fresh:
+                    emit()
+                carried = []
+                carried_tokens = 0
+                for previous in reversed(current):
+                    if previous.heading or carried_tokens + previous.tokens > self.overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous.tokens
+                if carried_tokens + segment.tokens > self.max_tokens:
+                    carried, carried_tokens = [], 0
+                current, current_tokens, fresh = carried, carried_tokens, 0
+                chunk_section = section
+
+            current.append(segment)
+            current_tokens += segment.tokens
+            fresh += 1
+
+        if current and fresh:
+            emit()
+        return chunks
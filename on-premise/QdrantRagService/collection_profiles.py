@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """Параметры индекса коллекции и поиска по ней"""
+    hnsw_config: HnswConfigDiff
+    on_disk: bool
+    quantization_config: Optional[Union[ScalarQuantization, BinaryQuantization]]
+    search_params: SearchParams
+
+
+COLLECTION_PROFILES = {
+    # int8-квантизация в RAM и небольшой ef: быстрый поиск, оригинальные векторы только для rescoring
+    "latency": CollectionProfile(
+        hnsw_config=HnswConfigDiff(m=16, ef_construct=128),
+        on_disk=False,
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        ),
+        search_params=SearchParams(
+            hnsw_ef=64,
+            quantization=QuantizationSearchParams(rescore=True, oversampling=1.5)
+        ),
+    ),
+    # Оригинальные векторы и граф на диске, в RAM только бинарные коды (32x меньше float32)
+    "memory": CollectionProfile(
+        hnsw_config=HnswConfigDiff(m=16, ef_construct=100, on_disk=True),
+        on_disk=True,
+        quantization_config=BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=True)
+        ),
+        search_params=SearchParams(
+            hnsw_ef=128,
+            quantization=QuantizationSearchParams(rescore=True, oversampling=3.0)
+        ),
+    ),
+    # Без квантизации, плотный граф и большой ef
+    "recall": CollectionProfile(
+        hnsw_config=HnswConfigDiff(m=32, ef_construct=256),
+        on_disk=False,
+        quantization_config=None,
+        search_params=SearchParams(hnsw_ef=256),
+    ),
+}
+
+
+def get_profile(name: str) -> CollectionProfile:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(
+            f"Unknown collection profile '{name}', expected one of: {', '.join(COLLECTION_PROFILES)}"
+        )
+    return COLLECTION_PROFILES[name]
+
+
+def vector_params(profile: CollectionProfile, size: int) -> VectorParams:
+    return VectorParams(
+        size=size,
+        distance=Distance.COSINE,
+        hnsw_config=profile.hnsw_config,
+        quantization_config=profile.quantization_config,
+        on_disk=profile.on_disk,
+    )
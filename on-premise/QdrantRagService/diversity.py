@@ -0,0 +1,68 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def collapse_adjacent_chunks(hits: list) -> list:
+    """Оставить из соседних чанков одного файла (chunk_index отличается не больше чем на 1) лучший по score.
+
+    hits должны быть отсортированы по убыванию score.
+    """
+    kept = []
+    kept_chunks = {}
+    for hit in hits:
+        metadata = (hit.payload or {}).get("metadata") or {}
+        source_file = metadata.get("source_file")
+        chunk_index = metadata.get("chunk_index")
+        if source_file is None or not isinstance(chunk_index, int):
+            kept.append(hit)
+            continue
+
+        neighbours = kept_chunks.setdefault(source_file, [])
+        if any(abs(chunk_index - other) <= 1 for other in neighbours):
+            continue
+        neighbours.append(chunk_index)
+        kept.append(hit)
+    return kept
+
+
+def mmr_select(query_vector: np.ndarray, vectors: np.ndarray, top_k: int, relevance_weight: float) -> List[int]:
+    """Maximal Marginal Relevance: индексы top_k кандидатов, балансируя близость к запросу и разнообразие.
+
+    relevance_weight = 1.0 - чистая релевантность, 0.0 - максимальное разнообразие.
+    """
+    if len(vectors) == 0:
+        return []
+
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(len(vectors), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(top_k, len(vectors)):
+        scores = relevance_weight * relevance - (1 - relevance_weight) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
+
+
+def diversify(hits: list, query_vector: Optional[np.ndarray], top_k: int,
+              relevance_weight: Optional[float], collapse_adjacent: bool, dense_vector) -> list:
+    """Пост-обработка пересобранного с запасом списка: схлопывание соседних чанков и MMR"""
+    if collapse_adjacent:
+        hits = collapse_adjacent_chunks(hits)
+
+    if relevance_weight is None or query_vector is None or len(hits) <= top_k:
+        return hits[:top_k]
+
+    vectors = np.asarray([dense_vector(hit.vector) for hit in hits], dtype=np.float32)
+    return [hits[index] for index in mmr_select(query_vector, vectors, top_k, relevance_weight)]
@@ -0,0 +1,195 @@
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+# Путь к unix-сокету ("/tmp/rag-embedding.sock") или "host:port"
+EMBEDDING_SERVER_ADDRESS = os.getenv("EMBEDDING_SERVER_ADDRESS", "")
+# Соединение аутентифицируется по ключу (HMAC), а данные передаются через pickle: знающий ключ может
+# выполнить код на сервере. Ключа по умолчанию нет, без него ни сервер, ни клиент не запускаются
+EMBEDDING_SERVER_AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY", "").encode("utf-8")
+EMBEDDING_SERVER_CONNECT_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_CONNECT_TIMEOUT", "300"))
+# Запросы разных HTTP-воркеров склеиваются в один вызов модели
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "64"))
+EMBEDDING_SERVER_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_BATCH_WAIT_MS", "2"))
+
+
+def parse_address(address: str):
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def require_authkey():
+    if not EMBEDDING_SERVER_AUTHKEY:
+        raise RuntimeError(
+            "EMBEDDING_SERVER_AUTHKEY is not set; use a random secret shared by the embedding server and the workers"
+        )
+
+
+def connect(address, timeout: float):
+    """Подключение с повторами: сервер начинает слушать только после загрузки модели"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return Client(address, authkey=EMBEDDING_SERVER_AUTHKEY)
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+
+
+class EncodeJob:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+
+
+class RemoteEmbeddingModel:
+    """Клиент embedding-сервера с интерфейсом SentenceTransformer, который использует main.py"""
+
+    def __init__(self, address: str, connect_timeout: float = EMBEDDING_SERVER_CONNECT_TIMEOUT):
+        require_authkey()
+        self.address = parse_address(address)
+        # multiprocessing.Connection не потокобезопасен: у каждого потока executor'а своё соединение
+        self._local = threading.local()
+        self._dimension = self._request(("info",), connect_timeout)["dimension"]
+
+    def _connection(self, connect_timeout: float):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = connect(self.address, connect_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, message, connect_timeout: float = 5.0):
+        try:
+            connection = self._connection(connect_timeout)
+            connection.send(message)
+            status, payload = connection.recv()
+        except (EOFError, OSError):
+            # Сервер мог перезапуститься: одна повторная попытка через новое соединение
+            self._local.connection = None
+            connection = self._connection(connect_timeout)
+            connection.send(message)
+            status, payload = connection.recv()
+
+        if status == "error":
+            raise RuntimeError(f"Embedding server error: {payload}")
+        return payload
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        return self._request(("encode", list(texts)))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+
+def batch_loop(model, jobs: queue.Queue):
+    wait_seconds = EMBEDDING_SERVER_BATCH_WAIT_MS / 1000
+    while True:
+        batch = [jobs.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + wait_seconds
+        while size < EMBEDDING_SERVER_MAX_BATCH:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                job = jobs.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(job)
+            size += len(job.texts)
+
+        try:
+            embeddings = np.asarray(model.encode([text for job in batch for text in job.texts]), dtype=np.float32)
+            offset = 0
+            for job in batch:
+                job.result = embeddings[offset:offset + len(job.texts)]
+                offset += len(job.texts)
+        except Exception as e:
+            logger.error(f"Error encoding batch of {size} texts: {e}")
+            for job in batch:
+                job.error = str(e)
+
+        for job in batch:
+            job.done.set()
+
+
+def handle_connection(connection, jobs: queue.Queue, dimension: int):
+    with connection:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                return
+
+            if message[0] == "info":
+                connection.send(("ok", {"model": MODEL_NAME, "dimension": dimension}))
+            elif message[0] == "encode":
+                job = EncodeJob(message[1])
+                jobs.put(job)
+                job.done.wait()
+                connection.send(("error", job.error) if job.error else ("ok", job.result))
+            else:
+                connection.send(("error", f"Unknown request '{message[0]}'"))
+
+
+def serve(address: str):
+    """Одна копия модели на машину; HTTP-воркеры main.py отправляют сюда тексты на кодирование"""
+    require_authkey()
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(MODEL_NAME)
+    dimension = model.get_sentence_embedding_dimension()
+    logger.info(f"Loaded embedding model: {MODEL_NAME}")
+
+    jobs = queue.Queue()
+    threading.Thread(target=batch_loop, args=(model, jobs), daemon=True, name="encoder").start()
+
+    parsed_address = parse_address(address)
+    if isinstance(parsed_address, str) and os.path.exists(parsed_address):
+        os.unlink(parsed_address)
+
+    with Listener(parsed_address, authkey=EMBEDDING_SERVER_AUTHKEY) as listener:
+        logger.info(f"Embedding server is listening on {address}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                # Неверный authkey или оборванное рукопожатие не должны останавливать сервер
+                logger.warning(f"Rejected embedding client connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(connection, jobs, dimension), daemon=True).start()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared embedding model server for multi-worker RAG service")
+    parser.add_argument("--address", type=str, default=EMBEDDING_SERVER_ADDRESS or "/tmp/rag-embedding.sock",
+                        help="Unix socket path or host:port")
+
+    args = parser.parse_args()
+    try:
+        serve(args.address)
+    except RuntimeError as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,31 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Match
 from pydantic import BaseModel
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import (
+    PointStruct, PayloadSchemaType,
+    Filter, FieldCondition, MatchValue, MatchAny, Range, PointIdsList,
+    SparseVectorParams, Modifier, Prefetch, FusionQuery, Fusion,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+)
+from collection_profiles import get_profile, vector_params
+from bm25 import SPARSE_VECTOR_NAME, document_sparse_vector, query_sparse_vector
+from diversity import diversify
+import metrics
+from embedding_server import EMBEDDING_SERVER_ADDRESS, RemoteEmbeddingModel
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import os
 import numpy as np
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
+import asyncio
+import hashlib
 import logging
+import re
+import signal
+import time
 import uuid
 
 
@@ -20,6 +39,14 @@ class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
     threshold: float = 0.7
+    # Фильтр по метаданным: {"category": "AI", "language": ["ru", "en"], "year": {"gte": 2024}}
+    filter: Optional[Dict[str, Any]] = None
+    # dense - семантический поиск, sparse - BM25, hybrid - оба списка, слитые через RRF
+    mode: Literal["dense", "sparse", "hybrid"] = "dense"
+    # MMR: вес релевантности от 0 (максимум разнообразия) до 1 (чистая релевантность); None - без MMR
+    mmr_lambda: Optional[float] = None
+    # Схлопывать соседние чанки одного файла в один результат
+    collapse_adjacent: bool = False
 
 class SearchResult(BaseModel):
     text: str
@@ -34,198 +61,1049 @@ class Document(BaseModel):
     text: str
     metadata: Optional[dict] = None
 
+class SyncRequest(BaseModel):
+    source_key: str
+    documents: List[Document]
+
 
 qdrant_client = None
 embedding_model = None
-COLLECTION_NAME = "documents"
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "documents")
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+# Размерность векторов модели: коллекцию можно создать, не дожидаясь загрузки модели
+VECTOR_SIZE = int(os.getenv("VECTOR_SIZE", "384"))
+# Профиль индекса коллекции: latency, memory или recall (см. collection_profiles.py)
+COLLECTION_PROFILE = os.getenv("COLLECTION_PROFILE", "latency")
+collection_profile = get_profile(COLLECTION_PROFILE)
+# Размеры батчей для прогрева: одиночный запрос /search и типичные батчи загрузки
+WARMUP_BATCH_SIZES = [int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "1,8,32").split(",") if size.strip()]
+# Qdrant может подняться позже сервиса: попытки подключения с растущей паузой до STARTUP_RETRY_MAX_DELAY
+STARTUP_RETRIES = int(os.getenv("STARTUP_RETRIES", "10"))
+STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", "1"))
+STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "30"))
+WARMUP_TEXT = (
+    "Suleyman Demirel University provides student services, course registration and dormitory information. "
+    "Университет имени Сулеймана Демиреля: регистрация на курсы, общежитие и справки для студентов. "
+) * 4
+
+# Потоковая загрузка: размер батча и число батчей, одновременно находящихся в обработке
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "4"))
+INGEST_READ_CHUNK_SIZE = 64 * 1024
+INGEST_JOBS_KEEP = 100
+
+# Идентификатор точки = uuid5(источник + sha256 текста): повторная загрузка перезаписывает те же точки
+POINT_ID_NAMESPACE = uuid.UUID("5b0c1a3e-8f0e-4d55-9a43-2f3f6c1d7e21")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+SYNC_SCROLL_LIMIT = 1000
+# Ключи метаданных, по которым строятся payload-индексы для фильтрации в /search
+PAYLOAD_INDEX_KEYS = [key.strip() for key in os.getenv("PAYLOAD_INDEX_KEYS", "category,language,source_file").split(",") if key.strip()]
+RANGE_OPERATORS = {"gt", "gte", "lt", "lte"}
+# Во сколько раз больше top_k кандидатов берёт каждая ветка гибридного поиска перед слиянием
+HYBRID_PREFETCH_FACTOR = int(os.getenv("HYBRID_PREFETCH_FACTOR", "4"))
+# Во сколько раз больше кандидатов запрашивать под MMR и схлопывание соседних чанков
+DIVERSITY_FETCH_FACTOR = int(os.getenv("DIVERSITY_FETCH_FACTOR", "4"))
+
+# Версии коллекции documents_vN; COLLECTION_NAME - алиас на активную версию
+COLLECTION_VERSION_PATTERN = re.compile(rf"^{re.escape(COLLECTION_NAME)}_v(\d+)$")
+# Сколько версий хранить, включая активную (предыдущая остаётся для отката)
+COLLECTION_VERSIONS_KEEP = int(os.getenv("COLLECTION_VERSIONS_KEEP", "2"))
+# Как часто перечитывать алиас: его могла переключить другая реплика
+ALIAS_REFRESH_SECONDS = float(os.getenv("ALIAS_REFRESH_SECONDS", "5"))
+# Со своей моделью кодирует один поток; с общим embedding-сервером несколько потоков
+# держат запросы в полёте, и сервер склеивает их в один батч
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "4" if EMBEDDING_SERVER_ADDRESS else "1"))
+# Кэш ответов /search живёт в памяти воркера, а запись сбрасывает его только у воркера, который её принял.
+# С общим embedding-сервером воркеров несколько, и остальные отдавали бы устаревшие результаты: кэш выключен
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "0" if EMBEDDING_SERVER_ADDRESS else "1000"))
+
+# Кодирование вынесено из event loop в отдельный executor
+encoder_executor = ThreadPoolExecutor(max_workers=ENCODER_THREADS, thread_name_prefix="encoder")
+ingest_jobs = OrderedDict()
+embedding_cache = OrderedDict()
+# Есть ли в активной коллекции sparse-вектор (коллекции, созданные до гибридного поиска, его не имеют)
+sparse_enabled = False
+# active_version = None: алиаса ещё нет и COLLECTION_NAME - обычная коллекция
+collection_state = {"active_version": None, "refreshed_at": 0.0}
+# Ключ кэша включает номер активной версии, так что переключение алиаса инвалидирует его
+search_cache = OrderedDict()
+
+startup_state = {
+    "phase": "starting",
+    "ready": False,
+    "error": None,
+    "timings": {},
+}
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Замер длительности одной фазы запуска"""
+    startup_state["phase"] = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        startup_state["timings"][name] = round(elapsed, 3)
+        logger.info(f"Startup phase '{name}' took {elapsed:.3f}s")
+
+
+def require_ready():
+    if not startup_state["ready"]:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is not ready yet (phase: {startup_state['phase']})"
+        )
+
+
+async def embed(texts: List[str]) -> np.ndarray:
+    loop = asyncio.get_running_loop()
+    metrics.batch_size.observe(len(texts), endpoint=metrics.current_endpoint.get(), kind="encode")
+    # Время фазы encode включает ожидание в очереди executor'а
+    metrics.encoder_queue_depth.inc()
+    try:
+        with metrics.phase("encode"):
+            return await loop.run_in_executor(encoder_executor, embedding_model.encode, texts)
+    finally:
+        metrics.encoder_queue_depth.dec()
+
+
+def record_write(points: list):
+    metrics.batch_size.observe(len(points), endpoint=metrics.current_endpoint.get(), kind="upsert")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_source_key(document: Document) -> str:
+    metadata = document.metadata or {}
+    return str(metadata.get("source_file") or metadata.get("source") or "")
+
+
+def document_point_id(source_key: str, text_hash: str) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source_key}:{text_hash}"))
+
+
+def cache_embedding(text_hash: str, vector):
+    embedding_cache[text_hash] = np.asarray(vector, dtype=np.float32)
+    embedding_cache.move_to_end(text_hash)
+    while len(embedding_cache) > EMBEDDING_CACHE_SIZE:
+        embedding_cache.popitem(last=False)
+
+
+def dense_vector(vector):
+    """Плотный вектор точки: в коллекции со sparse-вектором Qdrant возвращает словарь по именам"""
+    if isinstance(vector, dict):
+        return vector[""]
+    return vector
+
+
+def collection_has_sparse(collection_name: str) -> bool:
+    # Версии создаются этим сервисом и всегда содержат sparse-вектор
+    return sparse_enabled if collection_name == COLLECTION_NAME else True
+
+
+def point_vectors(text: str, embedding: np.ndarray, with_sparse: bool):
+    if not with_sparse:
+        return embedding.tolist()
+    return {"": embedding.tolist(), SPARSE_VECTOR_NAME: document_sparse_vector(text)}
+
+
+async def build_points(documents: List[Document], collection_name: str, source_key: Optional[str] = None):
+    """Точки с детерминированными id; кодируются только тексты, которых нет ни в кэше, ни в Qdrant"""
+    entries = []
+    for doc in documents:
+        key = source_key if source_key is not None else document_source_key(doc)
+        text_hash = content_hash(doc.text)
+        entries.append((doc, key, text_hash, document_point_id(key, text_hash)))
+    
+    # При сборке новой версии векторы неизменённых чанков берутся из активной коллекции
+    lookup_collections = [collection_name] if collection_name == COLLECTION_NAME else [collection_name, COLLECTION_NAME]
+    missing = {entry[3]: entry[2] for entry in entries if entry[2] not in embedding_cache}
+    for lookup_collection in lookup_collections:
+        if not missing:
+            break
+        with metrics.phase("qdrant"):
+            stored = await asyncio.to_thread(
+                qdrant_client.retrieve,
+                collection_name=lookup_collection,
+                ids=list(missing),
+                with_payload=False,
+                with_vectors=True
+            )
+        for record in stored:
+            cache_embedding(missing.pop(str(record.id)), dense_vector(record.vector))
+    
+    texts_to_encode = {}
+    for doc, _, text_hash, _ in entries:
+        if text_hash not in embedding_cache:
+            texts_to_encode.setdefault(text_hash, doc.text)
+    
+    if texts_to_encode:
+        embeddings = await embed(list(texts_to_encode.values()))
+        for text_hash, embedding in zip(texts_to_encode, embeddings):
+            cache_embedding(text_hash, embedding)
+    
+    with_sparse = collection_has_sparse(collection_name)
+    points = [
+        PointStruct(
+            id=point_id,
+            vector=point_vectors(doc.text, embedding_cache[text_hash], with_sparse),
+            payload={
+                "text": doc.text,
+                "metadata": doc.metadata or {},
+                "source_key": key,
+                "content_hash": text_hash
+            }
+        )
+        for doc, key, text_hash, point_id in entries
+    ]
+    return points, len(texts_to_encode)
+
+
+def warmup_embedding_model():
+    for batch_size in WARMUP_BATCH_SIZES:
+        embedding_model.encode([WARMUP_TEXT] * batch_size)
+
 
 @app.on_event("startup")
 async def startup_event():
+    # Модель загружается в фоне, чтобы /live отвечал сразу после старта процесса
+    app.state.startup_task = asyncio.create_task(run_startup_pipeline())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = app.state.startup_task
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is not None:
+        # Ошибка уже в логе и в /live; здесь она только забирается из задачи
+        logger.info(f"Startup had failed: {task.exception()}")
+
+async def run_startup_pipeline():
     global qdrant_client, embedding_model
     
+    started = time.perf_counter()
     try:
-        
-        qdrant_host = os.getenv("QDRANT_HOST", "localhost")
-        qdrant_port = int(os.getenv("QDRANT_PORT", "6333"))
-        
-        qdrant_client = QdrantClient(host=qdrant_host, port=qdrant_port)
-        logger.info(f"Connected to Qdrant at {qdrant_host}:{qdrant_port}")
-        
-        
-        model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-        embedding_model = SentenceTransformer(model_name)
-        logger.info(f"Loaded embedding model: {model_name}")
-        
-        
-        await create_collection_if_not_exists()
-        
+        with startup_phase("connect_qdrant"):
+            qdrant_host = os.getenv("QDRANT_HOST", "localhost")
+            qdrant_port = int(os.getenv("QDRANT_PORT", "6333"))
+            # Встроенный режим qdrant-client без сервера: каталог или ":memory:" (оценка качества, тесты)
+            qdrant_path = os.getenv("QDRANT_PATH")
+                
+            if qdrant_path:
+                qdrant_client = QdrantClient(location=":memory:") if qdrant_path == ":memory:" else QdrantClient(path=qdrant_path)
+                logger.info(f"Using embedded Qdrant at {qdrant_path}")
+            else:
+                qdrant_client = QdrantClient(host=qdrant_host, port=qdrant_port)
+                logger.info(f"Connected to Qdrant at {qdrant_host}:{qdrant_port}")
+                
+            for attempt in range(1, STARTUP_RETRIES + 1):
+                try:
+                    await ensure_active_collection()
+                    break
+                except Exception as e:
+                    if attempt == STARTUP_RETRIES:
+                        raise
+                    delay = min(STARTUP_RETRY_DELAY * 2 ** (attempt - 1), STARTUP_RETRY_MAX_DELAY)
+                    logger.warning(f"Qdrant is not available (attempt {attempt}/{STARTUP_RETRIES}), retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+            
+        with startup_phase("load_model"):
+            if EMBEDDING_SERVER_ADDRESS:
+                embedding_model = await asyncio.to_thread(RemoteEmbeddingModel, EMBEDDING_SERVER_ADDRESS)
+                logger.info(f"Using shared embedding server at {EMBEDDING_SERVER_ADDRESS}")
+            else:
+                # Импорт здесь: воркеры с общим embedding-сервером не загружают torch
+                from sentence_transformers import SentenceTransformer
+                embedding_model = await asyncio.to_thread(SentenceTransformer, MODEL_NAME)
+                logger.info(f"Loaded embedding model: {MODEL_NAME}")
+            
+        model_dimension = embedding_model.get_sentence_embedding_dimension()
+        if model_dimension != VECTOR_SIZE:
+            raise RuntimeError(
+                f"Embedding model dimension {model_dimension} does not match VECTOR_SIZE={VECTOR_SIZE}"
+            )
+            
+        with startup_phase("warmup"):
+            await asyncio.to_thread(warmup_embedding_model)
+            
+        startup_state["timings"]["total"] = round(time.perf_counter() - started, 3)
+        startup_state["phase"] = "ready"
+        startup_state["ready"] = True
+        logger.info(f"Service is ready, startup timings: {startup_state['timings']}")
+            
     except Exception as e:
+        startup_state["phase"] = "failed"
+        startup_state["error"] = str(e)
         logger.error(f"Error during startup: {e}")
-        raise
+        # Запуск идёт в фоновой задаче, исключение из неё сервер не остановит. Под uvicorn сервер
+        # останавливается штатно, чтобы оркестратор (restart: unless-stopped) перезапустил процесс, а не
+        # держал вечный 503. Без сервера (TestClient, evaluate.py --in-process) ошибку видно в /live и в задаче
+        server = running_server()
+        if server is None:
+            raise
+        server.should_exit = True
+
+def running_server():
+    """uvicorn.Server этого процесса: на время работы он ставит свой handle_exit обработчиком SIGTERM"""
+    server = getattr(signal.getsignal(signal.SIGTERM), "__self__", None)
+    return server if hasattr(server, "should_exit") else None
+
+def version_collection_name(version: int) -> str:
+    return f"{COLLECTION_NAME}_v{version}"
+
+def list_collection_names() -> List[str]:
+    return [col.name for col in qdrant_client.get_collections().collections]
+
+def list_collection_versions() -> List[int]:
+    matches = [COLLECTION_VERSION_PATTERN.match(name) for name in list_collection_names()]
+    return sorted(int(match.group(1)) for match in matches if match)
+
+def read_alias_target() -> Optional[str]:
+    for alias in qdrant_client.get_aliases().aliases:
+        if alias.alias_name == COLLECTION_NAME:
+            return alias.collection_name
+    return None
+
+def refresh_active_version():
+    """Перечитать, на какую версию указывает алиас, и обновить зависящее от неё состояние"""
+    global sparse_enabled
+    target = read_alias_target()
+    match = COLLECTION_VERSION_PATTERN.match(target) if target else None
+    version = int(match.group(1)) if match else None
+    
+    if version != collection_state["active_version"] or not collection_state["refreshed_at"]:
+        search_cache.clear()
+        sparse_vectors = qdrant_client.get_collection(COLLECTION_NAME).config.params.sparse_vectors or {}
+        sparse_enabled = SPARSE_VECTOR_NAME in sparse_vectors
+        if not sparse_enabled:
+            logger.warning(
+                f"Collection '{COLLECTION_NAME}' has no '{SPARSE_VECTOR_NAME}' sparse vector, "
+                "sparse and hybrid search are disabled until it is rebuilt"
+            )
+    
+    collection_state["active_version"] = version
+    collection_state["refreshed_at"] = time.monotonic()
+
+async def maybe_refresh_active_version():
+    if time.monotonic() - collection_state["refreshed_at"] >= ALIAS_REFRESH_SECONDS:
+        await asyncio.to_thread(refresh_active_version)
+
+def active_collection_name() -> str:
+    version = collection_state["active_version"]
+    return version_collection_name(version) if version is not None else COLLECTION_NAME
+
+def create_collection_version(version: int) -> str:
+    collection_name = version_collection_name(version)
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vector_params(collection_profile, VECTOR_SIZE),
+        sparse_vectors_config={
+            SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+        }
+    )
+    create_payload_indexes(collection_name)
+    logger.info(
+        f"Created collection '{collection_name}' with vector size {VECTOR_SIZE}, "
+        f"profile '{COLLECTION_PROFILE}'"
+    )
+    return collection_name
+
+def activate_collection_version(version: int) -> List[int]:
+    """Атомарно переключить алиас на версию и удалить лишние старые версии"""
+    operations = []
+    if read_alias_target() is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=COLLECTION_NAME)))
+    elif COLLECTION_NAME in list_collection_names():
+        # Коллекция из времён до версионирования занимает имя алиаса: переход без атомарности, один раз
+        logger.warning(f"Deleting legacy collection '{COLLECTION_NAME}' to replace it with an alias")
+        qdrant_client.delete_collection(COLLECTION_NAME)
+    
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(
+        collection_name=version_collection_name(version),
+        alias_name=COLLECTION_NAME
+    )))
+    qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f"Alias '{COLLECTION_NAME}' now points to '{version_collection_name(version)}'")
+    
+    refresh_active_version()
+    return garbage_collect_versions()
+
+def garbage_collect_versions() -> List[int]:
+    """Удалить версии старше активной сверх COLLECTION_VERSIONS_KEEP; более новые могут ещё собираться"""
+    active_version = collection_state["active_version"]
+    if active_version is None:
+        return []
+    
+    older = [version for version in list_collection_versions() if version < active_version]
+    stale = older[:max(0, len(older) - (COLLECTION_VERSIONS_KEEP - 1))]
+    for version in stale:
+        qdrant_client.delete_collection(version_collection_name(version))
+        logger.info(f"Deleted old collection version '{version_collection_name(version)}'")
+    return stale
 
-async def create_collection_if_not_exists():
+def next_collection_version() -> int:
+    versions = list_collection_versions()
+    return versions[-1] + 1 if versions else 1
+
+async def ensure_active_collection():
     try:
-        collections = qdrant_client.get_collections()
-        collection_names = [col.name for col in collections.collections]
-        
-        if COLLECTION_NAME not in collection_names:
-            
-            sample_embedding = embedding_model.encode(["test"])
-            vector_size = len(sample_embedding[0])
-            
-            qdrant_client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(
-                    size=vector_size,
-                    distance=Distance.COSINE
+        if read_alias_target() is None:
+            if COLLECTION_NAME in list_collection_names():
+                logger.info(
+                    f"Collection '{COLLECTION_NAME}' already exists without versioning, "
+                    "it will be replaced by an alias on the next version activation"
                 )
-            )
-            logger.info(f"Created collection '{COLLECTION_NAME}' with vector size {vector_size}")
+            else:
+                # Воркеры uvicorn стартуют одновременно и могут создавать первую версию наперегонки:
+                # версия или алиас, созданные другим воркером, считаются успехом
+                versions = list_collection_versions()
+                version = versions[-1] if versions else 1
+                if not versions:
+                    try:
+                        create_collection_version(version)
+                    except Exception as e:
+                        if version not in list_collection_versions():
+                            raise
+                        logger.info(f"Collection '{version_collection_name(version)}' was created by another worker: {e}")
+                try:
+                    activate_collection_version(version)
+                except Exception as e:
+                    if read_alias_target() is None:
+                        raise
+                    logger.info(f"Alias '{COLLECTION_NAME}' was created by another worker: {e}")
         else:
-            logger.info(f"Collection '{COLLECTION_NAME}' already exists")
+            logger.info(f"Alias '{COLLECTION_NAME}' already exists")
             
+        refresh_active_version()
+        create_payload_indexes(active_collection_name())
+                
     except Exception as e:
         logger.error(f"Error creating collection: {e}")
         raise
 
+def create_payload_indexes(collection_name: str):
+    """Keyword-индексы для source_key и настроенных ключей метаданных (повторный вызов безопасен)"""
+    field_names = ["source_key"] + [f"metadata.{key}" for key in PAYLOAD_INDEX_KEYS]
+    for field_name in field_names:
+        qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=PayloadSchemaType.KEYWORD
+        )
+    logger.info(f"Payload indexes ensured for '{collection_name}': {', '.join(field_names)}")
+
+def resolve_write_collection(version: Optional[int]) -> str:
+    """Куда писать: в активную коллекцию через алиас или в собираемую версию"""
+    if version is None:
+        return COLLECTION_NAME
+    if version not in list_collection_versions():
+        raise HTTPException(status_code=404, detail=f"Collection version {version} not found")
+    return version_collection_name(version)
+
+def is_active_collection(collection_name: str) -> bool:
+    return collection_name in (COLLECTION_NAME, active_collection_name())
+
+def after_write(collection_name: str):
+    """Сбрасывает кэш поиска; вызывать после того, как Qdrant подтвердил запись"""
+    if is_active_collection(collection_name):
+        search_cache.clear()
+
+def build_metadata_filter(conditions: Optional[Dict[str, Any]]) -> Optional[Filter]:
+    """Перевод фильтра из SearchRequest в Qdrant Filter по полям metadata.*"""
+    if not conditions:
+        return None
+    
+    must = []
+    for key, value in conditions.items():
+        field_name = f"metadata.{key}"
+        if isinstance(value, dict):
+            unknown = set(value) - RANGE_OPERATORS
+            if unknown:
+                raise ValueError(f"Unsupported range operators for '{key}': {', '.join(sorted(unknown))}")
+            must.append(FieldCondition(key=field_name, range=Range(**value)))
+        elif isinstance(value, list):
+            must.append(FieldCondition(key=field_name, match=MatchAny(any=value)))
+        else:
+            must.append(FieldCondition(key=field_name, match=MatchValue(value=value)))
+    
+    return Filter(must=must)
+
+def route_template(scope) -> str:
+    """Шаблон пути вместо самого пути, чтобы job_id и номера версий не раздували число меток"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    endpoint = route_template(request.scope)
+    token = metrics.current_endpoint.set(endpoint)
+    metrics.requests_in_flight.inc(endpoint=endpoint)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.request_duration.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        metrics.requests_total.inc(endpoint=endpoint, method=request.method, status=str(status))
+        metrics.requests_in_flight.dec(endpoint=endpoint)
+        metrics.current_endpoint.reset(token)
+
 @app.get("/")
 async def root():
     return {"message": "RAG Service is running", "status": "ok"}
 
+@app.get("/live")
+async def liveness_probe():
+    if startup_state["error"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "failed", "error": startup_state["error"]}
+        )
+    return {"status": "alive", "phase": startup_state["phase"]}
+
+@app.get("/ready")
+async def readiness_probe():
+    content = {
+        "status": "ready" if startup_state["ready"] else "not_ready",
+        "phase": startup_state["phase"],
+        "timings": startup_state["timings"]
+    }
+    return JSONResponse(status_code=200 if startup_state["ready"] else 503, content=content)
+
 @app.get("/health")
 async def health_check():
     try:
-        
+            
         collections = qdrant_client.get_collections()
         return {
             "status": "healthy",
             "qdrant_connected": True,
             "embedding_model_loaded": embedding_model is not None,
-            "collections_count": len(collections.collections)
+            "collections_count": len(collections.collections),
+            "startup": startup_state
         }
     except Exception as e:
         return {
             "status": "unhealthy",
-            "error": str(e)
+            "error": str(e),
+            "startup": startup_state
         }
 
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/search", response_model=SearchResponse)
 async def search(request: SearchRequest):
+    require_ready()
     try:
-        
-        query_embedding = embedding_model.encode([request.query])[0]
-        
-        
-        search_results = qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_embedding.tolist(),
-            limit=request.top_k,
-            score_threshold=request.threshold
+        query_filter = build_metadata_filter(request.filter)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    
+    await maybe_refresh_active_version()
+    cache_key = (collection_state["active_version"], request.model_dump_json())
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        search_cache.move_to_end(cache_key)
+        return Response(content=cached, media_type="application/json")
+    
+    if request.mmr_lambda is not None and not 0 <= request.mmr_lambda <= 1:
+        raise HTTPException(status_code=400, detail="mmr_lambda must be between 0 and 1")
+    
+    if request.mode != "dense" and not sparse_enabled:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Search mode '{request.mode}' requires a collection with the '{SPARSE_VECTOR_NAME}' sparse vector"
         )
+    
+    use_mmr = request.mmr_lambda is not None
+    # Под пост-обработку берём кандидатов с запасом, итоговый top_k выбирает diversify
+    limit = request.top_k
+    if use_mmr or request.collapse_adjacent:
+        limit = request.top_k * DIVERSITY_FETCH_FACTOR
+    
+    try:
+        query_embedding = None
+        if request.mode != "sparse" or use_mmr:
+            query_embedding = (await embed([request.query]))[0]
+            
+        with metrics.phase("qdrant"):
+            # Клиент Qdrant синхронный: вызов в потоке не блокирует остальные запросы
+            if request.mode == "dense":
+                # Безымянный плотный вектор - вектор по умолчанию, using не нужен
+                search_results = (await asyncio.to_thread(
+                    qdrant_client.query_points,
+                    collection_name=COLLECTION_NAME,
+                    query=query_embedding.tolist(),
+                    query_filter=query_filter,
+                    search_params=collection_profile.search_params,
+                    limit=limit,
+                    score_threshold=request.threshold,
+                    with_vectors=use_mmr
+                )).points
+            
+            elif request.mode == "sparse":
+                # Порог не применяется: шкала BM25 не сопоставима с косинусной близостью
+                search_results = (await asyncio.to_thread(
+                    qdrant_client.query_points,
+                    collection_name=COLLECTION_NAME,
+                    query=query_sparse_vector(request.query),
+                    using=SPARSE_VECTOR_NAME,
+                    query_filter=query_filter,
+                    limit=limit,
+                    with_vectors=use_mmr
+                )).points
+            
+            else:
+                prefetch_limit = limit * HYBRID_PREFETCH_FACTOR
+                
+                # Порог отсекает только плотную ветку; итоговый score - это RRF
+                search_results = (await asyncio.to_thread(
+                    qdrant_client.query_points,
+                    collection_name=COLLECTION_NAME,
+                    prefetch=[
+                        Prefetch(
+                            query=query_embedding.tolist(),
+                            filter=query_filter,
+                            params=collection_profile.search_params,
+                            score_threshold=request.threshold,
+                            limit=prefetch_limit
+                        ),
+                        Prefetch(
+                            query=query_sparse_vector(request.query),
+                            using=SPARSE_VECTOR_NAME,
+                            filter=query_filter,
+                            limit=prefetch_limit
+                        )
+                    ],
+                    query=FusionQuery(fusion=Fusion.RRF),
+                    limit=limit,
+                    with_vectors=use_mmr
+                )).points
         
+        search_results = diversify(
+            search_results,
+            query_embedding,
+            request.top_k,
+            request.mmr_lambda,
+            request.collapse_adjacent,
+            dense_vector
+        )
         
-        results = []
-        for hit in search_results:
-            results.append(SearchResult(
-                text=hit.payload.get("text", ""),
-                score=hit.score,
-                metadata=hit.payload.get("metadata", {})
-            ))
+        # Ответ сериализуется здесь, а не в FastAPI: так замеряется фаза serialize и в кэш кладутся готовые байты
+        with metrics.phase("serialize"):
+            results = []
+            for hit in search_results:
+                results.append(SearchResult(
+                    text=hit.payload.get("text", ""),
+                    score=hit.score,
+                    metadata=hit.payload.get("metadata", {})
+                ))
+            
+            body = SearchResponse(
+                results=results,
+                total_found=len(results)
+            ).model_dump_json()
         
-        return SearchResponse(
-            results=results,
-            total_found=len(results)
-        )
+        if SEARCH_CACHE_SIZE > 0:
+            search_cache[cache_key] = body
+            while len(search_cache) > SEARCH_CACHE_SIZE:
+                search_cache.popitem(last=False)
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Error during search: {e}")
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
 @app.post("/add_document")
-async def add_document(document: Document):
+async def add_document(document: Document, version: Optional[int] = None):
+    require_ready()
+    collection_name = resolve_write_collection(version)
     try:
         
-        embedding = embedding_model.encode([document.text])[0]
+        points, _ = await build_points([document], collection_name)
         
         
-        point = PointStruct(
-            id=str(uuid.uuid4()),
-            vector=embedding.tolist(),
-            payload={
-                "text": document.text,
-                "metadata": document.metadata or {}
-            }
-        )
-        
-        
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[point]
-        )
+        record_write(points)
+        with metrics.phase("qdrant"):
+            await asyncio.to_thread(
+                qdrant_client.upsert,
+                collection_name=collection_name,
+                points=points
+            )
+        after_write(collection_name)
         
-        return {"message": "Document added successfully", "id": point.id}
+        return {"message": "Document added successfully", "id": points[0].id}
         
     except Exception as e:
         logger.error(f"Error adding document: {e}")
         raise HTTPException(status_code=500, detail=f"Error adding document: {str(e)}")
 
 @app.post("/add_documents")
-async def add_documents(documents: List[Document]):
+async def add_documents(documents: List[Document], version: Optional[int] = None):
+    require_ready()
+    collection_name = resolve_write_collection(version)
     try:
-        points = []
-        texts = [doc.text for doc in documents]
         
+        points, embedded_count = await build_points(documents, collection_name)
         
-        embeddings = embedding_model.encode(texts)
         
-        for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-            point = PointStruct(
-                id=str(uuid.uuid4()),
-                vector=embedding.tolist(),
-                payload={
-                    "text": doc.text,
-                    "metadata": doc.metadata or {}
-                }
+        record_write(points)
+        with metrics.phase("qdrant"):
+            await asyncio.to_thread(
+                qdrant_client.upsert,
+                collection_name=collection_name,
+                points=points
             )
-            points.append(point)
-        
-        
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
+        after_write(collection_name)
         
         return {
             "message": f"Successfully added {len(documents)} documents",
-            "added_count": len(documents)
+            "added_count": len(documents),
+            "embedded_count": embedded_count
         }
         
     except Exception as e:
         logger.error(f"Error adding documents: {e}")
         raise HTTPException(status_code=500, detail=f"Error adding documents: {str(e)}")
 
+@app.post("/sync")
+async def sync_source(request: SyncRequest, version: Optional[int] = None):
+    """Инкрементальная синхронизация: приводит точки источника к переданному набору чанков"""
+    require_ready()
+    collection_name = resolve_write_collection(version)
+    try:
+        stored = {}
+        offset = None
+        while True:
+            records, offset = await asyncio.to_thread(
+                qdrant_client.scroll,
+                collection_name=collection_name,
+                scroll_filter=Filter(must=[
+                    FieldCondition(key="source_key", match=MatchValue(value=request.source_key))
+                ]),
+                limit=SYNC_SCROLL_LIMIT,
+                offset=offset,
+                with_payload=["metadata"],
+                with_vectors=False
+            )
+            for record in records:
+                stored[str(record.id)] = (record.payload or {}).get("metadata", {})
+            if offset is None:
+                break
+        
+        wanted = {}
+        for doc in request.documents:
+            wanted[document_point_id(request.source_key, content_hash(doc.text))] = doc
+        
+        # Неизменённые чанки не трогаем; при смене только метаданных вектор берётся из Qdrant
+        changed = [
+            doc for point_id, doc in wanted.items()
+            if point_id not in stored or stored[point_id] != (doc.metadata or {})
+        ]
+        stale_ids = [point_id for point_id in stored if point_id not in wanted]
+        
+        embedded_count = 0
+        if changed:
+            points, embedded_count = await build_points(changed, collection_name, source_key=request.source_key)
+            record_write(points)
+            with metrics.phase("qdrant"):
+                await asyncio.to_thread(qdrant_client.upsert, collection_name=collection_name, points=points)
+        
+        if stale_ids:
+            await asyncio.to_thread(
+                qdrant_client.delete,
+                collection_name=collection_name,
+                points_selector=PointIdsList(points=stale_ids)
+            )
+        
+        if changed or stale_ids:
+            after_write(collection_name)
+        
+        upserted_new = sum(1 for point_id in wanted if point_id not in stored)
+        return {
+            "source_key": request.source_key,
+            "added_count": upserted_new,
+            "updated_count": len(changed) - upserted_new,
+            "deleted_count": len(stale_ids),
+            "unchanged_count": len(wanted) - len(changed),
+            "embedded_count": embedded_count
+        }
+        
+    except Exception as e:
+        logger.error(f"Error syncing source '{request.source_key}': {e}")
+        raise HTTPException(status_code=500, detail=f"Error syncing source: {str(e)}")
+
+async def iter_upload_chunks(upload):
+    while True:
+        chunk = await upload.read(INGEST_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def iter_ndjson_documents(chunks):
+    """Построчный разбор NDJSON: (номер строки, документ, ошибка)
+
+    Делится только пришедший кусок; начало незаконченной строки копится списком частей,
+    так что длинная строка из многих кусков склеивается один раз.
+    """
+    tail = []
+    line_number = 0
+    
+    async for chunk in chunks:
+        lines = chunk.split(b"\n")
+        if len(lines) == 1:
+            tail.append(chunk)
+            continue
+        tail.append(lines[0])
+        lines[0] = b"".join(tail)
+        tail = [lines.pop()]
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield parse_ndjson_line(line_number, line)
+    
+    buffer = b"".join(tail)
+    if buffer.strip():
+        yield parse_ndjson_line(line_number + 1, buffer)
+
+def parse_ndjson_line(line_number: int, line: bytes):
+    try:
+        return line_number, Document.model_validate_json(line), None
+    except Exception as e:
+        return line_number, None, str(e)
+
+async def ingest_batch(job: dict, batch_number: int, batch: list, semaphore: asyncio.Semaphore):
+    documents = [doc for _, doc in batch]
+    result = {
+        "batch": batch_number,
+        "first_line": batch[0][0],
+        "last_line": batch[-1][0],
+        "count": len(documents)
+    }
+    try:
+        points, embedded_count = await build_points(documents, job["collection"])
+        
+        record_write(points)
+        with metrics.phase("qdrant"):
+            # Запись в активную версию ждёт индексации: иначе /search до неё закэширует старый результат
+            # уже после очистки кэша. Новую версию никто не ищет, её батчи не ждут
+            await asyncio.to_thread(
+                qdrant_client.upload_points,
+                collection_name=job["collection"],
+                points=points,
+                wait=is_active_collection(job["collection"])
+            )
+        after_write(job["collection"])
+        
+        job["added_count"] += len(points)
+        result["embedded_count"] = embedded_count
+        result["status"] = "ok"
+        
+    except Exception as e:
+        logger.error(f"Error ingesting batch {batch_number} of job {job['job_id']}: {e}")
+        job["failed_count"] += len(documents)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        
+    finally:
+        semaphore.release()
+    
+    job["batches"].append(result)
+    logger.info(
+        f"Ingest job {job['job_id']}: batch {batch_number} {result['status']}, "
+        f"{job['added_count']}/{job['received_count']} documents added"
+    )
+
+@app.post("/add_documents/stream")
+async def add_documents_stream(request: Request, job_id: Optional[str] = None, version: Optional[int] = None):
+    """Потоковая загрузка документов из NDJSON (тело запроса или файл в multipart)"""
+    require_ready()
+    
+    # Тело проверяется до регистрации задачи: отклонённый запрос не должен висеть в статусе running
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart body must contain a 'file' field")
+        chunks = iter_upload_chunks(upload)
+    else:
+        chunks = request.stream()
+    
+    job = {
+        "job_id": job_id or str(uuid.uuid4()),
+        "collection": resolve_write_collection(version),
+        "status": "running",
+        "received_count": 0,
+        "added_count": 0,
+        "failed_count": 0,
+        "invalid_lines": [],
+        "batches": []
+    }
+    ingest_jobs[job["job_id"]] = job
+    while len(ingest_jobs) > INGEST_JOBS_KEEP:
+        ingest_jobs.popitem(last=False)
+    
+    # Семафор ограничивает число батчей в памяти: пока он занят, тело запроса не читается
+    semaphore = asyncio.Semaphore(INGEST_MAX_IN_FLIGHT)
+    tasks = []
+    batch = []
+    
+    async def submit_batch():
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(ingest_batch(job, len(tasks) + 1, batch, semaphore)))
+    
+    try:
+        async for line_number, document, error in iter_ndjson_documents(chunks):
+            if error:
+                job["invalid_lines"].append({"line": line_number, "error": error})
+                continue
+            
+            job["received_count"] += 1
+            batch.append((line_number, document))
+            if len(batch) >= INGEST_BATCH_SIZE:
+                await submit_batch()
+                batch = []
+        
+        if batch:
+            await submit_batch()
+        
+    except Exception as e:
+        logger.error(f"Error reading ingest stream {job['job_id']}: {e}")
+        job["error"] = f"Stream read error: {str(e)}"
+        
+    finally:
+        await asyncio.gather(*tasks)
+        job["batches"].sort(key=lambda result: result["batch"])
+        job["status"] = "failed" if job.get("error") else "completed"
+    
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "received_count": job["received_count"],
+        "added_count": job["added_count"],
+        "failed_count": job["failed_count"],
+        "batches_count": len(job["batches"]),
+        "failed_batches": [result for result in job["batches"] if result["status"] == "failed"],
+        "invalid_lines": job["invalid_lines"],
+        "error": job.get("error")
+    }
+
+@app.get("/add_documents/stream/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Прогресс потоковой загрузки"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        # Задачи хранятся в памяти воркера: при нескольких воркерах статус знает только тот, что её принял
+        raise HTTPException(status_code=404, detail=f"Ingest job '{job_id}' not found on this worker")
+    return job
+
 @app.get("/collection/info")
 async def get_collection_info():
     try:
         collection_info = qdrant_client.get_collection(COLLECTION_NAME)
         return {
             "collection_name": COLLECTION_NAME,
+            "active_collection": active_collection_name(),
+            "active_version": collection_state["active_version"],
             "points_count": collection_info.points_count,
             "vector_size": collection_info.config.params.vectors.size,
-            "distance_metric": collection_info.config.params.vectors.distance
+            "distance_metric": collection_info.config.params.vectors.distance,
+            "quantization": collection_info.config.params.vectors.quantization_config or collection_info.config.quantization_config,
+            "vectors_on_disk": collection_info.config.params.vectors.on_disk,
+            "search_profile": COLLECTION_PROFILE
         }
         
     except Exception as e:
         logger.error(f"Error getting collection info: {e}")
         raise HTTPException(status_code=500, detail=f"Error getting collection info: {str(e)}")
 
+@app.get("/collection/versions")
+async def get_collection_versions():
+    try:
+        refresh_active_version()
+        return {
+            "alias": COLLECTION_NAME,
+            "active_version": collection_state["active_version"],
+            "versions": [
+                {"version": version, "collection": version_collection_name(version)}
+                for version in list_collection_versions()
+            ]
+        }
+        
+    except Exception as e:
+        logger.error(f"Error listing collection versions: {e}")
+        raise HTTPException(status_code=500, detail=f"Error listing collection versions: {str(e)}")
+
+@app.post("/collection/versions")
+async def create_version():
+    """Создать пустую версию для полной переиндексации; поиск продолжает работать по активной"""
+    try:
+        version = next_collection_version()
+        collection_name = create_collection_version(version)
+        
+        return {"version": version, "collection": collection_name}
+        
+    except Exception as e:
+        logger.error(f"Error creating collection version: {e}")
+        raise HTTPException(status_code=500, detail=f"Error creating collection version: {str(e)}")
+
+@app.post("/collection/versions/{version}/activate")
+async def activate_version(version: int):
+    if version not in list_collection_versions():
+        raise HTTPException(status_code=404, detail=f"Collection version {version} not found")
+    try:
+        deleted_versions = activate_collection_version(version)
+        
+        return {
+            "message": f"Alias '{COLLECTION_NAME}' switched to version {version}",
+            "active_version": version,
+            "deleted_versions": deleted_versions
+        }
+        
+    except Exception as e:
+        logger.error(f"Error activating collection version {version}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error activating collection version: {str(e)}")
+
+@app.delete("/collection/versions/{version}")
+async def delete_version(version: int):
+    refresh_active_version()
+    if version == collection_state["active_version"]:
+        raise HTTPException(status_code=409, detail="Cannot delete the active collection version")
+    if version not in list_collection_versions():
+        raise HTTPException(status_code=404, detail=f"Collection version {version} not found")
+    try:
+        qdrant_client.delete_collection(version_collection_name(version))
+        
+        return {"message": f"Collection version {version} deleted"}
+        
+    except Exception as e:
+        logger.error(f"Error deleting collection version {version}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error deleting collection version: {str(e)}")
+
 @app.delete("/collection/clear")
 async def clear_collection():
+    """Переключить алиас на новую пустую версию; предыдущая остаётся для отката"""
     try:
-        qdrant_client.delete_collection(COLLECTION_NAME)
-        await create_collection_if_not_exists()
+        version = next_collection_version()
+        create_collection_version(version)
+        deleted_versions = activate_collection_version(version)
         
-        return {"message": "Collection cleared successfully"}
+        return {
+            "message": "Collection cleared successfully",
+            "active_version": version,
+            "deleted_versions": deleted_versions
+        }
         
     except Exception as e:
         logger.error(f"Error clearing collection: {e}")
@@ -0,0 +1,119 @@
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunking import SemanticChunker, approximate_token_counter, hf_token_counter
+
+WORDS = (
+    "студент университет общежитие регистрация курс экзамен расписание стипендия библиотека декан "
+    "student university dormitory registration course exam schedule scholarship library dean "
+    "the of and in для и в на по с CSS-301 F-104 2024"
+).split()
+
+
+def make_text(size_mb: float, seed: int = 42) -> str:
+    """Синтетический документ: заголовки, абзацы разной длины, изредка очень длинные абзацы без точек"""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    section = 0
+    while size < size_mb * 2 ** 20:
+        if rng.random() < 0.08:
+            section += 1
+            heading = rng.choice([f"# Раздел {section}", f"{section}.1 Правила приёма", "ПРАВИЛА ПРОЖИВАНИЯ"])
+            parts.append(heading)
+            size += len(heading)
+        sentences = []
+        for _ in range(rng.randint(1, 12)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(4, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", "!", "?"]))
+        if rng.random() < 0.02:
+            sentences.append(" ".join(rng.choice(WORDS) for _ in range(500)))
+        paragraph = " ".join(sentences)
+        parts.append(paragraph)
+        size += len(paragraph)
+    return "\n\n".join(parts)
+
+
+def fixed_slices(text: str, chunk_size: int = 1000) -> List[str]:
+    """Прежнее разбиение DataLoader.load_from_txt"""
+    return [text[i:i + chunk_size].strip() for i in range(0, len(text), chunk_size) if text[i:i + chunk_size].strip()]
+
+
+def run(name: str, split: Callable[[str], list], text: str, count_tokens: Callable, max_tokens: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    chunks = split(text)
+    elapsed = time.perf_counter() - started
+
+    texts = [chunk if isinstance(chunk, str) else chunk.text for chunk in chunks]
+    tokens = count_tokens(texts)
+    offsets_ok = all(
+        text[chunk.char_start:chunk.char_end] == chunk.text for chunk in chunks if not isinstance(chunk, str)
+    )
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "mb_per_second": round(len(text) / 2 ** 20 / elapsed, 2),
+        "seconds": round(elapsed, 2),
+        "avg_tokens": round(sum(tokens) / max(len(tokens), 1), 1),
+        "max_tokens": max(tokens) if tokens else 0,
+        # Доля чанков, которые модель обрежет по max_seq_length
+        "over_limit": round(sum(1 for n in tokens if n > max_tokens) / max(len(tokens), 1), 4),
+        "offsets_ok": offsets_ok,
+    }
+
+
+def main():
+    """Пропускная способность SemanticChunker на многомегабайтном тексте в сравнении с нарезкой по символам"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark text chunking throughput")
+    parser.add_argument("--size-mb", type=float, default=8.0, help="Size of the synthetic text")
+    parser.add_argument("--file", type=str, help="Benchmark on a real text file instead")
+    parser.add_argument("--max-tokens", type=int, default=126, help="Max tokens per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=16, help="Overlap between chunks")
+    parser.add_argument("--tokenizer", type=str, default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                        help="HF tokenizer; 'none' - approximate counts only")
+    parser.add_argument("--output", type=str, help="Write results to JSON file")
+
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    else:
+        text = make_text(args.size_mb)
+    print(f"📄 Text size: {len(text) / 2 ** 20:.1f} MB")
+
+    counters = {"approximate": approximate_token_counter}
+    if args.tokenizer != "none":
+        try:
+            counters["tokenizer"] = hf_token_counter(args.tokenizer)
+        except Exception as e:
+            print(f"⚠️  Tokenizer {args.tokenizer} is not available: {e}")
+    # Размеры чанков меряются самым точным доступным счётчиком
+    reference = counters.get("tokenizer", approximate_token_counter)
+
+    results = [run("fixed-1000-chars", fixed_slices, text, reference, args.max_tokens)]
+    for name, counter in counters.items():
+        chunker = SemanticChunker(args.max_tokens, args.overlap_tokens, counter)
+        results.append(run(f"semantic-{name}", chunker.split, text, reference, args.max_tokens))
+
+    print(f"\n{'chunker':<22} {'chunks':>8} {'MB/s':>8} {'avg tok':>8} {'max tok':>8} {'over':>8} {'offsets':>8}")
+    for result in results:
+        print(
+            f"{result['chunker']:<22} {result['chunks']:>8} {result['mb_per_second']:>8} {result['avg_tokens']:>8} "
+            f"{result['max_tokens']:>8} {result['over_limit']:>8} {str(result['offsets_ok']):>8}"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+import time
+from typing import Any, Dict
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import OptimizersConfigDiff, PointStruct
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from collection_profiles import COLLECTION_PROFILES, get_profile, vector_params
+
+
+def make_corpus(points: int, queries: int, dim: int, clusters: int, seed: int = 42):
+    """Синтетический корпус: нормированные векторы вокруг случайных центров, как у эмбеддингов текстов"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        labels = rng.integers(0, clusters, size=count)
+        vectors = centers[labels] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return sample(points), sample(queries)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    """Точные соседи по косинусу (векторы уже нормированы)"""
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, top_k, axis=1)[:, :top_k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def wait_for_indexing(client: QdrantClient, collection_name: str, timeout: float = 600.0):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        info = client.get_collection(collection_name)
+        if info.status == "green" and (info.indexed_vectors_count or 0) >= (info.points_count or 0):
+            return
+        time.sleep(1)
+    print(f"⚠️  Indexing of {collection_name} did not finish in {timeout:.0f}s")
+
+
+def benchmark_profile(client: QdrantClient, name: str, corpus: np.ndarray, queries: np.ndarray,
+                      ground_truth: np.ndarray, top_k: int, keep: bool) -> Dict[str, Any]:
+    profile = get_profile(name)
+    collection_name = f"benchmark_{name}"
+
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vector_params(profile, corpus.shape[1]),
+        # Порог в КБ: HNSW строится даже для небольших сегментов, иначе поиск идёт полным перебором
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=10),
+    )
+
+    started = time.perf_counter()
+    client.upload_points(
+        collection_name=collection_name,
+        points=(PointStruct(id=i, vector=vector.tolist()) for i, vector in enumerate(corpus)),
+        batch_size=256,
+        parallel=2,
+        wait=True,
+    )
+    wait_for_indexing(client, collection_name)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, ground_truth):
+        query_started = time.perf_counter()
+        response = client.query_points(
+            collection_name=collection_name,
+            query=query.tolist(),
+            limit=top_k,
+            search_params=profile.search_params,
+        )
+        latencies.append(time.perf_counter() - query_started)
+        found = {point.id for point in response.points}
+        recalls.append(len(found & set(expected.tolist())) / top_k)
+
+    if not keep:
+        client.delete_collection(collection_name)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "profile": name,
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+        "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "latency_p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+        "qps": round(len(latencies) / float(np.sum(latencies)), 1),
+        "build_seconds": round(build_seconds, 1),
+    }
+
+
+def main():
+    """Сравнение профилей коллекции: recall@k и задержка поиска на синтетическом корпусе"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark collection profiles against a local Qdrant")
+    parser.add_argument("--qdrant-host", type=str, default="localhost", help="Qdrant host")
+    parser.add_argument("--qdrant-port", type=int, default=6333, help="Qdrant port")
+    parser.add_argument("--profiles", type=str, default=",".join(COLLECTION_PROFILES), help="Comma separated profiles")
+    parser.add_argument("--points", type=int, default=50000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="Number of topic clusters in the corpus")
+    parser.add_argument("--top-k", type=int, default=10, help="k for recall@k")
+    parser.add_argument("--keep", action='store_true', help="Keep benchmark collections")
+    parser.add_argument("--output", type=str, help="Write results to JSON file")
+
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.qdrant_host, port=args.qdrant_port)
+    corpus, queries = make_corpus(args.points, args.queries, args.dim, args.clusters)
+    ground_truth = exact_top_k(corpus, queries, args.top_k)
+
+    results = []
+    for name in [profile.strip() for profile in args.profiles.split(",") if profile.strip()]:
+        print(f"⏱️  Benchmarking profile '{name}' on {args.points} points...")
+        result = benchmark_profile(client, name, corpus, queries, ground_truth, args.top_k, args.keep)
+        print(f"   {result}")
+        results.append(result)
+
+    print(f"\n{'profile':<10} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'qps':>8}")
+    for result in results:
+        print(
+            f"{result['profile']:<10} {result[f'recall@{args.top_k}']:>10} {result['latency_p50_ms']:>8} "
+            f"{result['latency_p95_ms']:>8} {result['latency_p99_ms']:>8} {result['qps']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import json
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+import requests
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOCKET_PATH = "/tmp/rag-embedding-benchmark.sock"
+
+TOPICS = [
+    "регистрация на курсы", "общежитие", "стипендия", "расписание экзаменов", "библиотека",
+    "course registration", "dormitory", "scholarship", "exam schedule", "library hours",
+]
+
+
+def process_tree_rss(root_pid: int) -> int:
+    """Суммарный RSS процесса и всех его потомков (по /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Поле comm может содержать пробелы, поэтому разбор после последней ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def start_layout(layout: str, workers: int, port: int, base_env: Dict[str, str]) -> List[subprocess.Popen]:
+    env = dict(base_env)
+    processes = []
+    if layout == "shared":
+        env["EMBEDDING_SERVER_ADDRESS"] = SOCKET_PATH
+        env.setdefault("EMBEDDING_SERVER_AUTHKEY", secrets.token_hex(16))
+        processes.append(subprocess.Popen(
+            [sys.executable, "embedding_server.py", "--address", SOCKET_PATH],
+            cwd=SERVICE_DIR, env=env, start_new_session=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+
+    http_workers = 1 if layout == "single" else workers
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(http_workers), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    ))
+    return processes
+
+
+def stop_layout(processes: List[subprocess.Popen]):
+    for process in processes:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def wait_ready(service_url: str, timeout: float = 600.0):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if requests.get(f"{service_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    raise RuntimeError(f"Service at {service_url} is not ready after {timeout:.0f}s")
+
+
+def run_load(service_url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(client_id: int):
+        nonlocal errors
+        session = requests.Session()
+        counter = 0
+        while time.perf_counter() < deadline:
+            # Уникальные запросы, чтобы не попадать в кэш поиска
+            query = f"{TOPICS[(client_id + counter) % len(TOPICS)]} {client_id}-{counter}"
+            counter += 1
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{service_url}/search", json={"query": query, "top_k": 5}, timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for client_id in range(concurrency):
+            executor.submit(client, client_id)
+
+    latencies_ms = np.array(latencies or [0.0]) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "qps": round(len(latencies) / duration, 1),
+        "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "latency_p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+    }
+
+
+def benchmark_layout(layout: str, args) -> Dict[str, Any]:
+    service_url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, SEARCH_CACHE_SIZE="0", QDRANT_HOST=args.qdrant_host, QDRANT_PORT=str(args.qdrant_port))
+    processes = start_layout(layout, args.workers, args.port, env)
+    try:
+        wait_ready(service_url)
+        # В multi-worker режиме /ready отвечает первый готовый воркер; даём остальным догрузиться
+        time.sleep(args.settle)
+
+        documents = [
+            {"text": f"{TOPICS[i % len(TOPICS)]}: документ номер {i}", "metadata": {"source_file": "benchmark.txt"}}
+            for i in range(args.documents)
+        ]
+        requests.post(f"{service_url}/add_documents", json=documents, timeout=600).raise_for_status()
+
+        run_load(service_url, args.concurrency, min(5.0, args.duration))
+        result = run_load(service_url, args.concurrency, args.duration)
+        result["rss_mb"] = round(sum(process_tree_rss(process.pid) for process in processes) / 2 ** 20, 1)
+        result["layout"] = layout
+        result["http_workers"] = 1 if layout == "single" else args.workers
+        return result
+    finally:
+        stop_layout(processes)
+
+
+def main():
+    """Сравнение схем запуска: один воркер, N воркеров со своей моделью, N воркеров с общим embedding-сервером"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark single, multi-worker and shared-model layouts")
+    parser.add_argument("--layouts", type=str, default="single,workers,shared", help="Comma separated layouts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="HTTP workers for multi-worker layouts")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured load duration in seconds")
+    parser.add_argument("--documents", type=int, default=1000, help="Documents to index before the load")
+    parser.add_argument("--settle", type=float, default=10.0, help="Seconds to wait for all workers after /ready")
+    parser.add_argument("--port", type=int, default=8100, help="Port for the benchmarked service")
+    parser.add_argument("--qdrant-host", type=str, default="localhost", help="Qdrant host")
+    parser.add_argument("--qdrant-port", type=int, default=6333, help="Qdrant port")
+    parser.add_argument("--output", type=str, help="Write results to JSON file")
+
+    args = parser.parse_args()
+
+    results = []
+    for layout in [layout.strip() for layout in args.layouts.split(",") if layout.strip()]:
+        print(f"⏱️  Benchmarking layout '{layout}'...")
+        result = benchmark_layout(layout, args)
+        print(f"   {result}")
+        results.append(result)
+
+    print(f"\n{'layout':<8} {'workers':>8} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+    for result in results:
+        print(
+            f"{result['layout']:<8} {result['http_workers']:>8} {result['qps']:>8} {result['latency_p50_ms']:>8} "
+            f"{result['latency_p95_ms']:>8} {result['latency_p99_ms']:>8} {result['rss_mb']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = [
+    "Как зарегистрироваться на курсы?", "Где находится общежитие?", "Когда выплачивается стипендия?",
+    "How do I register for courses?", "What are the library hours?", "Where can I find the exam schedule?",
+]
+ANSWER_WORDS = (
+    "студент университет общежитие регистрация курс экзамен расписание стипендия библиотека декан "
+    "student university dormitory registration course exam schedule scholarship library dean"
+).split()
+
+
+def make_document(rng: random.Random, number: int) -> Dict[str, Any]:
+    answer = " ".join(rng.choice(ANSWER_WORDS) for _ in range(rng.randint(40, 120)))
+    return {
+        "id": number,
+        "text": f"{rng.choice(QUESTIONS)} {answer}.",
+        "category": rng.choice(["faq", "rules", "schedule"]),
+        "language": rng.choice(["ru", "en", "kk"]),
+    }
+
+
+def generate_file(path: str, file_format: str, size_bytes: int, seed: int = 42) -> int:
+    """Синтетическая выгрузка FAQ заданного размера; пишется потоково, документы не копятся в памяти"""
+    rng = random.Random(seed)
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if file_format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(["text", "id", "category", "language"])
+        elif file_format == "json":
+            f.write("[\n")
+        while f.tell() < size_bytes:
+            document = make_document(rng, count)
+            if file_format == "csv":
+                writer.writerow([document["text"], document["id"], document["category"], document["language"]])
+            elif file_format == "json":
+                f.write((",\n" if count else "") + json.dumps(document, ensure_ascii=False))
+            else:
+                f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            count += 1
+        if file_format == "json":
+            f.write("\n]\n")
+    return count
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Заглушка /add_documents: считает принятые документы"""
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        documents = json.loads(body)
+        with StubHandler.lock:
+            StubHandler.received += len(documents)
+        response = json.dumps({"message": "ok", "ids": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def ingest(path: str, service_url: str, workers: int, batch_size: int, checkpoint_dir: str) -> Dict[str, Any]:
+    """Загрузка файла через CLI data_loader.py в отдельном процессе; пиковый RSS берётся из wait4"""
+    command = [
+        sys.executable, os.path.join(SRC_DIR, "data_loader.py"), "--file", path,
+        "--service-url", service_url, "--workers", str(workers), "--batch-size", str(batch_size),
+        "--checkpoint-dir", checkpoint_dir, "--tokenizer", "none",
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    # Popen.wait не возвращает rusage, поэтому статус и пиковую память процесса забирает wait4
+    stderr = process.stderr.read()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - started
+    return {
+        "returncode": process.returncode,
+        "seconds": round(elapsed, 1),
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+        "failed": "Failed to load data" in stderr,
+        "stderr_tail": stderr[-2000:],
+    }
+
+
+def main():
+    """Проверка, что пиковая память загрузчика не зависит от размера файла"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest a synthetic multi-GB export under an RSS cap")
+    parser.add_argument("--size-gb", type=float, default=2.0, help="Size of each synthetic file")
+    parser.add_argument("--formats", type=str, default="json,ndjson,csv", help="Comma-separated: json,ndjson,csv")
+    parser.add_argument("--rss-cap-mb", type=float, default=128, help="Fail if the loader's peak RSS exceeds this")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent batch uploads")
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per upload request")
+    parser.add_argument("--dir", type=str, help="Where to write synthetic files (default: temp dir)")
+    parser.add_argument("--keep", action='store_true', help="Keep generated files")
+    parser.add_argument("--output", type=str, help="Write results to JSON file")
+
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix="ingest-check-")
+    os.makedirs(work_dir, exist_ok=True)
+    size_bytes = int(args.size_gb * 2 ** 30)
+    results = []
+    ok = True
+
+    for file_format in args.formats.split(","):
+        path = os.path.join(work_dir, f"export.{file_format}")
+        print(f"📝 Generating {args.size_gb} GB {file_format} file...")
+        expected = generate_file(path, file_format, size_bytes)
+
+        StubHandler.received = 0
+        result = ingest(path, service_url, args.workers, args.batch_size, os.path.join(work_dir, "checkpoints"))
+        result.update({
+            "format": file_format,
+            "file_mb": round(os.path.getsize(path) / 2 ** 20, 1),
+            "documents": expected,
+            "received": StubHandler.received,
+            "mb_per_second": round(os.path.getsize(path) / 2 ** 20 / max(result["seconds"], 1e-9), 1),
+        })
+        passed = (
+            result["returncode"] == 0 and not result["failed"]
+            and result["received"] == expected and result["peak_rss_mb"] <= args.rss_cap_mb
+        )
+        result["passed"] = passed
+        ok = ok and passed
+        results.append(result)
+
+        status = "✅" if passed else "❌"
+        print(
+            f"{status} {file_format}: {result['file_mb']} MB, {result['received']}/{expected} documents, "
+            f"peak RSS {result['peak_rss_mb']} MB (cap {args.rss_cap_mb}), "
+            f"{result['seconds']} s, {result['mb_per_second']} MB/s"
+        )
+        if not passed and result["stderr_tail"]:
+            print(result["stderr_tail"])
+
+        if not args.keep:
+            os.remove(path)
+
+    server.shutdown()
+    if not args.keep and not args.dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
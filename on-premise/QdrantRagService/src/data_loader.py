@@ -1,115 +1,278 @@
 import json
 import csv
 import os
+import sys
 import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice, repeat
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunking import SemanticChunker, approximate_token_counter, hf_token_counter
+from extractors import EXTRACTOR_VERSION, extract_docx, extract_html, extract_pdf_pages, pdf_page_count
+from json_stream import iter_json_items
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO) 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = {
+    '.json': 'json', '.jsonl': 'json', '.ndjson': 'json', '.csv': 'csv', '.txt': 'txt', '.md': 'txt',
+    '.pdf': 'pdf', '.docx': 'docx', '.html': 'html', '.htm': 'html'
+}
+# Страниц PDF на одну задачу процесса: меньше - лучше баланс, больше - реже повторное открытие файла
+PDF_PAGES_PER_TASK = 8
+# Ответы, после которых повтор имеет смысл: перегрузка и временные ошибки сервиса
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Токенизатор той же модели, что кодирует чанки в сервисе
+DEFAULT_TOKENIZER = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+# max_seq_length модели по умолчанию 128, минус [CLS] и [SEP]; длиннее модель обрежет
+DEFAULT_MAX_TOKENS = 126
+DEFAULT_OVERLAP_TOKENS = 16
+
+
 class DataLoader:
-    def __init__(self, service_url: str = "http://localhost:8000"):
+    def __init__(self, service_url: str = "http://localhost:8000", workers: int = 4, batch_size: int = 50,
+                 max_retries: int = 5, backoff: float = 1.0, checkpoint_dir: Optional[str] = ".ingest_checkpoints",
+                 tokenizer: Optional[str] = DEFAULT_TOKENIZER, extract_workers: Optional[int] = None,
+                 extract_cache_dir: Optional[str] = ".extract_cache", source_root: str = "."):
         self.service_url = service_url
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # None - без чекпоинтов, файл всегда загружается целиком
+        self.checkpoint_dir = checkpoint_dir
+        # Ключи источников (source_file и id точек) - пути относительно этого каталога
+        self.source_root = source_root
+        
+        # Keep-alive соединения; пул не меньше числа параллельных загрузок
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        
+        # None - приблизительный подсчёт токенов без загрузки токенизатора
+        self.tokenizer = tokenizer
+        self._token_counter = None
+        self._chunker_lock = threading.Lock()
+        
+        # Извлечение текста из PDF/DOCX/HTML - CPU-bound, поэтому в отдельных процессах
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.extract_cache_dir = extract_cache_dir
+        self._extract_executor = None
+        self._extract_lock = threading.Lock()
         
     def load_from_json(self, file_path: str) -> List[Dict[str, Any]]:
         """Загрузка данных из JSON файла"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            documents = []
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        text = item.get('text', str(item))
-                        metadata = {k: v for k, v in item.items() if k != 'text'}
-                        documents.append({
-                            "text": text,
-                            "metadata": metadata
-                        })
-                    else:
-                        documents.append({
-                            "text": str(item),
-                            "metadata": {}
-                        })
-            else:
-                documents.append({
-                    "text": str(data),
-                    "metadata": {}
-                })
-            
-            return documents
+            return list(self.iter_json(file_path))
             
         except Exception as e:
             logger.error(f"Error loading JSON file {file_path}: {e}")
             return []
     
+    def iter_json(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Потоковое чтение JSON-массива или NDJSON: память не зависит от размера файла"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for item in iter_json_items(f):
+                if isinstance(item, dict):
+                    text = item.pop('text', None)
+                    yield {
+                        "text": str(item) if text is None else text,
+                        "metadata": item
+                    }
+                else:
+                    yield {
+                        "text": str(item),
+                        "metadata": {}
+                    }
+    
     def load_from_csv(self, file_path: str, text_column: str = None) -> List[Dict[str, Any]]:
         """Загрузка данных из CSV файла"""
         try:
-            documents = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if text_column and text_column in row:
-                        text = row[text_column]
-                        metadata = {k: v for k, v in row.items() if k != text_column}
-                    else:
-                        # Если колонка не указана, используем первую колонку как текст
-                        columns = list(row.keys())
-                        text = row[columns[0]] if columns else ""
-                        metadata = {k: v for k, v in row.items() if k != columns[0]} if len(columns) > 1 else {}
-                    
-                    documents.append({
-                        "text": text,
-                        "metadata": metadata
-                    })
-            
-            return documents
+            return list(self.iter_csv(file_path, text_column))
             
         except Exception as e:
             logger.error(f"Error loading CSV file {file_path}: {e}")
             return []
     
-    def load_from_txt(self, file_path: str, chunk_size: int = 1000) -> List[Dict[str, Any]]:
+    def iter_csv(self, file_path: str, text_column: str = None) -> Iterator[Dict[str, Any]]:
+        """Потоковое чтение CSV построчно"""
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            columns = next(reader, None)
+            if not columns:
+                return
+            # Колонка текста определяется один раз по заголовку; если не указана - первая колонка
+            text_index = columns.index(text_column) if text_column in columns else 0
+            metadata_columns = [(i, name) for i, name in enumerate(columns) if i != text_index]
+            
+            for row in reader:
+                if not row:
+                    continue
+                yield {
+                    "text": row[text_index] if text_index < len(row) else "",
+                    "metadata": {name: row[i] if i < len(row) else None for i, name in metadata_columns}
+                }
+    
+    def get_chunker(self, max_tokens: int = DEFAULT_MAX_TOKENS,
+                    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> SemanticChunker:
+        with self._chunker_lock:
+            if self._token_counter is None:
+                if self.tokenizer:
+                    try:
+                        self._token_counter = hf_token_counter(self.tokenizer)
+                    except Exception as e:
+                        logger.warning(f"Tokenizer {self.tokenizer} is not available ({e}), using approximate token counts")
+                        self._token_counter = approximate_token_counter
+                else:
+                    self._token_counter = approximate_token_counter
+        return SemanticChunker(max_tokens, overlap_tokens, self._token_counter)
+    
+    def load_from_txt(self, file_path: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                      overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
         """Загрузка данных из текстового файла с разбивкой на чанки"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            documents = []
-            # Разбиваем текст на чанки
-            for i in range(0, len(content), chunk_size):
-                chunk = content[i:i + chunk_size]
-                if chunk.strip():  # Пропускаем пустые чанки
-                    documents.append({
-                        "text": chunk.strip(),
-                        "metadata": {
-                            "source_file": os.path.basename(file_path),
-                            "chunk_index": i // chunk_size,
-                            "char_start": i,
-                            "char_end": min(i + chunk_size, len(content))
-                        }
-                    })
-            
-            return documents
+            return list(self.iter_txt(file_path, max_tokens, overlap_tokens))
             
         except Exception as e:
             logger.error(f"Error loading TXT file {file_path}: {e}")
             return []
     
+    def iter_txt(self, file_path: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 overlap_tokens: int = DEFAULT_OVERLAP_TOKENS, source_file: str = None) -> Iterator[Dict[str, Any]]:
+        """Разбиение текста на чанки по заголовкам, абзацам и предложениям; char_start/char_end - позиции в файле"""
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        
+        chunker = self.get_chunker(max_tokens, overlap_tokens)
+        for chunk_index, chunk in enumerate(chunker.split(content)):
+            metadata = {
+                "source_file": source_file or self.source_key(file_path),
+                "chunk_index": chunk_index,
+                "char_start": chunk.char_start,
+                "char_end": chunk.char_end,
+                "token_count": chunk.token_count
+            }
+            if chunk.section:
+                metadata["section"] = chunk.section
+            yield {
+                "text": chunk.text,
+                "metadata": metadata
+            }
+    
+    def get_extract_executor(self) -> ProcessPoolExecutor:
+        with self._extract_lock:
+            if self._extract_executor is None:
+                self._extract_executor = ProcessPoolExecutor(max_workers=self.extract_workers)
+            return self._extract_executor
+    
+    def file_sha256(self, file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def iter_pages(self, file_path: str, file_type: str) -> Iterator[Dict[str, Any]]:
+        """Страницы документа; результат извлечения кэшируется по хэшу содержимого файла"""
+        cache_path = None
+        if self.extract_cache_dir is not None:
+            cache_path = os.path.join(self.extract_cache_dir, f"{self.file_sha256(file_path)}.json")
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, 'r', encoding='utf-8') as f:
+                        cached = json.load(f)
+                    if cached.get("version") == EXTRACTOR_VERSION:
+                        logger.info(f"{file_path} is unchanged, using cached extraction")
+                        yield from cached["pages"]
+                        return
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable extraction cache {cache_path}: {e}")
+        
+        executor = self.get_extract_executor()
+        if file_type == 'pdf':
+            page_count = executor.submit(pdf_page_count, file_path).result()
+            firsts = list(range(1, page_count + 1, PDF_PAGES_PER_TASK))
+            lasts = [min(first + PDF_PAGES_PER_TASK - 1, page_count) for first in firsts]
+            # map отдаёт результаты по порядку по мере готовности, страницы сразу уходят в чанкер и загрузку
+            parts = executor.map(extract_pdf_pages, repeat(file_path), firsts, lasts)
+        elif file_type == 'docx':
+            parts = [executor.submit(extract_docx, file_path).result()]
+        else:
+            parts = [executor.submit(extract_html, file_path).result()]
+        
+        pages = []
+        for part in parts:
+            for page in part:
+                pages.append(page)
+                yield page
+        
+        if cache_path is not None:
+            os.makedirs(self.extract_cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": EXTRACTOR_VERSION, "file": os.path.basename(file_path), "pages": pages}, f)
+            os.replace(tmp_path, cache_path)
+    
+    def iter_extracted(self, file_path: str, file_type: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                       overlap_tokens: int = DEFAULT_OVERLAP_TOKENS, source_file: str = None) -> Iterator[Dict[str, Any]]:
+        """Чанки PDF/DOCX/HTML; char_start/char_end - позиции в тексте страницы"""
+        chunker = self.get_chunker(max_tokens, overlap_tokens)
+        chunk_index = 0
+        for page in self.iter_pages(file_path, file_type):
+            for chunk in chunker.split(page["text"]):
+                metadata = {
+                    "source_file": source_file or self.source_key(file_path),
+                    "chunk_index": chunk_index,
+                    "char_start": chunk.char_start,
+                    "char_end": chunk.char_end,
+                    "token_count": chunk.token_count
+                }
+                if page.get("page_number") is not None:
+                    metadata["page_number"] = page["page_number"]
+                if page.get("title"):
+                    metadata["title"] = page["title"]
+                if chunk.section:
+                    metadata["section"] = chunk.section
+                chunk_index += 1
+                yield {
+                    "text": chunk.text,
+                    "metadata": metadata
+                }
+    
+    def post_with_retry(self, path: str, payload: Any) -> requests.Response:
+        """POST с повторами и экспоненциальной задержкой при сетевых ошибках и 429/5xx"""
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(f"{self.service_url}{path}", json=payload, timeout=300)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                error = f"{response.status_code} - {response.text[:200]}"
+            except requests.RequestException as e:
+                error = str(e)
+            
+            if attempt >= self.max_retries:
+                raise RuntimeError(f"POST {path} failed after {attempt + 1} attempts: {error}")
+            delay = self.backoff * 2 ** attempt
+            logger.warning(f"POST {path} failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+    
     def upload_documents(self, documents: List[Dict[str, Any]]) -> bool:
         """Загрузка документов в RAG сервис"""
         try:
-            response = requests.post(
-                f"{self.service_url}/add_documents",
-                json=documents,
-                headers={"Content-Type": "application/json"}
-            )
+            response = self.post_with_retry("/add_documents", documents)
             
             if response.status_code == 200:
                 result = response.json()
@@ -123,55 +286,256 @@ class DataLoader:
             logger.error(f"Error uploading documents: {e}")
             return False
     
-    def load_and_upload_file(self, file_path: str, file_type: str = None, **kwargs) -> bool:
-        """Загрузка и отправка файла в RAG сервис"""
+    def detect_file_type(self, file_path: str) -> Optional[str]:
+        return SUPPORTED_EXTENSIONS.get(Path(file_path).suffix.lower())
+    
+    def iter_documents(self, file_path: str, file_type: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        """Генератор документов файла в зависимости от типа"""
+        source_file = kwargs.get('source_file') or self.source_key(file_path)
+        if file_type == 'json':
+            return self.with_source(self.iter_json(file_path), source_file)
+        elif file_type == 'csv':
+            return self.with_source(self.iter_csv(file_path, kwargs.get('text_column')), source_file)
+        elif file_type == 'txt':
+            return self.iter_txt(
+                file_path,
+                kwargs.get('max_tokens', DEFAULT_MAX_TOKENS),
+                kwargs.get('overlap_tokens', DEFAULT_OVERLAP_TOKENS),
+                source_file
+            )
+        elif file_type in ('pdf', 'docx', 'html'):
+            return self.iter_extracted(
+                file_path,
+                file_type,
+                kwargs.get('max_tokens', DEFAULT_MAX_TOKENS),
+                kwargs.get('overlap_tokens', DEFAULT_OVERLAP_TOKENS),
+                source_file
+            )
+        raise ValueError(f"Unsupported file type: {file_type}")
+    
+    def with_source(self, documents: Iterator[Dict[str, Any]], source_file: str) -> Iterator[Dict[str, Any]]:
+        """Записи JSON/CSV без своего источника получают ключ файла: одинаковые тексты разных файлов не сливаются в одну точку"""
+        for document in documents:
+            metadata = document["metadata"]
+            if not (metadata.get("source_file") or metadata.get("source")):
+                metadata["source_file"] = source_file
+            yield document
+    
+    def load_file(self, file_path: str, file_type: str = None, **kwargs) -> List[Dict[str, Any]]:
+        """Чтение файла в список документов в зависимости от типа"""
         if not os.path.exists(file_path):
             logger.error(f"File not found: {file_path}")
-            return False
+            return []
         
         # Определение типа файла
         if file_type is None:
-            file_extension = Path(file_path).suffix.lower()
-            if file_extension == '.json':
-                file_type = 'json'
-            elif file_extension == '.csv':
-                file_type = 'csv'
-            elif file_extension in ['.txt', '.md']:
-                file_type = 'txt'
-            else:
-                logger.error(f"Unsupported file type: {file_extension}")
-                return False
+            file_type = self.detect_file_type(file_path)
+            if file_type is None:
+                logger.error(f"Unsupported file type: {Path(file_path).suffix.lower()}")
+                return []
         
-        # Загрузка документов в зависимости от типа
-        if file_type == 'json':
-            documents = self.load_from_json(file_path)
-        elif file_type == 'csv':
-            text_column = kwargs.get('text_column')
-            documents = self.load_from_csv(file_path, text_column)
-        elif file_type == 'txt':
-            chunk_size = kwargs.get('chunk_size', 1000)
-            documents = self.load_from_txt(file_path, chunk_size)
-        else:
-            logger.error(f"Unsupported file type: {file_type}")
-            return False
+        try:
+            documents = list(self.iter_documents(file_path, file_type, **kwargs))
+        except Exception as e:
+            logger.error(f"Error loading {file_type} file {file_path}: {e}")
+            return []
         
         if not documents:
             logger.warning(f"No documents loaded from {file_path}")
+        
+        return documents
+    
+    def checkpoint_path(self, file_path: str) -> Optional[str]:
+        if self.checkpoint_dir is None:
+            return None
+        key = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.checkpoint_dir, f"{Path(file_path).name}.{key}.json")
+    
+    def file_fingerprint(self, file_path: str, file_type: str, **kwargs) -> str:
+        """Чекпоинт действителен, пока не изменились файл и параметры разбиения на батчи"""
+        stat = os.stat(file_path)
+        params = json.dumps({"type": file_type, "batch_size": self.batch_size, "source_file": self.source_key(file_path),
+                             **kwargs}, sort_keys=True)
+        return f"{stat.st_size}:{stat.st_mtime_ns}:{params}"
+    
+    def read_checkpoint(self, file_path: str, fingerprint: str) -> Tuple[int, set]:
+        """(все батчи до done_through включительно загружены, загруженные батчи после него)"""
+        path = self.checkpoint_path(file_path)
+        if path is None or not os.path.exists(path):
+            return 0, set()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return 0, set()
+        if checkpoint.get("fingerprint") != fingerprint:
+            logger.info(f"{file_path} changed since the last run, starting from the beginning")
+            return 0, set()
+        return checkpoint.get("done_through", 0), set(checkpoint.get("done_batches", []))
+    
+    def write_checkpoint(self, file_path: str, fingerprint: str, done_through: int, done_batches: set):
+        path = self.checkpoint_path(file_path)
+        if path is None:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # Запись через временный файл, чтобы прерванный процесс не оставил битый чекпоинт
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "file": os.path.abspath(file_path),
+                "fingerprint": fingerprint,
+                "done_through": done_through,
+                "done_batches": sorted(done_batches)
+            }, f)
+        os.replace(tmp_path, path)
+    
+    def load_and_upload_file(self, file_path: str, file_type: str = None, **kwargs) -> bool:
+        """Потоковая загрузка файла: батчи читаются генератором и отправляются параллельно
+        
+        Номера успешно загруженных батчей сохраняются в чекпоинт, повторный запуск
+        пропускает их. Повторная отправка батча безопасна: id точек зависят от содержимого.
+        """
+        if not os.path.exists(file_path):
+            logger.error(f"File not found: {file_path}")
+            return False
+        
+        file_type = file_type or self.detect_file_type(file_path)
+        if file_type is None:
+            logger.error(f"Unsupported file type: {Path(file_path).suffix.lower()}")
             return False
         
-        logger.info(f"Loaded {len(documents)} documents from {file_path}")
+        fingerprint = self.file_fingerprint(file_path, file_type, **kwargs)
+        done_through, done_batches = self.read_checkpoint(file_path, fingerprint)
+        if done_through or done_batches:
+            logger.info(f"Resuming {file_path}: {done_through + len(done_batches)} batches already uploaded")
+        # Непрерывный префикс батчей хранится одним числом: размер чекпоинта ограничен
+        # числом батчей в полёте, а не числом батчей в файле
+        progress = {"done_through": done_through}
         
-        # Загрузка в сервис батчами
-        batch_size = 50
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            if not self.upload_documents(batch):
-                logger.error(f"Failed to upload batch {i // batch_size + 1}")
-                return False
-            logger.info(f"Uploaded batch {i // batch_size + 1}/{(len(documents) - 1) // batch_size + 1}")
+        lock = threading.Lock()
+        # Ограничение батчей в полёте: чтение файла не убегает вперёд загрузки
+        max_in_flight = self.workers * 2
+        in_flight = threading.BoundedSemaphore(max_in_flight)
+        stats = {"batches": 0, "documents": 0, "failed": 0}
+        
+        def upload_batch(batch_number: int, batch: List[Dict[str, Any]]):
+            try:
+                response = self.post_with_retry("/add_documents", batch)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{response.status_code} - {response.text[:200]}")
+                with lock:
+                    done_batches.add(batch_number)
+                    while progress["done_through"] + 1 in done_batches:
+                        progress["done_through"] += 1
+                        done_batches.remove(progress["done_through"])
+                    stats["documents"] += len(batch)
+                    self.write_checkpoint(file_path, fingerprint, progress["done_through"], done_batches)
+            except Exception as e:
+                logger.error(f"Failed to upload batch {batch_number} of {file_path}: {e}")
+                with lock:
+                    stats["failed"] += 1
+            finally:
+                in_flight.release()
+        
+        try:
+            documents = self.iter_documents(file_path, file_type, **kwargs)
+            batch_number = 0
+            while True:
+                batch = list(islice(documents, self.batch_size))
+                if not batch:
+                    break
+                batch_number += 1
+                stats["batches"] += 1
+                if batch_number <= progress["done_through"] or batch_number in done_batches:
+                    continue
+                in_flight.acquire()
+                self.executor.submit(upload_batch, batch_number, batch)
+        except Exception as e:
+            logger.error(f"Error reading {file_type} file {file_path}: {e}")
+            with lock:
+                stats["failed"] += 1
+        
+        # Все разрешения семафора вернулись - все батчи завершены; список futures не хранится,
+        # иначе память росла бы с числом батчей в файле
+        for _ in range(max_in_flight):
+            in_flight.acquire()
+        
+        if stats["batches"] == 0:
+            logger.warning(f"No documents loaded from {file_path}")
+            return False
+        
+        if stats["failed"]:
+            logger.error(
+                f"{file_path}: {stats['failed']} batches failed, progress saved; re-run to resume"
+            )
+            return False
         
+        checkpoint = self.checkpoint_path(file_path)
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        logger.info(f"Uploaded {file_path}: {stats['documents']} documents in {stats['batches']} batches")
         return True
     
+    def source_key(self, file_path: str) -> str:
+        """Ключ источника: путь относительно source_root, одинаковый в режимах --file и --dir
+        
+        Одноимённые файлы из разных подкаталогов (a/faq.txt и b/faq.txt) получают разные ключи
+        и не удаляют чанки друг друга при синхронизации.
+        """
+        return Path(os.path.relpath(file_path, self.source_root)).as_posix()
+    
+    def load_directory(self, dir_path: str, file_workers: int = 2, sync: bool = False, **kwargs) -> bool:
+        """Параллельная загрузка (или синхронизация) всех поддерживаемых файлов в дереве каталогов"""
+        files = sorted(
+            str(path) for path in Path(dir_path).rglob("*")
+            if path.is_file() and self.detect_file_type(str(path)) is not None
+            and not any(part.startswith(".") for part in path.relative_to(dir_path).parts)
+        )
+        if not files:
+            logger.error(f"No supported files found in {dir_path}")
+            return False
+        
+        logger.info(f"Loading {len(files)} files from {dir_path}")
+        # Файлы читаются параллельно, загрузка батчей идёт через общий пул self.executor
+        with ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix="file") as file_executor:
+            load = self.sync_file if sync else self.load_and_upload_file
+            results = list(file_executor.map(
+                lambda path: load(path, **kwargs), files
+            ))
+        
+        failed = [path for path, ok in zip(files, results) if not ok]
+        for path in failed:
+            logger.error(f"Failed to load {path}")
+        logger.info(f"Loaded {len(files) - len(failed)}/{len(files)} files from {dir_path}")
+        return not failed
+    
+    def sync_file(self, file_path: str, file_type: str = None, **kwargs) -> bool:
+        """Инкрементальная синхронизация файла: сервис добавляет и удаляет только изменившиеся чанки"""
+        documents = self.load_file(file_path, file_type, **kwargs)
+        if not documents:
+            return False
+        
+        source_key = kwargs.get('source_file') or self.source_key(file_path)
+        
+        try:
+            response = self.post_with_retry("/sync", {"source_key": source_key, "documents": documents})
+            
+            if response.status_code == 200:
+                result = response.json()
+                logger.info(
+                    f"Synced {source_key}: added {result['added_count']}, updated {result['updated_count']}, "
+                    f"deleted {result['deleted_count']}, unchanged {result['unchanged_count']}"
+                )
+                return True
+            else:
+                logger.error(f"Error syncing {source_key}: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            logger.error(f"Error syncing {source_key}: {e}")
+            return False
+    
     def load_sample_data(self) -> bool:
         """Загрузка примеров данных для тестирования"""
         sample_documents = [
@@ -205,15 +569,38 @@ def main():
     
     parser = argparse.ArgumentParser(description="Data Loader for RAG Service")
     parser.add_argument("--file", type=str, help="Path to data file")
-    parser.add_argument("--type", type=str, choices=['json', 'csv', 'txt'], help="File type")
+    parser.add_argument("--dir", type=str, help="Load all supported files in a directory tree")
+    parser.add_argument("--type", type=str, choices=['json', 'csv', 'txt', 'pdf', 'docx', 'html'], help="File type")
     parser.add_argument("--text-column", type=str, help="Text column name for CSV files")
-    parser.add_argument("--chunk-size", type=int, default=1000, help="Chunk size for TXT files")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Max tokens per TXT chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS, help="Tokens shared by neighbouring chunks")
+    parser.add_argument("--tokenizer", type=str, default=DEFAULT_TOKENIZER, help="Tokenizer for chunk sizes; 'none' - approximate counts")
     parser.add_argument("--sample", action='store_true', help="Load sample data")
+    parser.add_argument("--sync", action='store_true', help="Sync files incrementally instead of uploading all chunks")
+    parser.add_argument("--source-root", type=str, default=".", help="Source keys (point ids, /sync) are paths relative to this directory")
     parser.add_argument("--service-url", type=str, default="http://localhost:8000", help="RAG service URL")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent batch uploads")
+    parser.add_argument("--file-workers", type=int, default=2, help="Files read in parallel in --dir mode")
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per upload request")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per batch on network errors and 429/5xx")
+    parser.add_argument("--checkpoint-dir", type=str, default=".ingest_checkpoints", help="Where resume checkpoints are kept")
+    parser.add_argument("--no-resume", action='store_true', help="Ignore checkpoints and upload files from the start")
+    parser.add_argument("--extract-workers", type=int, help="Processes extracting PDF/DOCX/HTML text (default: CPU count)")
+    parser.add_argument("--extract-cache-dir", type=str, default=".extract_cache", help="Cache of extracted text by file hash")
     
     args = parser.parse_args()
     
-    loader = DataLoader(args.service_url)
+    loader = DataLoader(
+        args.service_url,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_retries=args.max_retries,
+        checkpoint_dir=None if args.no_resume else args.checkpoint_dir,
+        tokenizer=None if args.tokenizer == 'none' else args.tokenizer,
+        extract_workers=args.extract_workers,
+        extract_cache_dir=args.extract_cache_dir,
+        source_root=args.source_root
+    )
     
     if args.sample:
         logger.info("Loading sample data...")
@@ -223,15 +610,23 @@ def main():
             logger.error("Failed to load sample data")
             return
     
+    kwargs = {}
+    if args.text_column:
+        kwargs['text_column'] = args.text_column
+    kwargs['max_tokens'] = args.max_tokens
+    kwargs['overlap_tokens'] = args.overlap_tokens
+    
+    if args.dir:
+        logger.info(f"Loading data from directory {args.dir}...")
+        if loader.load_directory(args.dir, file_workers=args.file_workers, sync=args.sync, **kwargs):
+            logger.info("Directory loaded successfully!")
+        else:
+            logger.error("Failed to load some files, re-run to resume")
+    
     if args.file:
         logger.info(f"Loading data from {args.file}...")
-        kwargs = {}
-        if args.text_column:
-            kwargs['text_column'] = args.text_column
-        if args.chunk_size:
-            kwargs['chunk_size'] = args.chunk_size
-            
-        if loader.load_and_upload_file(args.file, args.type, **kwargs):
+        load = loader.sync_file if args.sync else loader.load_and_upload_file
+        if load(args.file, args.type, **kwargs):
             logger.info("Data loaded successfully!")
         else:
             logger.error("Failed to load data")
@@ -0,0 +1,241 @@
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from test_client import RAGTestClient
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IN_PROCESS_URL = "http://testserver"
+INGEST_BATCH_SIZE = 64
+
+
+def load_eval_set(path: str) -> Dict[str, Any]:
+    """Набор для оценки: {"documents": [...], "queries": [...]} или JSON-массив / NDJSON одних запросов
+
+    Запрос: {"id": "q1", "query": "...", "relevant": ["doc-1"] или {"doc-1": 2, "doc-7": 1}, "filter": {...}}.
+    Список relevant - бинарная релевантность, словарь - градуированная для nDCG.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        data = [json.loads(line) for line in content.splitlines() if line.strip()]
+    if isinstance(data, list):
+        data = {"queries": data}
+
+    for number, query in enumerate(data.get("queries", []), 1):
+        query.setdefault("id", f"q{number}")
+        relevant = query.get("relevant", [])
+        query["relevant"] = {str(key): grade for key, grade in relevant.items()} if isinstance(relevant, dict) \
+            else {str(key): 1 for key in relevant}
+    return data
+
+
+def ranked_ids(results: List[Dict[str, Any]], id_field: str) -> List[str]:
+    """Идентификаторы документов в порядке выдачи; чанки одного документа засчитываются один раз"""
+    seen = []
+    for result in results:
+        doc_id = (result.get("metadata") or {}).get(id_field)
+        if doc_id is not None and str(doc_id) not in seen:
+            seen.append(str(doc_id))
+    return seen
+
+
+def recall_at_k(ranked: List[str], relevant: Dict[str, float], k: int) -> float:
+    if not relevant:
+        return 0.0
+    return sum(1 for doc_id in ranked[:k] if relevant.get(doc_id, 0) > 0) / sum(1 for grade in relevant.values() if grade > 0)
+
+
+def reciprocal_rank(ranked: List[str], relevant: Dict[str, float], k: int) -> float:
+    for position, doc_id in enumerate(ranked[:k], 1):
+        if relevant.get(doc_id, 0) > 0:
+            return 1.0 / position
+    return 0.0
+
+
+def ndcg_at_k(ranked: List[str], relevant: Dict[str, float], k: int) -> float:
+    """nDCG с усилением 2^grade - 1"""
+    dcg = sum((2 ** relevant.get(doc_id, 0) - 1) / math.log2(position + 2) for position, doc_id in enumerate(ranked[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** grade - 1) / math.log2(position + 2) for position, grade in enumerate(ideal))
+    return dcg / idcg if idcg > 0 else 0.0
+
+
+def run_query(client: RAGTestClient, query: Dict[str, Any], args) -> Dict[str, Any]:
+    options = {}
+    if args.mmr_lambda is not None:
+        options["mmr_lambda"] = args.mmr_lambda
+    if args.collapse_adjacent:
+        options["collapse_adjacent"] = True
+
+    started = time.perf_counter()
+    try:
+        response = client.search_raw(
+            query["query"],
+            top_k=args.top_k,
+            threshold=args.threshold,
+            metadata_filter=query.get("filter"),
+            mode=query.get("mode", args.mode),
+            **options
+        )
+        error = None
+    except Exception as e:
+        response, error = {"results": []}, str(e)
+    latency = time.perf_counter() - started
+
+    ranked = ranked_ids(response["results"], args.id_field)
+    return {
+        "id": query["id"],
+        "latency_ms": round(latency * 1000, 2),
+        "error": error,
+        "ranked": ranked,
+        "recall": recall_at_k(ranked, query["relevant"], args.top_k),
+        "mrr": reciprocal_rank(ranked, query["relevant"], args.top_k),
+        "ndcg": ndcg_at_k(ranked, query["relevant"], args.top_k),
+    }
+
+
+def ingest_documents(client: RAGTestClient, documents: List[Dict[str, Any]]):
+    for start in range(0, len(documents), INGEST_BATCH_SIZE):
+        client.add_documents(documents[start:start + INGEST_BATCH_SIZE])
+    print(f"📥 Ingested {len(documents)} documents")
+
+
+def evaluate(client: RAGTestClient, queries: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """Прогон запросов с заданной параллельностью: качество по первому проходу, задержка по всем"""
+    for query in queries[:args.warmup]:
+        run_query(client, query, args)
+
+    runs = queries * args.repeat
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda query: run_query(client, query, args), runs))
+    elapsed = time.perf_counter() - started
+
+    # Повторы дают ту же выдачу, поэтому метрики качества считаются по первому проходу
+    first_pass = [result for result in results[:len(queries)] if result["error"] is None]
+    latencies = np.array([result["latency_ms"] for result in results if result["error"] is None])
+    errors = [result for result in results if result["error"] is not None]
+    k = args.top_k
+
+    def mean(key: str) -> float:
+        return round(float(np.mean([result[key] for result in first_pass])), 4) if first_pass else 0.0
+
+    def percentile(value: float) -> float:
+        return round(float(np.percentile(latencies, value)), 2) if len(latencies) else 0.0
+
+    summary = {
+        "queries": len(queries),
+        "requests": len(runs),
+        "errors": len(errors),
+        f"recall@{k}": mean("recall"),
+        f"mrr@{k}": mean("mrr"),
+        f"ndcg@{k}": mean("ndcg"),
+        "latency_p50_ms": percentile(50),
+        "latency_p95_ms": percentile(95),
+        "latency_p99_ms": percentile(99),
+        "qps": round(len(runs) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    for error in errors[:5]:
+        print(f"❌ {error['id']}: {error['error']}")
+    return {"summary": summary, "per_query": results[:len(queries)]}
+
+
+def compare(summary: Dict[str, Any], baseline_path: str):
+    """Разница с предыдущим прогоном (файл --output другого запуска)"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["summary"]
+    print(f"\n{'metric':<18} {'baseline':>10} {'current':>10} {'delta':>10}")
+    for key, value in summary.items():
+        if key in baseline and isinstance(value, (int, float)):
+            print(f"{key:<18} {baseline[key]:>10} {value:>10} {round(value - baseline[key], 4):>+10}")
+
+
+def in_process_client(args) -> RAGTestClient:
+    """Сервис в этом же процессе через TestClient; Qdrant - встроенный (QDRANT_PATH) или локальный сервер"""
+    if args.qdrant_path:
+        os.environ["QDRANT_PATH"] = args.qdrant_path
+    # Кэш поиска искажает задержку при --repeat
+    os.environ.setdefault("SEARCH_CACHE_SIZE", "0")
+    sys.path.insert(0, SERVICE_DIR)
+    from fastapi.testclient import TestClient
+    import main as service
+
+    test_client = TestClient(service.app, base_url=IN_PROCESS_URL)
+    test_client.__enter__()
+    started = time.perf_counter()
+    while test_client.get("/ready").status_code != 200:
+        live = test_client.get("/live")
+        if live.status_code != 200:
+            raise RuntimeError(f"Service startup failed: {live.json().get('error')}")
+        if time.perf_counter() - started > args.ready_timeout:
+            raise RuntimeError(f"Service did not become ready: {test_client.get('/ready').text}")
+        time.sleep(0.1)
+    return RAGTestClient(IN_PROCESS_URL, session=test_client)
+
+
+def main():
+    """Оценка качества поиска (recall@k, MRR, nDCG) и задержки на размеченном наборе запросов"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency of the RAG service")
+    parser.add_argument("--eval-set", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_sample.json"),
+                        help="Labeled queries (JSON or NDJSON), optionally with documents to ingest")
+    parser.add_argument("--service-url", type=str, default="http://localhost:8000", help="RAG service URL")
+    parser.add_argument("--in-process", action='store_true', help="Run the service in this process instead of over HTTP")
+    parser.add_argument("--qdrant-path", type=str, help="With --in-process: embedded Qdrant directory or :memory:")
+    parser.add_argument("--ready-timeout", type=float, default=300, help="Seconds to wait for the in-process service")
+    parser.add_argument("--ingest", action='store_true', help="Upload the eval set documents before querying")
+    parser.add_argument("--id-field", type=str, default="doc_id", help="Metadata field matched against relevant ids")
+    parser.add_argument("--top-k", type=int, default=10, help="k for recall@k, MRR and nDCG")
+    parser.add_argument("--threshold", type=float, default=0.0, help="Search score threshold")
+    parser.add_argument("--mode", type=str, choices=['dense', 'sparse', 'hybrid'], default='dense', help="Search mode")
+    parser.add_argument("--mmr-lambda", type=float, help="MMR relevance weight passed to /search")
+    parser.add_argument("--collapse-adjacent", action='store_true', help="Collapse adjacent chunks in results")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent search requests")
+    parser.add_argument("--repeat", type=int, default=1, help="Run the query set this many times for latency")
+    parser.add_argument("--warmup", type=int, default=5, help="Queries sent before measuring")
+    parser.add_argument("--output", type=str, help="Write results to JSON file")
+    parser.add_argument("--compare", type=str, help="Print deltas against a previous --output file")
+
+    args = parser.parse_args()
+
+    eval_set = load_eval_set(args.eval_set)
+    queries = eval_set.get("queries", [])
+    if not queries:
+        print(f"❌ No queries in {args.eval_set}")
+        sys.exit(1)
+
+    client = in_process_client(args) if args.in_process else RAGTestClient(args.service_url)
+    if args.ingest:
+        ingest_documents(client, eval_set.get("documents", []))
+
+    print(f"⏱️  Evaluating {len(queries)} queries x{args.repeat}, concurrency {args.concurrency}, mode {args.mode}...")
+    result = evaluate(client, queries, args)
+    summary = result["summary"]
+
+    print(f"\n{'metric':<18} {'value':>10}")
+    for key, value in summary.items():
+        print(f"{key:<18} {value:>10}")
+
+    if args.compare:
+        compare(summary, args.compare)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), **result}, f, indent=2, ensure_ascii=False)
+
+    if args.in_process:
+        client.session.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    main()
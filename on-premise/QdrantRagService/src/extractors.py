@@ -0,0 +1,115 @@
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple
+
+# Меняется при изменении логики извлечения, чтобы устаревший кэш не использовался
+EXTRACTOR_VERSION = 1
+
+# Функции модуля выполняются в дочерних процессах ProcessPoolExecutor, поэтому они верхнего уровня
+# и возвращают только простые типы: [{"page_number": 1, "text": "..."}, ...]
+
+
+def pdf_page_count(file_path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(file_path: str, first_page: int, last_page: int) -> List[Dict]:
+    """Текст страниц first_page..last_page (с 1, включительно); каждый процесс открывает файл сам"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    pages = []
+    for page_number in range(first_page, last_page + 1):
+        text = reader.pages[page_number - 1].extract_text() or ""
+        pages.append({"page_number": page_number, "text": text})
+    return pages
+
+
+def extract_docx(file_path: str) -> List[Dict]:
+    """Абзацы и таблицы DOCX; абзацы со стилем Heading N становятся markdown-заголовками для чанкера"""
+    import docx
+
+    document = docx.Document(file_path)
+    blocks = []
+    for paragraph in document.paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = paragraph.style.name if paragraph.style is not None else ""
+        match = re.match(r"Heading (\d)", style)
+        if match:
+            text = f"{'#' * int(match.group(1))} {text}"
+        elif style == "Title":
+            text = f"# {text}"
+        blocks.append(text)
+
+    for table in document.tables:
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if cells:
+                blocks.append(" | ".join(cells))
+
+    return [{"page_number": None, "text": "\n\n".join(blocks)}]
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Видимый текст HTML: блочные теги разделяются пустой строкой, h1-h6 становятся markdown-заголовками"""
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "head"}
+    BLOCK_TAGS = {
+        "p", "div", "section", "article", "li", "tr", "table", "ul", "ol", "br", "pre",
+        "blockquote", "dd", "dt", "main", "header", "aside", "form",
+    }
+    HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip_depth = 0
+        self.title = None
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str]]):
+        if tag == "title":
+            self._in_title = True
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.HEADING_TAGS:
+            self.parts.append(f"\n\n{'#' * self.HEADING_TAGS[tag]} ")
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+
+    def handle_endtag(self, tag: str):
+        if tag == "title":
+            self._in_title = False
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.HEADING_TAGS or tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data: str):
+        if self._in_title and self.title is None:
+            self.title = data.strip() or None
+        if self.skip_depth == 0:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        lines = []
+        for line in "".join(self.parts).split("\n"):
+            line = re.sub(r"[ \t\r\f\v]+", " ", line).strip(" |")
+            lines.append(line)
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def extract_html(file_path: str) -> List[Dict]:
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        parser = HTMLTextExtractor()
+        parser.feed(f.read())
+        parser.close()
+    page = {"page_number": None, "text": parser.text()}
+    if parser.title:
+        page["title"] = parser.title
+    return [page]
@@ -0,0 +1,108 @@
+import json
+from typing import Any, Iterator, TextIO
+
+READ_CHUNK_SIZE = 1 << 16
+# Один элемент больше этого - скорее всего битый файл; без лимита буфер дорос бы до размера файла
+MAX_ITEM_SIZE = 64 * 2 ** 20
+WHITESPACE = " \t\n\r"
+# Символы, которыми может продолжаться число: "2" из "2.5e3" - ещё не всё число
+NUMBER_CHARS = "0123456789.eE+-"
+
+_decoder = json.JSONDecoder()
+
+
+class JSONStreamReader:
+    """Инкрементальный разбор JSON: в памяти только текущий элемент и один блок чтения
+
+    Поддерживаются массив верхнего уровня ([{...}, {...}]) и последовательность значений,
+    разделённых пробелами и переводами строк (NDJSON / JSON Lines, одиночный объект).
+    Элементы разбираются json.JSONDecoder.raw_decode прямо из буфера, без построчного split.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = READ_CHUNK_SIZE, max_item_size: int = MAX_ITEM_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.max_item_size = max_item_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        # Смещение начала буфера в файле, для сообщений об ошибках
+        self.offset = 0
+
+    def read_more(self, size: int) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Разобранный префикс отбрасывается только при дочитывании, чтобы не копировать буфер на каждом элементе
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self) -> str:
+        """Следующий непробельный символ без его потребления; пустая строка - конец файла"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more(self.chunk_size):
+                return ""
+
+    def decode_value(self) -> Any:
+        # Значение в конце буфера может быть обрезано ("12" из "123"), поэтому принимается,
+        # только если за ним уже есть символ, не продолжающий число, или файл кончился
+        read_size = self.chunk_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"Invalid JSON at offset {self.offset + e.pos}: {e.msg}") from None
+            if len(self.buffer) - self.pos > self.max_item_size:
+                raise ValueError(
+                    f"JSON item at offset {self.offset + self.pos} is invalid or exceeds {self.max_item_size} characters"
+                )
+            # Размер дочитывания растёт вместе с элементом: большой элемент не разбирается заново на каждом блоке
+            self.read_more(read_size)
+            read_size = max(read_size, len(self.buffer) - self.pos)
+
+    def expect(self, chars: str) -> str:
+        char = self.skip_whitespace()
+        if char == "" or char not in chars:
+            found = repr(char) if char else "end of file"
+            raise ValueError(f"Invalid JSON at offset {self.offset + self.pos}: expected {' or '.join(chars)}, found {found}")
+        self.pos += 1
+        return char
+
+    def __iter__(self) -> Iterator[Any]:
+        first = self.skip_whitespace()
+        if first != "[":
+            # NDJSON и одиночные значения
+            while self.skip_whitespace():
+                yield self.decode_value()
+            return
+
+        self.pos += 1
+        if self.skip_whitespace() == "]":
+            self.pos += 1
+        else:
+            while True:
+                self.skip_whitespace()
+                yield self.decode_value()
+                if self.expect(",]") == "]":
+                    break
+
+        if self.skip_whitespace():
+            raise ValueError(f"Invalid JSON at offset {self.offset + self.pos}: extra data after the top-level array")
+
+
+def iter_json_items(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """Элементы массива верхнего уровня или значения NDJSON по одному"""
+    return iter(JSONStreamReader(f, chunk_size))
@@ -4,13 +4,15 @@ import time
 from typing import List, Dict, Any
 
 class RAGTestClient:
-    def __init__(self, service_url: str = "http://localhost:8001"):
+    def __init__(self, service_url: str = "http://localhost:8001", session=None):
         self.service_url = service_url
+        # Keep-alive соединения; вместо requests.Session можно передать fastapi TestClient для сервиса в процессе
+        self.session = session or requests.Session()
     
     def check_health(self) -> bool:
         """Проверка работоспособности сервиса"""
         try:
-            response = requests.get(f"{self.service_url}/health")
+            response = self.session.get(f"{self.service_url}/health")
             if response.status_code == 200:
                 health_data = response.json()
                 print(f"✅ Service is healthy: {health_data}")
@@ -25,7 +27,7 @@ class RAGTestClient:
     def get_collection_info(self) -> Dict[str, Any]:
         """Получение информации о коллекции"""
         try:
-            response = requests.get(f"{self.service_url}/collection/info")
+            response = self.session.get(f"{self.service_url}/collection/info")
             if response.status_code == 200:
                 info = response.json()
                 print(f"📊 Collection info: {info}")
@@ -37,41 +39,44 @@ class RAGTestClient:
             print(f"❌ Error getting collection info: {e}")
             return {}
     
-    def search(self, query: str, top_k: int = 5, threshold: float = 0.5) -> List[Dict[str, Any]]:
+    def search_raw(self, query: str, top_k: int = 5, threshold: float = 0.5, metadata_filter: Dict[str, Any] = None,
+                   mode: str = "dense", **options) -> Dict[str, Any]:
+        """Поиск без вывода; ошибки сервиса поднимаются исключением"""
+        payload = {
+            "query": query,
+            "top_k": top_k,
+            "threshold": threshold,
+            "mode": mode,
+            **options
+        }
+        if metadata_filter:
+            payload["filter"] = metadata_filter
+        
+        response = self.session.post(f"{self.service_url}/search", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"Search failed: {response.status_code} - {response.text}")
+        return response.json()
+    
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.5, metadata_filter: Dict[str, Any] = None,
+               mode: str = "dense") -> List[Dict[str, Any]]:
         """Поиск по запросу"""
         try:
-            payload = {
-                "query": query,
-                "top_k": top_k,
-                "threshold": threshold
-            }
-            
-            response = requests.post(
-                f"{self.service_url}/search",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"🔍 Search results for '{query}':")
-                print(f"   Total found: {result['total_found']}")
-                
-                for i, res in enumerate(result['results'], 1):
-                    print(f"   {i}. Score: {res['score']:.3f}")
-                    print(f"      Text: {res['text']}")
-                    if res.get('metadata'):
-                        print(f"      Metadata: {res['metadata']}")
-                    print()
-                
-                return result['results']
-            else:
-                print(f"❌ Search failed: {response.status_code} - {response.text}")
-                return []
-                
+            result = self.search_raw(query, top_k, threshold, metadata_filter, mode)
         except Exception as e:
             print(f"❌ Search error: {e}")
             return []
+        
+        print(f"🔍 Search results for '{query}':")
+        print(f"   Total found: {result['total_found']}")
+        
+        for i, res in enumerate(result['results'], 1):
+            print(f"   {i}. Score: {res['score']:.3f}")
+            print(f"      Text: {res['text']}")
+            if res.get('metadata'):
+                print(f"      Metadata: {res['metadata']}")
+            print()
+        
+        return result['results']
     
     def add_document(self, text: str, metadata: Dict[str, Any] = None) -> bool:
         """Добавление одного документа"""
@@ -81,7 +86,7 @@ class RAGTestClient:
                 "metadata": metadata or {}
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.service_url}/add_document",
                 json=payload,
                 headers={"Content-Type": "application/json"}
@@ -99,10 +104,17 @@ class RAGTestClient:
             print(f"❌ Error adding document: {e}")
             return False
     
+    def add_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Пакетное добавление без вывода; ошибки сервиса поднимаются исключением"""
+        response = self.session.post(f"{self.service_url}/add_documents", json=documents)
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to add documents: {response.status_code} - {response.text}")
+        return response.json()
+    
     def clear_collection(self) -> bool:
         """Очистка коллекции"""
         try:
-            response = requests.delete(f"{self.service_url}/collection/clear")
+            response = self.session.delete(f"{self.service_url}/collection/clear")
             if response.status_code == 200:
                 print("✅ Collection cleared successfully")
                 return True
@@ -216,6 +228,7 @@ def main():
     parser.add_argument("--test", action='store_true', help="Run comprehensive test")
     parser.add_argument("--interactive", action='store_true', help="Run interactive search mode")
     parser.add_argument("--query", type=str, help="Single search query")
+    parser.add_argument("--mode", type=str, choices=['dense', 'sparse', 'hybrid'], default='dense', help="Search mode")
     
     args = parser.parse_args()
     
@@ -226,7 +239,7 @@ def main():
     elif args.interactive:
         client.run_interactive_search()
     elif args.query:
-        client.search(args.query)
+        client.search(args.query, mode=args.mode)
     else:
         # По умолчанию запускаем быструю проверку
         client.check_health()
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from decouple import config
+from loguru import logger
+
+# Событий в памяти до записи; при переполнении теряются самые старые, обработчики не ждут базу
+EVENTS_BUFFER_SIZE = config('EVENTS_BUFFER_SIZE', default=10000, cast=int)
+# Буфер записывается раз в EVENTS_FLUSH_INTERVAL секунд или сразу, как набралось EVENTS_FLUSH_BATCH событий
+EVENTS_FLUSH_INTERVAL = config('EVENTS_FLUSH_INTERVAL', default=2.0, cast=float)
+EVENTS_FLUSH_BATCH = config('EVENTS_FLUSH_BATCH', default=500, cast=int)
+# Дней, за которые хранятся события
+EVENTS_RETENTION_DAYS = config('EVENTS_RETENTION_DAYS', default=90, cast=int)
+# Длина сохраняемого текста вопроса и ошибки
+EVENT_TEXT_LIMIT = 1000
+RETENTION_CHECK_INTERVAL = 3600
+
+
+class EventLog:
+    """Журнал событий: log() кладёт событие в кольцевой буфер, фоновая задача пишет его в базу пачками
+
+    log() синхронный и не обращается к базе, поэтому не добавляет задержки обработчикам.
+    Пачка записывается одним executemany через поток-писатель базы.
+    """
+
+    def __init__(self, db, buffer_size: int = EVENTS_BUFFER_SIZE, flush_interval: float = EVENTS_FLUSH_INTERVAL,
+                 flush_batch: int = EVENTS_FLUSH_BATCH):
+        self.db = db
+        self.buffer = deque(maxlen=buffer_size)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.writing: Optional[asyncio.Future] = None
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self.last_retention = 0.0
+
+    def log(self, kind: str, user_id: int, node: Optional[str] = None, endpoint: Optional[str] = None,
+            latency_ms: Optional[float] = None, ok: bool = True, detail: Optional[str] = None,
+            error: Optional[str] = None):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append((
+            datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            kind, user_id, node, endpoint,
+            round(latency_ms, 1) if latency_ms is not None else None,
+            int(ok),
+            detail[:EVENT_TEXT_LIMIT] if detail else detail,
+            error[:EVENT_TEXT_LIMIT] if error else error,
+        ))
+        self.logged += 1
+        if self.wakeup is not None and len(self.buffer) >= self.flush_batch:
+            self.wakeup.set()
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - self.last_retention > RETENTION_CHECK_INTERVAL:
+                    self.last_retention = time.monotonic()
+                    await self.db.delete_old_events(EVENTS_RETENTION_DAYS)
+            except Exception as e:
+                logger.error(f"Ошибка записи событий: {e}")
+
+    async def flush(self):
+        while self.buffer:
+            batch = [self.buffer.popleft() for _ in range(min(self.flush_batch, len(self.buffer)))]
+            # Отмена ждущего не отменяет запись: поток-писатель всё равно зафиксирует пачку
+            self.writing = asyncio.ensure_future(self.write(batch))
+            await asyncio.shield(self.writing)
+
+    async def write(self, batch: list):
+        try:
+            await self.db.log_events(batch)
+        except Exception:
+            self.restore(batch)
+            raise
+        self.written += len(batch)
+
+    def restore(self, batch: list):
+        """Возвращает незаписанную пачку в начало буфера; не поместившиеся самые старые события считаются потерянными"""
+        free = self.buffer.maxlen - len(self.buffer)
+        lost = max(len(batch) - free, 0)
+        self.dropped += lost
+        self.buffer.extendleft(reversed(batch[lost:]))
+
+    async def close(self):
+        """Останавливает фоновую задачу и дописывает оставшиеся события; вызывать до db.close()"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        try:
+            # Пачка, которую писала отменённая задача, дописывается до остальных
+            if self.writing is not None and not self.writing.done():
+                await self.writing
+            await self.flush()
+        except Exception as e:
+            self.dropped += len(self.buffer)
+            logger.error(f"Ошибка записи событий при остановке, потеряно {len(self.buffer)}: {e}")
+            self.buffer.clear()
+
+    def stats(self) -> dict:
+        return {
+            "logged": self.logged,
+            "written": self.written,
+            "buffered": len(self.buffer),
+            "dropped": self.dropped,
+        }
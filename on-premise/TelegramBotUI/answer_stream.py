@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import List
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+from decouple import config
+from loguru import logger
+
+# Telegram ограничивает частоту правок сообщений в чате: не чаще одной в STREAM_EDIT_INTERVAL секунд
+STREAM_EDIT_INTERVAL = config('STREAM_EDIT_INTERVAL', default=1.0, cast=float)
+# Пока ответ короче, правка ждёт: одно-два слова в сообщении выглядят как обрыв
+STREAM_MIN_CHARS = config('STREAM_MIN_CHARS', default=20, cast=int)
+# Предел длины текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+TYPING_MARK = ' ▌'
+
+
+class AnswerStream:
+    """Показывает потоковый ответ, редактируя сообщение-заглушку по мере прихода текста
+
+    Правки идут не чаще STREAM_EDIT_INTERVAL; текст, пришедший между правками, попадает в следующую.
+    Если ответ длиннее одного сообщения, заполненное сообщение фиксируется и продолжение идёт в новом.
+    """
+
+    def __init__(self, message: Message, placeholder: Message):
+        self.message = message
+        self.messages: List[Message] = [placeholder]
+        self.text = ''
+        # Начало текста текущего сообщения: всё до него уже в предыдущих сообщениях
+        self.offset = 0
+        self.shown = None
+        self.last_edit = 0.0
+        self.edits = 0
+
+    async def add(self, delta: str):
+        self.text += delta
+        if len(self.text) < STREAM_MIN_CHARS or time.monotonic() - self.last_edit < STREAM_EDIT_INTERVAL:
+            return
+        await self.show(self.text[self.offset:] + TYPING_MARK)
+
+    async def finish(self, text: str):
+        """Окончательный текст с источниками вместо накопленного потока"""
+        self.text = text
+        while len(self.text) - self.offset > MESSAGE_LIMIT:
+            await self.show(self.text[self.offset:], wait=True)
+        await self.show(self.text[self.offset:], wait=True)
+
+    async def show(self, text: str, wait: bool = False):
+        if len(self.text) - self.offset > MESSAGE_LIMIT:
+            # Текущее сообщение заполнено: фиксируем его по последнему переносу строки и продолжаем в новом
+            body = self.text[self.offset:self.offset + MESSAGE_LIMIT]
+            cut = body.rfind('\n')
+            cut = cut if cut > 0 else MESSAGE_LIMIT
+            await self.edit(body[:cut], wait=True)
+            self.offset += cut
+            self.shown = self.text[self.offset:self.offset + MESSAGE_LIMIT]
+            self.messages.append(await self.message.answer(self.shown))
+            self.last_edit = time.monotonic()
+            return
+        await self.edit(text[:MESSAGE_LIMIT], wait)
+
+    async def edit(self, text: str, wait: bool):
+        if text == self.shown:
+            return
+        if wait:
+            # Итоговая правка не пропускается, а ждёт своей очереди
+            await asyncio.sleep(max(0.0, self.last_edit + STREAM_EDIT_INTERVAL - time.monotonic()))
+        try:
+            await self.messages[-1].edit_text(text)
+        except TelegramRetryAfter as e:
+            logger.warning(f"Telegram просит подождать {e.retry_after} с перед правкой ответа")
+            if not wait:
+                # Промежуточная правка пропускается: следующая покажет больше текста
+                self.last_edit = time.monotonic() + e.retry_after
+                return
+            await asyncio.sleep(e.retry_after)
+            await self.messages[-1].edit_text(text)
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in str(e):
+                raise
+        self.shown = text
+        self.last_edit = time.monotonic()
+        self.edits += 1
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from types import SimpleNamespace
+
+# handlers при импорте открывает базу бота; бенчмарк не должен её трогать
+os.environ.setdefault('DB_PATH', os.path.join(tempfile.gettempdir(), 'benchmark_callbacks.db'))
+import handlers
+from db import Database
+
+LANGUAGES = ['en', 'ru', 'kz', 'tr', 'de']
+
+
+async def telegram_call(*args, **kwargs):
+    """Вызов Bot API не выполняется: меряется только работа обработчика"""
+
+
+def make_callback(user_id: int, data: str):
+    message = SimpleNamespace(
+        edit_text=telegram_call, answer=telegram_call, answer_media_group=telegram_call, delete=telegram_call
+    )
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id), data=data, message=message, answer=telegram_call)
+
+
+def menu_callbacks() -> list:
+    """callback_data всех узлов меню без картинок и ссылок"""
+    tree = handlers.menu_trees['en']
+    return [
+        callback_data for callback_data, node in tree.nodes.items()
+        if callback_data and not node.content.img and not node.content.url and not callback_data.startswith('lang_')
+    ]
+
+
+def prepare_database(path: str, users: int):
+    asyncio.run(Database(path).close())
+    conn = sqlite3.connect(path)
+    conn.executemany('''INSERT OR IGNORE INTO users (user_id, lang) VALUES (?, ?);''',
+                     ((user_id, LANGUAGES[user_id % len(LANGUAGES)]) for user_id in range(users)))
+    conn.commit()
+    conn.close()
+
+
+async def run(name: str, db: Database, callbacks: int, concurrency: int, active_users: int) -> dict:
+    handlers.db = db
+    rng = random.Random(42)
+    menu = menu_callbacks()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await handlers.process_callback(make_callback(rng.randrange(active_users), rng.choice(menu)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(callbacks)))
+    elapsed = time.perf_counter() - started
+    stats = db.users.stats()
+    await db.close()
+    return {"cache": name, "callbacks_per_second": round(callbacks / elapsed, 1), **stats}
+
+
+def main():
+    """Пропускная способность process_callback без кэша языка и с ним"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark callback handling with and without the user cache")
+    parser.add_argument("--callbacks", type=int, default=50000, help="Callbacks to process")
+    parser.add_argument("--concurrency", type=int, default=500, help="Callbacks processed at the same time")
+    parser.add_argument("--users", type=int, default=100000, help="Users in the database")
+    parser.add_argument("--active-users", type=int, default=5000, help="Users pressing buttons")
+
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, cache_size in (("off", 0), ("on", args.users)):
+            path = os.path.join(tmp_dir, f"cache_{name}.db")
+            prepare_database(path, args.users)
+            print(f"⏱️  cache {name}: {args.callbacks} callbacks from {args.active_users} users...")
+            results.append(asyncio.run(run(
+                name, Database(path, user_cache_size=cache_size), args.callbacks, args.concurrency, args.active_users
+            )))
+
+    print(f"\n{'cache':<6} {'callbacks/s':>12} {'hit ratio':>10}")
+    for result in results:
+        print(f"{result['cache']:<6} {result['callbacks_per_second']:>12} {result['hit_ratio']:>10}")
+
+
+if __name__ == "__main__":
+    main()
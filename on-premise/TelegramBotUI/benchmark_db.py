@@ -0,0 +1,143 @@
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from db import Database
+
+LANGUAGES = ['en', 'ru', 'kz', 'tr', 'de']
+
+
+class LegacyDatabase:
+    """Прежний доступ: одно соединение, синхронные вызовы из корутин, коммит на каждую запись"""
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+
+    async def get_lang(self, user_id: int) -> str:
+        result = self.cursor.execute('''SELECT lang FROM users WHERE user_id = ?;''', (user_id,)).fetchone()
+        if result is None:
+            await self.add_user(user_id)
+            return 'en'
+        return result[0]
+
+    async def exist_user(self, user_id: int) -> bool:
+        return self.cursor.execute('''SELECT user_id FROM users WHERE user_id = ?;''', (user_id,)).fetchone() is not None
+
+    async def add_user(self, user_id: int):
+        if not await self.exist_user(user_id):
+            self.cursor.execute('''INSERT INTO users (user_id, registration_date)
+                                 VALUES (?, CURRENT_TIMESTAMP);''', (user_id,))
+            self.conn.commit()
+
+    async def set_language(self, user_id: int, lang: str):
+        self.cursor.execute('''UPDATE users SET lang = ? WHERE user_id = ?;''', (lang, user_id))
+        self.conn.commit()
+
+    async def close(self):
+        self.conn.close()
+
+
+async def handle_update(db, rng: random.Random, users: int, api_delay: float) -> float:
+    """Обработка одного апдейта как в handlers: язык пользователя, иногда запись, затем ответ в Telegram"""
+    started = time.perf_counter()
+    roll = rng.random()
+    if roll < 0.02:
+        # Новый пользователь: get_lang добавляет его в базу
+        await db.get_lang(users + rng.randrange(10 ** 9))
+    elif roll < 0.07:
+        user_id = rng.randrange(users)
+        await db.add_user(user_id)
+        await db.set_language(user_id, rng.choice(LANGUAGES))
+    else:
+        await db.get_lang(rng.randrange(users))
+    # Запрос к Bot API: в это время event loop должен обслуживать другие апдейты
+    await asyncio.sleep(api_delay)
+    return time.perf_counter() - started
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.001):
+    """Насколько позже запланированного просыпается корутина - время блокировки event loop"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run(name: str, db, updates: int, concurrency: int, users: int, api_delay: float) -> dict:
+    rng = random.Random(42)
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+
+    async def one() -> float:
+        async with semaphore:
+            return await handle_update(db, rng, users, api_delay)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(updates)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    await db.close()
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "db": name,
+        "updates_per_second": round(updates / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies_ms), 2),
+        "p99_ms": round(latencies_ms[int(len(latencies_ms) * 0.99) - 1], 2),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 2),
+    }
+
+
+def prepare_database(path: str, users: int, journal_mode: str):
+    asyncio.run(Database(path).close())
+    conn = sqlite3.connect(path)
+    # Прежняя база работала в режиме журнала по умолчанию (DELETE)
+    conn.execute(f'PRAGMA journal_mode={journal_mode};')
+    conn.executemany('''INSERT OR IGNORE INTO users (user_id, lang) VALUES (?, ?);''',
+                     ((user_id, LANGUAGES[user_id % len(LANGUAGES)]) for user_id in range(users)))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    """Нагрузочный тест базы бота: тысячи одновременных апдейтов, старый и новый доступ к SQLite"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test of the bot database layer")
+    parser.add_argument("--updates", type=int, default=20000, help="Total updates to process")
+    parser.add_argument("--concurrency", type=int, default=2000, help="Updates processed at the same time")
+    parser.add_argument("--users", type=int, default=50000, help="Existing users in the database")
+    parser.add_argument("--api-delay-ms", type=float, default=20, help="Simulated Bot API call per update")
+
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ("legacy", "async"):
+            path = os.path.join(tmp_dir, f"{name}.db")
+            prepare_database(path, args.users, "delete" if name == "legacy" else "wal")
+            db = LegacyDatabase(path) if name == "legacy" else Database(path)
+            print(f"⏱️  {name}: {args.updates} updates, concurrency {args.concurrency}...")
+            results.append(asyncio.run(
+                run(name, db, args.updates, args.concurrency, args.users, args.api_delay_ms / 1000)
+            ))
+
+    print(f"\n{'db':<8} {'updates/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'max lag ms':>11}")
+    for result in results:
+        print(
+            f"{result['db']:<8} {result['updates_per_second']:>10} {result['p50_ms']:>8} "
+            f"{result['p99_ms']:>8} {result['max_loop_lag_ms']:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from analytics import EventLog
+from db import INSERT_EVENT, Database
+
+NODES = [f"menu_{i}" for i in range(40)]
+ENDPOINTS = ["http://llm_agent-backend:8001/ask", "http://localhost:8001/ask"]
+
+
+def make_events(count: int) -> list:
+    """Нажатия кнопок и вопросы; примерно каждый двадцатый вопрос - с ошибкой"""
+    rng = random.Random(42)
+    events = []
+    for i in range(count):
+        user_id = rng.randrange(5000)
+        if i % 5:
+            events.append(dict(kind='callback', user_id=user_id, node=rng.choice(NODES),
+                               latency_ms=rng.uniform(20, 200)))
+        else:
+            failed = rng.random() < 0.05
+            events.append(dict(kind='question', user_id=user_id, node='en',
+                               endpoint=None if failed else rng.choice(ENDPOINTS),
+                               latency_ms=rng.uniform(500, 5000), ok=not failed,
+                               detail="question", error="❌ timeout" if failed else None))
+    return events
+
+
+async def direct_insert(db: Database, event: dict):
+    """Прежний подход: обработчик ждёт INSERT и фиксацию каждого события"""
+    await db.execute_write(INSERT_EVENT, (
+        datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), event['kind'], event['user_id'],
+        event.get('node'), event.get('endpoint'), event.get('latency_ms'), int(event.get('ok', True)),
+        event.get('detail'), event.get('error'),
+    ))
+
+
+async def run(mode: str, path: str, events: list, handlers: int) -> dict:
+    """handlers обработчиков параллельно пишут события; задержка - сколько обработчик ждёт записи"""
+    db = Database(path)
+    event_log = EventLog(db)
+    event_log.start()
+    queue = list(events)
+    waits = []
+
+    async def handler():
+        while queue:
+            event = queue.pop()
+            started = time.perf_counter()
+            if mode == "direct":
+                await direct_insert(db, event)
+            else:
+                event_log.log(**event)
+            waits.append(time.perf_counter() - started)
+            # Остальная работа обработчика: ответ в Telegram
+            await asyncio.sleep(0.001)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(handlers)))
+    handled = time.perf_counter() - started
+    await event_log.close()
+    stored = (await db.fetchone('''SELECT COUNT(*) FROM events;'''))[0]
+
+    report_started = time.perf_counter()
+    top, latency, failed = await asyncio.gather(
+        db.get_top_nodes(24), db.get_question_latency(24), db.get_failed_questions(24),
+    )
+    report_ms = (time.perf_counter() - report_started) * 1000
+    await db.close()
+
+    waits.sort()
+    return {
+        "mode": mode,
+        "events_per_second": round(len(events) / handled),
+        "wait_p50_ms": round(statistics.median(waits) * 1000, 3),
+        "wait_p99_ms": round(waits[int(len(waits) * 0.99) - 1] * 1000, 3),
+        "stored": stored,
+        "report_ms": round(report_ms, 1),
+        "top": top[:3],
+        "latency": latency,
+        "failed": len(failed),
+    }
+
+
+def check_aggregates(events: list, result: dict):
+    """Сверка отчётов с исходными событиями"""
+    hits = {}
+    for event in events:
+        if event['kind'] == 'callback':
+            hits[event['node']] = hits.get(event['node'], 0) + 1
+    expected_top = sorted(hits.values(), reverse=True)[:3]
+    assert [hits for _, hits, _ in result["top"]] == expected_top, (result["top"], expected_top)
+
+    for endpoint, questions, errors, _, p50_ms, p95_ms in result["latency"]:
+        values = sorted(e['latency_ms'] for e in events
+                        if e['kind'] == 'question' and (e.get('endpoint') or '-') == endpoint)
+        assert questions == len(values)
+        assert errors == (len(values) if endpoint == '-' else 0)
+        # p50 и p95 - значения с номером не меньше доли от числа вопросов
+        for share, value in ((0.5, p50_ms), (0.95, p95_ms)):
+            position = next(i for i in range(1, len(values) + 1) if i >= share * len(values))
+            assert abs(values[position - 1] - value) < 0.1, (endpoint, share, value)
+
+
+def main():
+    """Запись событий: INSERT на каждое событие против буфера EventLog с пакетной записью"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark event logging from bot handlers")
+    parser.add_argument("--events", type=int, default=20000, help="Events written by handlers")
+    parser.add_argument("--handlers", type=int, default=64, help="Handlers running at once")
+
+    args = parser.parse_args()
+    events = make_events(args.events)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = [
+            asyncio.run(run(mode, os.path.join(tmp_dir, f"{mode}.db"), events, args.handlers))
+            for mode in ("direct", "buffered")
+        ]
+
+    print(f"\n{'mode':<9} {'events/s':>9} {'wait p50 ms':>12} {'wait p99 ms':>12} {'stored':>7} {'reports ms':>11}")
+    for r in results:
+        print(f"{r['mode']:<9} {r['events_per_second']:>9} {r['wait_p50_ms']:>12} {r['wait_p99_ms']:>12} "
+              f"{r['stored']:>7} {r['report_ms']:>11}")
+
+    buffered = results[-1]
+    check_aggregates(events, buffered)
+    print("\nTop nodes:", buffered["top"])
+    for row in buffered["latency"]:
+        print(f"{row[0]}: questions {row[1]}, errors {row[2]}, avg {row[3]:.0f} ms, p50 {row[4]:.0f} ms, p95 {row[5]:.0f} ms")
+    print(f"Failed questions listed: {buffered['failed']}")
+    print("Aggregates match the generated events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+from config import MAIN_MENU_DIR
+from tree_structure import ButtonTree, load_back_button_texts
+
+
+def load_menus(precompile: bool) -> dict:
+    """Все main_menu_*.json, как в handlers"""
+    dir_name = os.path.basename(MAIN_MENU_DIR)
+    trees = {}
+    for filename in sorted(os.listdir(MAIN_MENU_DIR)):
+        if filename.endswith('.json'):
+            lang = filename.replace(f'{dir_name}_', '').replace('.json', '')
+            with open(os.path.join(MAIN_MENU_DIR, filename), 'r', encoding='utf-8') as f:
+                trees[lang] = ButtonTree.from_json(json.load(f), load_back_button_texts(),
+                                                   languages=[lang] if precompile else None)
+    return trees
+
+
+def measure(keyboard, trees: dict, repeat: int) -> float:
+    """Среднее время получения клавиатуры одного узла, мкс"""
+    nodes = [(tree, node, lang) for lang, tree in trees.items() for node in tree.nodes.values()]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for tree, node, lang in nodes:
+            keyboard(tree, node, lang)
+    return (time.perf_counter() - started) / (repeat * len(nodes)) * 1e6
+
+
+def main():
+    """Загрузка меню всех пяти языков и стоимость клавиатуры на один callback: сборка и готовая"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark menu keyboard building")
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over all menu nodes")
+
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    plain = load_menus(precompile=False)
+    load_plain_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    precompiled = load_menus(precompile=True)
+    load_precompiled_ms = (time.perf_counter() - started) * 1000
+
+    build_us = measure(lambda tree, node, lang: tree.build_keyboard(node, lang), plain, args.repeat)
+    lookup_us = measure(lambda tree, node, lang: tree.create_keyboard(node, None, lang), precompiled, args.repeat)
+
+    nodes = sum(len(tree.keyboards) for tree in precompiled.values())
+    print(f"🌐 Languages: {', '.join(precompiled)}; {nodes} keyboards precompiled")
+    print(f"Startup: {load_plain_ms:.1f} ms without keyboards, {load_precompiled_ms:.1f} ms with keyboards")
+    print(f"Per callback: {build_us:.1f} us to build a keyboard, {lookup_us:.2f} us to look it up "
+          f"({build_us / lookup_us:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
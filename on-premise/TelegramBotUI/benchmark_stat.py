@@ -0,0 +1,127 @@
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from db import Database
+
+LANGUAGES = ['en', 'ru', 'kz', 'tr', 'de']
+
+
+def registrations(users: int, days: int):
+    """Пользователи с датами регистрации за последние days дней (UTC, формат CURRENT_TIMESTAMP)"""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    for user_id in range(users):
+        registered = now - timedelta(seconds=rng.randrange(days * 86400))
+        yield user_id, LANGUAGES[user_id % len(LANGUAGES)], registered.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def prepare_legacy(path: str, users: int, days: int):
+    """Прежняя схема: users без индекса по registration_date и без счётчиков"""
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE users (user_id INTEGER PRIMARY KEY, lang TEXT DEFAULT 'en',
+                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''')
+    conn.executemany('''INSERT INTO users (user_id, lang, registration_date) VALUES (?, ?, ?);''',
+                     registrations(users, days))
+    conn.commit()
+    conn.close()
+
+
+def prepare_counters(path: str, users: int, days: int) -> float:
+    """Новая схема; пользователи вставляются через триггеры счётчиков. Возвращает вставок в секунду"""
+    asyncio.run(Database(path).close())
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    conn.executemany('''INSERT INTO users (user_id, lang, registration_date) VALUES (?, ?, ?);''',
+                     registrations(users, days))
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return users / elapsed
+
+
+def legacy_stat(conn: sqlite3.Connection) -> tuple:
+    """/stat до изменений: три COUNT(*) подряд, окно считается от локального времени"""
+    hour = conn.execute('''SELECT COUNT(*) FROM users WHERE registration_date >= ?;''',
+                        ((datetime.now() - timedelta(hours=1)).isoformat(' '),)).fetchone()[0]
+    day = conn.execute('''SELECT COUNT(*) FROM users WHERE registration_date >= ?;''',
+                       ((datetime.now() - timedelta(days=1)).isoformat(' '),)).fetchone()[0]
+    whole = conn.execute('''SELECT COUNT(*) FROM users;''').fetchone()[0]
+    return hour, day, whole
+
+
+async def counters_stat(db: Database) -> tuple:
+    return await asyncio.gather(
+        db.get_users_amount_hour(), db.get_users_amount_day(), db.get_users_amount_whole(),
+        db.get_users_by_language(), db.get_active_today_by_language(),
+    )
+
+
+def utc_truth(path: str) -> tuple:
+    """Точные значения по UTC для сверки"""
+    conn = sqlite3.connect(path)
+    hour = conn.execute('''SELECT COUNT(*) FROM users WHERE registration_date >= datetime('now', '-1 hours');''').fetchone()[0]
+    day = conn.execute('''SELECT COUNT(*) FROM users WHERE registration_date >= datetime('now', '-1 days');''').fetchone()[0]
+    whole = conn.execute('''SELECT COUNT(*) FROM users;''').fetchone()[0]
+    conn.close()
+    return hour, day, whole
+
+
+def main():
+    """Стоимость /stat: COUNT(*) по users против счётчиков на триггерах"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark /stat registration statistics")
+    parser.add_argument("--users", type=int, default=1000000, help="Users in the database")
+    parser.add_argument("--days", type=int, default=365, help="Registrations spread over this many days")
+    parser.add_argument("--repeat", type=int, default=20, help="/stat calls to measure")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, "legacy.db")
+        counters_path = os.path.join(tmp_dir, "counters.db")
+
+        print(f"⏱️  Filling {args.users} users...")
+        started = time.perf_counter()
+        prepare_legacy(legacy_path, args.users, args.days)
+        legacy_rate = args.users / (time.perf_counter() - started)
+        counters_rate = prepare_counters(counters_path, args.users, args.days)
+
+        conn = sqlite3.connect(legacy_path)
+        legacy_times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            legacy = legacy_stat(conn)
+            legacy_times.append(time.perf_counter() - started)
+        conn.close()
+
+        async def run_counters():
+            db = Database(counters_path)
+            times = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = await counters_stat(db)
+                times.append(time.perf_counter() - started)
+            await db.close()
+            return times, result
+
+        counters_times, counters = asyncio.run(run_counters())
+        truth = utc_truth(counters_path)
+
+    print(f"\nInserts: {legacy_rate:,.0f} users/s without triggers, {counters_rate:,.0f} users/s with counters")
+    print(f"/stat:   {statistics.median(legacy_times) * 1000:.2f} ms with COUNT(*), "
+          f"{statistics.median(counters_times) * 1000:.2f} ms with counters")
+    print(f"UTC truth (hour, day, whole): {truth}")
+    print(f"COUNT(*) with local time:     {legacy}")
+    print(f"Counters:                     {tuple(counters[:3])}")
+    print(f"Users by language:            {counters[3]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+import answer_stream
+from answer_stream import MESSAGE_LIMIT
+from check_llm_client import free_port
+from llm_client import LLMClient
+
+SOURCES = {"docs/rules.pdf": 0.9}
+
+
+class FakeMessage:
+    """Сообщение Telegram: запоминает, когда и какой текст в нём показан"""
+
+    def __init__(self, chat: list, text: str = ''):
+        self.chat = chat
+        self.text = text
+        self.edits = []
+        chat.append(self)
+
+    async def edit_text(self, text: str):
+        self.text = text
+        self.edits.append(time.monotonic())
+
+    async def answer(self, text: str):
+        return FakeMessage(self.chat, text)
+
+
+async def start_stub(tokens: list, token_delay: float, mode: str):
+    """Заглушка сервиса ответов: ответ частями через SSE, NDJSON или целиком JSON"""
+
+    async def ask(request: web.Request) -> web.StreamResponse:
+        await request.json()
+        final = {"answer": "".join(tokens), "tokens": len(tokens), "cost": 0.0, "source_documents_dict": SOURCES}
+        if mode == "json":
+            await asyncio.sleep(token_delay * len(tokens))
+            return web.json_response(final)
+        content_type = "text/event-stream" if mode == "sse" else "application/x-ndjson"
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        await response.prepare(request)
+
+        async def send(event: dict):
+            line = json.dumps(event, ensure_ascii=False)
+            await response.write((f"data: {line}\n\n" if mode == "sse" else f"{line}\n").encode("utf-8"))
+
+        for token in tokens:
+            await asyncio.sleep(token_delay)
+            await send({"delta": token})
+        await send(final)
+        if mode == "sse":
+            await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/ask", ask)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, f"http://127.0.0.1:{port}/ask"
+
+
+async def answer_once(endpoints: list, tokens: list, streaming: bool) -> dict:
+    """Один вопрос через handlers.stream_answer или обычный ask; время до первого текста ответа"""
+    import handlers
+
+    handlers.llm_client = LLMClient(endpoints)
+    chat = []
+    message = FakeMessage(chat)
+    placeholder = await message.answer("🔄 Сообщение обрабатывается...")
+    payload = {"user_id": 1, "question": "q", "language": "en"}
+    started = time.monotonic()
+    if streaming:
+        await handlers.stream_answer(message, placeholder, payload)
+        first = placeholder.edits[0] if placeholder.edits else time.monotonic()
+    else:
+        endpoint, data = await handlers.llm_client.ask(payload)
+        await message.answer(handlers.format_answer(data))
+        first = time.monotonic()
+    finished = time.monotonic()
+    await handlers.llm_client.close()
+
+    # Длинный ответ разбит на несколько сообщений: вместе они дают весь текст
+    text = "".join(m.text for m in chat[1:]) if streaming else chat[-1].text
+    gaps = [b - a for m in chat for a, b in zip(m.edits, m.edits[1:])]
+    return {
+        "first_text_s": round(first - started, 2),
+        "total_s": round(finished - started, 2),
+        "edits": sum(len(m.edits) for m in chat),
+        "messages": len(chat) - 1,
+        "min_edit_gap_s": round(min(gaps), 2) if gaps else None,
+        "complete": text.startswith("".join(tokens)),
+    }
+
+
+async def main_async(args) -> list:
+    answer_stream.STREAM_EDIT_INTERVAL = args.edit_interval
+    tokens = [f"word{i} " for i in range(args.tokens)]
+    long_tokens = ["x" * 100 + "\n" for _ in range(int(MESSAGE_LIMIT * 2.5 / 101))]
+    dead = f"http://127.0.0.1:{free_port()}/ask"
+
+    results = []
+    for name, mode, words, streaming, first_dead in (
+        ("blocking ask", "json", tokens, False, False),
+        ("sse", "sse", tokens, True, False),
+        ("ndjson", "ndjson", tokens, True, False),
+        ("json fallback", "json", tokens, True, False),
+        ("sse, first down", "sse", tokens, True, True),
+        ("sse, 2.5 messages", "sse", long_tokens, True, False),
+    ):
+        runner, endpoint = await start_stub(words, args.token_ms / 1000, mode)
+        endpoints = [dead, endpoint] if first_dead else [endpoint]
+        results.append({"case": name, **await answer_once(endpoints, words, streaming)})
+        await runner.cleanup()
+    return results
+
+
+def main():
+    """Потоковый ответ против заглушки: время до первого текста, частота правок, разбиение длинного ответа"""
+    import argparse
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Check streamed answers against a local stub backend")
+    parser.add_argument("--tokens", type=int, default=100, help="Answer length in tokens")
+    parser.add_argument("--token-ms", type=float, default=50, help="Time between tokens")
+    parser.add_argument("--edit-interval", type=float, default=1.0, help="STREAM_EDIT_INTERVAL for the check")
+
+    args = parser.parse_args()
+
+    # handlers при импорте открывает базу бота; проверка не должна её трогать
+    os.environ.setdefault('DB_PATH', os.path.join(tempfile.gettempdir(), 'check_answer_stream.db'))
+    results = asyncio.run(main_async(args))
+    print(f"\n{'case':<18} {'first text s':>12} {'total s':>8} {'edits':>6} {'messages':>9} "
+          f"{'min gap s':>10} {'complete':>9}")
+    for r in results:
+        print(f"{r['case']:<18} {r['first_text_s']:>12} {r['total_s']:>8} {r['edits']:>6} {r['messages']:>9} "
+              f"{str(r['min_edit_gap_s']):>10} {str(r['complete']):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import asyncio
+import random
+import socket
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+import llm_client
+from llm_client import LLMClient, LLMError
+
+ANSWER = {"answer": "ok", "tokens": 1, "cost": 0.0, "source_documents_dict": {}}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_stub(delay) -> tuple:
+    """Заглушка сервиса ответов: /ask отвечает через delay() секунд"""
+
+    async def ask(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(delay())
+        return web.json_response(ANSWER)
+
+    app = web.Application()
+    app.router.add_post("/ask", ask)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, f"http://127.0.0.1:{port}/ask"
+
+
+async def legacy_ask(endpoints: list, payload: dict) -> dict:
+    """Прежний handle_text: новая сессия на сообщение, адреса по очереди, без таймаутов"""
+    last_error = None
+    async with aiohttp.ClientSession() as session:
+        for endpoint in endpoints:
+            try:
+                async with session.post(endpoint, json=payload) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    last_error = await response.text()
+            except Exception as e:
+                last_error = str(e)
+    raise LLMError(last_error)
+
+
+async def run(name: str, ask, messages: int, concurrency: int, deadline: float) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(i: int) -> float:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(ask({"user_id": i, "question": "q", "language": "en"}), deadline)
+            except (LLMError, asyncio.TimeoutError):
+                failures += 1
+            return time.perf_counter() - started
+
+    latencies = sorted(await asyncio.gather(*(one(i) for i in range(messages))))
+    return {
+        "client": name,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "failed": failures,
+    }
+
+
+async def scenario(name: str, first_delay, args) -> list:
+    """Первый адрес ведёт себя по first_delay (None - не принимает соединения), второй отвечает быстро"""
+    runners = []
+    if first_delay is None:
+        first = f"http://127.0.0.1:{free_port()}/ask"
+    else:
+        runner, first = await start_stub(first_delay)
+        runners.append(runner)
+    runner, second = await start_stub(lambda: args.base_ms / 1000)
+    runners.append(runner)
+    endpoints = [first, second]
+
+    print(f"⏱️  {name}: {args.messages} messages, concurrency {args.concurrency}...")
+    results = [await run("legacy", lambda payload: legacy_ask(endpoints, payload),
+                         args.messages, args.concurrency, args.deadline)]
+    client = LLMClient(endpoints)
+    results.append(await run("client", lambda payload: client.ask(payload),
+                             args.messages, args.concurrency, args.deadline))
+    for health in client.stats():
+        print(f"   {health}")
+    await client.close()
+    for runner in runners:
+        await runner.cleanup()
+    return [{"scenario": name, **result} for result in results]
+
+
+async def main_async(args):
+    # Без накопленной статистики дублирование начинается через LLM_HEDGE_DELAY: для заглушек это долго
+    llm_client.LLM_HEDGE_DELAY = args.hedge_delay
+    llm_client.LLM_HEDGE_MIN_DELAY = args.base_ms / 1000
+    rng = random.Random(42)
+    base = args.base_ms / 1000
+
+    def tail():
+        return args.tail_ms / 1000 if rng.random() < args.tail_share else base
+
+    results = []
+    results += await scenario("first down", None, args)
+    results += await scenario("first slow tail", tail, args)
+    results += await scenario("first hung", lambda: 3600, args)
+    return results
+
+
+def main():
+    """Клиент сервиса ответов против заглушек: недоступный, медленный и зависший первый адрес"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check LLM endpoint failover and hedging against local stubs")
+    parser.add_argument("--messages", type=int, default=500, help="Messages per client and scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Messages in flight")
+    parser.add_argument("--base-ms", type=float, default=50, help="Normal answer time of a stub")
+    parser.add_argument("--tail-ms", type=float, default=2000, help="Answer time of slow requests")
+    parser.add_argument("--tail-share", type=float, default=0.05, help="Share of slow requests")
+    parser.add_argument("--hedge-delay", type=float, default=0.5, help="LLM_HEDGE_DELAY for the check")
+    parser.add_argument("--deadline", type=float, default=10, help="A message without answer after this fails")
+
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"\n{'scenario':<16} {'client':<7} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for result in results:
+        print(f"{result['scenario']:<16} {result['client']:<7} {result['p50_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['failed']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from middlewares.question_limit import QuestionLimitMiddleware
+
+
+class FakeMessage:
+    """Сообщение пользователя; ответы бота только считаются"""
+
+    def __init__(self, user_id: int):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.notices = 0
+
+    async def answer(self, text: str):
+        self.notices += 1
+        return SimpleNamespace(delete=self.noop, edit_text=self.noop)
+
+    async def noop(self, *args, **kwargs):
+        pass
+
+
+class Backend:
+    """Сервис ответов: считает одновременные запросы всего и по пользователям"""
+
+    def __init__(self, answer_time: float):
+        self.answer_time = answer_time
+        self.active = 0
+        self.peak = 0
+        self.user_active = {}
+        self.user_peak = 0
+        self.calls = 0
+
+    async def handle(self, message: FakeMessage, data: dict):
+        user_id = message.from_user.id
+        self.calls += 1
+        self.active += 1
+        self.user_active[user_id] = self.user_active.get(user_id, 0) + 1
+        self.peak = max(self.peak, self.active)
+        self.user_peak = max(self.user_peak, self.user_active[user_id])
+        await asyncio.sleep(self.answer_time)
+        self.active -= 1
+        self.user_active[user_id] -= 1
+
+
+def semaphore_middleware(concurrency: int):
+    """Только общий предел без очереди по пользователям: вопросы ждут в порядке прихода"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def middleware(handler, event, data):
+        async with semaphore:
+            return await handler(event, data)
+
+    return middleware
+
+
+async def run(name: str, middleware, args) -> dict:
+    rng = random.Random(42)
+    backend = Backend(args.answer_ms / 1000)
+    heavy, light = [], []
+
+    async def ask(user_id: int, delay: float, latencies: list):
+        await asyncio.sleep(delay)
+        started = time.monotonic()
+        message = FakeMessage(user_id)
+        if middleware is None:
+            await backend.handle(message, {})
+        else:
+            await middleware(backend.handle, message, {})
+        latencies.append(time.monotonic() - started)
+
+    tasks = [ask(0, i * 0.01, heavy) for i in range(args.burst)]
+    tasks += [ask(user_id, rng.uniform(0, args.spread), light) for user_id in range(1, args.users + 1)]
+    await asyncio.gather(*tasks)
+
+    def p95(values: list) -> float:
+        return round(sorted(values)[int(len(values) * 0.95) - 1], 2)
+
+    return {
+        "mode": name,
+        "backend_calls": backend.calls,
+        "peak": backend.peak,
+        "user_peak": backend.user_peak,
+        "light_p50_s": round(statistics.median(light), 2),
+        "light_p95_s": p95(light),
+        "heavy_max_s": round(max(heavy), 2),
+    }
+
+
+async def main_async(args) -> list:
+    limiter = QuestionLimitMiddleware(per_user=1, concurrency=args.concurrency, queue_size=args.queue_size,
+                                      coalesce=True)
+    results = [
+        await run("unlimited", None, args),
+        await run("semaphore", semaphore_middleware(args.concurrency), args),
+        await run("fair", limiter, args),
+    ]
+    print(f"fair queue: {limiter.stats()}")
+    return results
+
+
+def main():
+    """Один пользователь присылает пачку вопросов, остальные по одному: нагрузка на сервис и ожидание"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check per-user question limiting against a simulated backend")
+    parser.add_argument("--burst", type=int, default=20, help="Questions sent at once by one user")
+    parser.add_argument("--users", type=int, default=30, help="Other users asking one question each")
+    parser.add_argument("--spread", type=float, default=2.0, help="Seconds over which other users ask")
+    parser.add_argument("--answer-ms", type=float, default=1000, help="Backend time per question")
+    parser.add_argument("--concurrency", type=int, default=5, help="QUESTION_CONCURRENCY for the check")
+    parser.add_argument("--queue-size", type=int, default=200, help="QUESTION_QUEUE_SIZE for the check")
+
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"\n{'mode':<10} {'calls':>6} {'peak':>5} {'user peak':>10} {'light p50 s':>12} "
+          f"{'light p95 s':>12} {'heavy max s':>12}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['backend_calls']:>6} {r['peak']:>5} {r['user_peak']:>10} "
+              f"{r['light_p50_s']:>12} {r['light_p95_s']:>12} {r['heavy_max_s']:>12}")
+
+
+if __name__ == "__main__":
+    main()
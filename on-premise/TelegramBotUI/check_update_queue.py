@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher, F
+from aiogram.types import Message
+from aiohttp import web
+
+from check_llm_client import free_port
+from update_queue import LocalUpdateQueue, QueueRequestHandler, RedisUpdateQueue, UpdateWorkers
+
+SECRET = "check-secret"
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": update_id % 1000, "type": "private"},
+            "from": {"id": update_id % 1000, "is_bot": False, "first_name": "user"},
+            "text": "question",
+        },
+    }
+
+
+def make_dispatcher(handled: list, handler_time: float) -> Dispatcher:
+    """Диспетчер с одним обработчиком, который «ходит в Bot API» handler_time секунд"""
+    dp = Dispatcher()
+
+    async def handle(message: Message):
+        await asyncio.sleep(handler_time)
+        handled.append(message.message_id)
+
+    dp.message.register(handle, F.text)
+    return dp
+
+
+def make_queue(kind: str, args):
+    if kind == "local":
+        return LocalUpdateQueue()
+    queue = RedisUpdateQueue(args.redis_url or "redis://localhost:6379/0", key=f"check:updates:{time.time()}")
+    if not args.redis_url:
+        # Без настоящего сервера - fakeredis: общий объект сервера имитирует один Redis для всех процессов
+        import fakeredis
+
+        queue.redis = fakeredis.aioredis.FakeRedis(server=args.fake_server)
+    return queue
+
+
+async def queued(queue) -> int:
+    if isinstance(queue, LocalUpdateQueue):
+        return queue.size()
+    return await queue.redis.llen(queue.key)
+
+
+async def run(kind: str, processes: int, args) -> dict:
+    """Webhook принимает updates апдейтов; processes наборов обработчиков разбирают общую очередь"""
+    handled = []
+    bot = Bot(token="123456:check")
+    dp = make_dispatcher(handled, args.handler_ms / 1000)
+    webhook_queue = make_queue(kind, args)
+    # У локальной очереди второй процесс невозможен: все обработчики читают очередь webhook
+    queues = [webhook_queue] + [make_queue(kind, args) for _ in range(processes - 1)]
+    if kind == "redis":
+        for queue in queues[1:]:
+            queue.key = webhook_queue.key
+    workers = [UpdateWorkers(dp, bot, queue, workers=args.workers) for queue in queues]
+
+    app = web.Application()
+    QueueRequestHandler(dp, bot, webhook_queue, secret_token=SECRET).register(app, path="/webhook")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    for worker in workers:
+        worker.start()
+
+    url = f"http://127.0.0.1:{port}/webhook"
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=make_update(0), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as r:
+            rejected = r.status == 401
+        semaphore = asyncio.Semaphore(args.telegram_connections)
+
+        async def deliver(update_id: int):
+            async with semaphore:
+                async with session.post(url, json=make_update(update_id),
+                                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as response:
+                    assert response.status == 200
+
+        await asyncio.gather(*(deliver(i) for i in range(1, args.updates + 1)))
+    accepted = time.perf_counter() - started
+
+    # Останавливаемся, как только очередь опустела: начатые апдейты должны доработаться, а не потеряться
+    while await queued(webhook_queue):
+        await asyncio.sleep(0.01)
+    in_flight = sum(worker.in_flight for worker in workers)
+    await runner.cleanup()
+    for worker in workers:
+        await worker.stop()
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+
+    return {
+        "queue": kind,
+        "processes": processes,
+        "accepted_s": round(accepted, 2),
+        "updates_per_second": round(len(handled) / elapsed, 1),
+        "handled": len(handled),
+        "in_flight_at_stop": in_flight,
+        "lost": args.updates - len(set(handled)),
+        "duplicates": len(handled) - len(set(handled)),
+        "bad_secret_rejected": rejected,
+    }
+
+
+async def main_async(args) -> list:
+    results = [await run("local", 1, args)]
+    if not args.redis_url:
+        # fakeredis нужен только этой проверке и в requirements.txt не входит
+        try:
+            import fakeredis
+        except ImportError:
+            print("⚠️  fakeredis is not installed: redis cases skipped (pip install fakeredis or pass --redis-url)")
+            return results
+        args.fake_server = fakeredis.FakeServer()
+    results.append(await run("redis", 1, args))
+    results.append(await run("redis", args.processes, args))
+    return results
+
+
+def main():
+    """Webhook с очередью апдейтов: пропускная способность, разбор несколькими процессами, доработка при остановке"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check webhook update queue, workers and graceful drain")
+    parser.add_argument("--updates", type=int, default=5000, help="Updates delivered to the webhook")
+    parser.add_argument("--workers", type=int, default=64, help="UPDATE_WORKERS per process")
+    parser.add_argument("--processes", type=int, default=3, help="Processes sharing the Redis queue")
+    parser.add_argument("--handler-ms", type=float, default=50, help="Time a handler spends per update")
+    parser.add_argument("--telegram-connections", type=int, default=40, help="Parallel webhook deliveries")
+    parser.add_argument("--redis-url", default="", help="Real Redis server; fakeredis is used when empty")
+
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"\n{'queue':<6} {'processes':>9} {'accepted s':>11} {'updates/s':>10} {'handled':>8} "
+          f"{'in flight at stop':>18} {'lost':>5} {'dup':>4} {'401':>5}")
+    for r in results:
+        print(f"{r['queue']:<6} {r['processes']:>9} {r['accepted_s']:>11} {r['updates_per_second']:>10} "
+              f"{r['handled']:>8} {r['in_flight_at_stop']:>18} {r['lost']:>5} {r['duplicates']:>4} "
+              f"{str(r['bad_secret_rejected']):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,536 @@
+import asyncio
+import queue
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decouple import config
+from loguru import logger
+
+DB_PATH = config('DB_PATH', default='DataStore/database.db')
+# Соединений на чтение: в режиме WAL читатели не блокируют писателя и друг друга
+DB_READ_CONNECTIONS = config('DB_READ_CONNECTIONS', default=2, cast=int)
+# Максимум запросов в одной пачке потока; записи, пришедшие пока идёт коммит, попадают в следующий
+DB_COMMIT_BATCH = config('DB_COMMIT_BATCH', default=256, cast=int)
+# Пользователей в кэше языка; 0 - без кэша, каждый апдейт читает базу
+USER_CACHE_SIZE = config('USER_CACHE_SIZE', default=100000, cast=int)
+# Секунд, которые язык живёт в кэше; 0 - без срока. Нужен, когда апдейты одного пользователя
+# обрабатывают несколько процессов: смена языка в одном процессе видна другим через это время.
+# С общей очередью Redis (UPDATE_QUEUE=redis) процессов несколько, поэтому по умолчанию 30 секунд
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=30 if config('UPDATE_QUEUE', default='local') == 'redis' else 0,
+                        cast=float)
+# Дней, за которые хранятся отметки активности пользователей (дневные итоги по языкам хранятся всегда)
+USER_ACTIVITY_DAYS = config('USER_ACTIVITY_DAYS', default=30, cast=int)
+# Подготовленные выражения кэшируются в каждом соединении по тексту SQL
+DB_STATEMENT_CACHE = 128
+
+SELECT_ADMIN = '''SELECT user_id FROM admins WHERE user_id = ?;'''
+SELECT_ADMINS = '''SELECT user_id FROM admins;'''
+INSERT_ADMIN = '''INSERT OR IGNORE INTO admins (user_id) VALUES (?);'''
+DELETE_ADMIN = '''DELETE FROM admins WHERE user_id = ?;'''
+SELECT_LANG = '''SELECT lang FROM users WHERE user_id = ?;'''
+INSERT_USER = '''INSERT OR IGNORE INTO users (user_id, registration_date) VALUES (?, CURRENT_TIMESTAMP);'''
+UPDATE_LANG = '''UPDATE users SET lang = ? WHERE user_id = ?;'''
+# Регистрации с момента datetime('now', ?): полные часы берутся из registrations_hourly,
+# неполный первый час досчитывается по индексу registration_date. Время в UTC, как CURRENT_TIMESTAMP
+COUNT_USERS_SINCE = '''WITH period AS (SELECT datetime('now', ?) AS since),
+                          bounds AS (SELECT since, datetime(strftime('%Y-%m-%d %H:00:00', since), '+1 hour')
+                                            AS first_full_hour FROM period)
+                     SELECT (SELECT COALESCE(SUM(registrations), 0) FROM registrations_hourly
+                             WHERE hour >= bounds.first_full_hour)
+                          + (SELECT COUNT(*) FROM users
+                             WHERE registration_date >= bounds.since
+                               AND registration_date < bounds.first_full_hour)
+                     FROM bounds;'''
+SELECT_COUNTER = '''SELECT value FROM user_counters WHERE name = ?;'''
+SELECT_LANG_COUNTERS = '''SELECT substr(name, 6), value FROM user_counters WHERE name LIKE 'lang:%' ORDER BY value DESC;'''
+SELECT_DAILY_ACTIVE = '''SELECT lang, users FROM daily_active WHERE day = date('now') ORDER BY users DESC;'''
+INSERT_ACTIVITY = '''INSERT OR IGNORE INTO user_activity (day, user_id) VALUES (?, ?);'''
+INSERT_EVENT = '''INSERT INTO events (created_at, kind, user_id, node, endpoint, latency_ms, ok, detail, error)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);'''
+DELETE_OLD_EVENTS = '''DELETE FROM events WHERE created_at < datetime('now', ?);'''
+SELECT_TOP_NODES = '''SELECT node, COUNT(*) AS hits, COUNT(DISTINCT user_id) AS users FROM events
+                      WHERE kind = 'callback' AND created_at >= datetime('now', ?)
+                      GROUP BY node ORDER BY hits DESC LIMIT ?;'''
+# Перцентили считаются оконными функциями: номер строки в порядке задержки против числа вопросов адреса
+SELECT_QUESTION_LATENCY = '''WITH questions AS (
+                             SELECT COALESCE(endpoint, '-') AS endpoint, latency_ms, ok,
+                                    ROW_NUMBER() OVER (PARTITION BY COALESCE(endpoint, '-') ORDER BY latency_ms) AS position,
+                                    COUNT(*) OVER (PARTITION BY COALESCE(endpoint, '-')) AS total
+                             FROM events
+                             WHERE kind = 'question' AND created_at >= datetime('now', ?))
+                         SELECT endpoint, COUNT(*), SUM(1 - ok), AVG(latency_ms),
+                                MIN(CASE WHEN position >= 0.5 * total THEN latency_ms END),
+                                MIN(CASE WHEN position >= 0.95 * total THEN latency_ms END)
+                         FROM questions GROUP BY endpoint ORDER BY COUNT(*) DESC;'''
+SELECT_FAILED_QUESTIONS = '''SELECT created_at, user_id, detail, error FROM events
+                             WHERE kind = 'question' AND ok = 0 AND created_at >= datetime('now', ?)
+                             ORDER BY created_at DESC LIMIT ?;'''
+DELETE_OLD_ACTIVITY = '''DELETE FROM user_activity WHERE day < date('now', ?);'''
+SELECT_MEDIA = '''SELECT path, file_hash, file_id FROM media_cache;'''
+UPSERT_MEDIA = '''INSERT OR REPLACE INTO media_cache (path, file_hash, file_id, updated_at)
+                  VALUES (?, ?, ?, CURRENT_TIMESTAMP);'''
+DELETE_MEDIA = '''DELETE FROM media_cache WHERE path = ?;'''
+
+
+class DatabaseWorker(threading.Thread):
+    """Поток со своим соединением: выполняет накопившиеся в очереди запросы пачкой
+
+    Результаты пачки возвращаются в event loop одним call_soon_threadsafe, поэтому переключение
+    потоков оплачивается один раз на пачку, а не на каждый запрос. Пачка с записями фиксируется
+    одним коммитом, и вызывающие корутины получают результат только после него.
+    """
+
+    def __init__(self, connect, name: str, batch_size: int):
+        super().__init__(name=name, daemon=True)
+        self.connect = connect
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+
+    def submit(self, sql: str, params: tuple, fetch: str) -> asyncio.Future:
+        """fetch: one, all, rowcount (запись) или many (запись params - списка строк через executemany)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue.put((sql, params, fetch, future, loop))
+        return future
+
+    def run(self):
+        conn = self.connect()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)
+                    break
+                batch.append(item)
+            self.execute_batch(conn, batch)
+        conn.close()
+
+    def execute_batch(self, conn: sqlite3.Connection, batch: list):
+        results = []
+        has_writes = False
+        for sql, params, fetch, _, _ in batch:
+            try:
+                cursor = conn.executemany(sql, params) if fetch == 'many' else conn.execute(sql, params)
+                if fetch == 'one':
+                    results.append(cursor.fetchone())
+                elif fetch == 'all':
+                    results.append(cursor.fetchall())
+                else:
+                    has_writes = True
+                    results.append(cursor.rowcount)
+            except sqlite3.Error as e:
+                # Ошибка одного выражения (например, ABORT из триггера) не отменяет остальные записи пачки
+                results.append(e)
+        if has_writes:
+            try:
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                results = [e] * len(batch)
+
+        by_loop = {}
+        for (_, _, _, future, loop), result in zip(batch, results):
+            by_loop.setdefault(loop, []).append((future, result))
+        for loop, resolved in by_loop.items():
+            loop.call_soon_threadsafe(resolve_futures, resolved)
+
+    def stop(self):
+        self.queue.put(None)
+
+
+def resolve_futures(resolved: list):
+    for future, result in resolved:
+        if future.done():
+            continue
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+
+class UserCache:
+    """LRU-кэш языка пользователей; запись идёт в базу и сразу в кэш (write-through)
+
+    Наличие пользователя в кэше означает, что он есть в базе, поэтому exist_user и get_lang
+    для активных пользователей не обращаются к SQLite.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (язык, время записи)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        entry = self.entries.get(user_id)
+        if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+            del self.entries[user_id]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(user_id)
+        return entry[0]
+
+    def set(self, user_id: int, lang: str):
+        if self.max_size <= 0:
+            return
+        self.entries[user_id] = (lang, time.monotonic())
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def add(self, user_id: int, lang: str):
+        """Значение, прочитанное из базы: не перезаписывает язык, закэшированный set_language во время чтения"""
+        if user_id not in self.entries:
+            self.set(user_id, lang)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
 
 
 class Database:
-    def __init__(self, db_path='DataStore/database.db'):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+    """Асинхронный доступ к SQLite без блокировки event loop
+
+    Запросы выполняют потоки DatabaseWorker: один поток пишет, DB_READ_CONNECTIONS потоков читают
+    (в режиме WAL чтения не ждут записи). Все записи идут через единственного писателя, поэтому
+    не конкурируют за блокировку базы и фиксируются групповыми коммитами.
+    """
+
+    def __init__(self, db_path=DB_PATH, read_connections: int = DB_READ_CONNECTIONS,
+                 commit_batch: int = DB_COMMIT_BATCH, user_cache_size: int = USER_CACHE_SIZE):
+        self.db_path = db_path
+        self.users = UserCache(user_cache_size)
+        # Пользователи, чья активность за active_day уже записана
+        self.active_day = None
+        self.active_today = set()
+        # Фоновые записи активности: ссылки держатся, чтобы задачи не собрал сборщик мусора
+        self.pending = set()
+        # Схема создаётся синхронно при старте, до запуска потоков
+        self.conn = self.connect()
         self.cursor = self.conn.cursor()
         self.create_tables()
         self.update_table_structure()
+        self.create_counters()
+        self.create_events()
         self.initialize_admins()
+        self.conn.close()
+
+        self.writer = DatabaseWorker(self.connect, "db-write", commit_batch)
+        self.readers = [
+            DatabaseWorker(self.connect, f"db-read-{number}", commit_batch) for number in range(read_connections)
+        ]
+        self._next_reader = 0
+        for worker in [self.writer, *self.readers]:
+            worker.start()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+        conn.execute('PRAGMA journal_mode=WAL;')
+        # В WAL с synchronous=NORMAL коммит не ждёт fsync, целостность базы при сбое сохраняется
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        conn.execute('PRAGMA busy_timeout=5000;')
+        return conn
 
     def create_tables(self):
         self.cursor.execute('''CREATE TABLE IF NOT EXISTS users
                              (user_id INTEGER PRIMARY KEY,
                               lang TEXT DEFAULT 'en');''')
-        
+
         # Создаем таблицу администраторов
         self.cursor.execute('''CREATE TABLE IF NOT EXISTS admins
                              (user_id INTEGER PRIMARY KEY,
                               added_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''')
+
+        # file_id картинок, уже загруженных в Telegram; file_hash - sha256 файла на момент загрузки
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS media_cache
+                             (path TEXT PRIMARY KEY,
+                              file_hash TEXT NOT NULL,
+                              file_id TEXT NOT NULL,
+                              updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''')
+        self.conn.commit()
+
+    def create_events(self):
+        """Журнал событий бота: навигация по меню, вопросы, команды; пишет EventLog пачками"""
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS events
+                             (id INTEGER PRIMARY KEY,
+                              created_at TEXT NOT NULL,
+                              kind TEXT NOT NULL,
+                              user_id INTEGER,
+                              node TEXT,
+                              endpoint TEXT,
+                              latency_ms REAL,
+                              ok INTEGER NOT NULL DEFAULT 1,
+                              detail TEXT,
+                              error TEXT);''')
+        self.cursor.execute('''CREATE INDEX IF NOT EXISTS idx_events_kind_created_at
+                             ON events(kind, created_at);''')
+        self.cursor.execute('''CREATE INDEX IF NOT EXISTS idx_events_created_at
+                             ON events(created_at);''')
+        self.conn.commit()
+
+    def create_counters(self):
+        """Индекс по дате регистрации и счётчики, которые ведут триггеры: /stat не сканирует users"""
+        self.cursor.execute('''CREATE INDEX IF NOT EXISTS idx_users_registration_date
+                             ON users(registration_date);''')
+        # users - всего пользователей, lang:<код> - пользователей с этим языком
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS user_counters
+                             (name TEXT PRIMARY KEY,
+                              value INTEGER NOT NULL DEFAULT 0);''')
+        # Регистрации по часам (UTC, 'YYYY-MM-DD HH:00:00')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS registrations_hourly
+                             (hour TEXT PRIMARY KEY,
+                              registrations INTEGER NOT NULL DEFAULT 0);''')
+        # Первая активность пользователя за день и дневные итоги по языкам
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS user_activity
+                             (day TEXT NOT NULL,
+                              user_id INTEGER NOT NULL,
+                              PRIMARY KEY (day, user_id)) WITHOUT ROWID;''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS daily_active
+                             (day TEXT NOT NULL,
+                              lang TEXT NOT NULL,
+                              users INTEGER NOT NULL DEFAULT 0,
+                              PRIMARY KEY (day, lang)) WITHOUT ROWID;''')
+
+        self.cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_users_counters_insert
+                             AFTER INSERT ON users
+                             BEGIN
+                                 INSERT INTO user_counters (name, value) VALUES ('users', 1)
+                                 ON CONFLICT(name) DO UPDATE SET value = value + 1;
+                                 INSERT INTO user_counters (name, value) VALUES ('lang:' || COALESCE(NEW.lang, 'en'), 1)
+                                 ON CONFLICT(name) DO UPDATE SET value = value + 1;
+                                 INSERT INTO registrations_hourly (hour, registrations)
+                                 VALUES (strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.registration_date, CURRENT_TIMESTAMP)), 1)
+                                 ON CONFLICT(hour) DO UPDATE SET registrations = registrations + 1;
+                             END;''')
+        self.cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_users_counters_lang
+                             AFTER UPDATE OF lang ON users
+                             WHEN OLD.lang IS NOT NEW.lang
+                             BEGIN
+                                 UPDATE user_counters SET value = value - 1
+                                 WHERE name = 'lang:' || COALESCE(OLD.lang, 'en');
+                                 INSERT INTO user_counters (name, value) VALUES ('lang:' || COALESCE(NEW.lang, 'en'), 1)
+                                 ON CONFLICT(name) DO UPDATE SET value = value + 1;
+                             END;''')
+        self.cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_users_counters_delete
+                             AFTER DELETE ON users
+                             BEGIN
+                                 UPDATE user_counters SET value = value - 1
+                                 WHERE name IN ('users', 'lang:' || COALESCE(OLD.lang, 'en'));
+                                 UPDATE registrations_hourly SET registrations = registrations - 1
+                                 WHERE hour = strftime('%Y-%m-%d %H:00:00', OLD.registration_date);
+                             END;''')
+        self.cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_user_activity
+                             AFTER INSERT ON user_activity
+                             BEGIN
+                                 INSERT INTO daily_active (day, lang, users)
+                                 VALUES (NEW.day, COALESCE((SELECT lang FROM users WHERE user_id = NEW.user_id), 'en'), 1)
+                                 ON CONFLICT(day, lang) DO UPDATE SET users = users + 1;
+                             END;''')
+        self.conn.commit()
+
+        # База, созданная до счётчиков: заполняем их один раз по существующим пользователям.
+        # BEGIN IMMEDIATE - чтобы два процесса, стартующие одновременно, не заполнили их дважды
+        self.cursor.execute('BEGIN IMMEDIATE;')
+        if self.cursor.execute(SELECT_COUNTER, ('users',)).fetchone() is None:
+            self.cursor.execute('''INSERT INTO user_counters (name, value)
+                                 SELECT 'users', COUNT(*) FROM users;''')
+            self.cursor.execute('''INSERT INTO user_counters (name, value)
+                                 SELECT 'lang:' || COALESCE(lang, 'en'), COUNT(*) FROM users
+                                 GROUP BY COALESCE(lang, 'en');''')
+            self.cursor.execute('''INSERT INTO registrations_hourly (hour, registrations)
+                                 SELECT strftime('%Y-%m-%d %H:00:00', registration_date), COUNT(*) FROM users
+                                 WHERE registration_date IS NOT NULL
+                                 GROUP BY 1;''')
         self.conn.commit()
 
     def update_table_structure(self):
         # Проверяем наличие колонки registration_date в таблице users
         self.cursor.execute("PRAGMA table_info(users)")
         columns = [column[1] for column in self.cursor.fetchall()]
-        
+
         if 'registration_date' not in columns:
             # Добавляем колонку registration_date
-            self.cursor.execute('''ALTER TABLE users 
+            self.cursor.execute('''ALTER TABLE users
                                  ADD COLUMN registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP;''')
             self.conn.commit()
 
     def initialize_admins(self):
         # Список администраторов по умолчанию
         default_admins = [741648725]  # Добавьте сюда нужные ID администраторов
-        
+
         # Проверяем существующих администраторов
         self.cursor.execute("SELECT user_id FROM admins")
         existing_admins = [row[0] for row in self.cursor.fetchall()]
-        
+
         # Добавляем новых администраторов
         for admin_id in default_admins:
             if admin_id not in existing_admins:
                 self.cursor.execute('''INSERT INTO admins (user_id) VALUES (?);''', (admin_id,))
-        
+
         self.conn.commit()
 
-    def is_admin(self, user_id: int) -> bool:
+    def reader(self) -> DatabaseWorker:
+        self._next_reader = (self._next_reader + 1) % len(self.readers)
+        return self.readers[self._next_reader]
+
+    async def fetchone(self, sql: str, params: tuple = ()):
+        return await self.reader().submit(sql, params, 'one')
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> list:
+        return await self.reader().submit(sql, params, 'all')
+
+    async def execute_write(self, sql: str, params: tuple = ()) -> int:
+        """Запись через поток-писатель; возвращает rowcount после коммита"""
+        return await self.writer.submit(sql, params, 'rowcount')
+
+    async def close(self):
+        """Дожидается незафиксированных записей и закрывает соединения"""
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+        workers = [self.writer, *self.readers]
+        for worker in workers:
+            worker.stop()
+        await asyncio.to_thread(lambda: [worker.join() for worker in workers])
+
+    async def is_admin(self, user_id: int) -> bool:
         """Проверяет, является ли пользователь администратором"""
-        return self.cursor.execute('''SELECT user_id FROM admins WHERE user_id = ?;''', (user_id,)).fetchone() is not None
+        return await self.fetchone(SELECT_ADMIN, (user_id,)) is not None
 
-    def add_admin(self, user_id: int) -> bool:
+    async def add_admin(self, user_id: int) -> bool:
         """Добавляет нового администратора"""
-        if not self.is_admin(user_id):
-            self.cursor.execute('''INSERT INTO admins (user_id) VALUES (?);''', (user_id,))
-            self.conn.commit()
-            return True
-        return False
+        return await self.execute_write(INSERT_ADMIN, (user_id,)) > 0
 
-    def remove_admin(self, user_id: int) -> bool:
+    async def remove_admin(self, user_id: int) -> bool:
         """Удаляет администратора"""
-        if self.is_admin(user_id):
-            self.cursor.execute('''DELETE FROM admins WHERE user_id = ?;''', (user_id,))
-            self.conn.commit()
-            return True
-        return False
+        return await self.execute_write(DELETE_ADMIN, (user_id,)) > 0
 
-    def get_all_admins(self) -> list:
+    async def get_all_admins(self) -> list:
         """Возвращает список всех администраторов"""
-        self.cursor.execute('''SELECT user_id FROM admins;''')
-        return [row[0] for row in self.cursor.fetchall()]
+        return [row[0] for row in await self.fetchall(SELECT_ADMINS)]
 
-    def exist_user(self, user_id: int) -> bool:
-        return self.cursor.execute('''SELECT user_id FROM users WHERE user_id = ?;''', (user_id,)).fetchone() is not None
-
-    def get_lang(self, user_id: int) -> str:
-        result = self.cursor.execute('''SELECT lang FROM users WHERE user_id = ?;''', (user_id,)).fetchone()
+    async def exist_user(self, user_id: int) -> bool:
+        if self.users.get(user_id) is not None:
+            return True
+        # Язык читается заодно: следующий get_lang этого пользователя попадёт в кэш
+        result = await self.fetchone(SELECT_LANG, (user_id,))
         if result is None:
-            # Если пользователь не найден, добавляем его с языком по умолчанию
-            self.add_user(user_id)
-            return 'en'
-        return result[0]
-
-    def add_user(self, user_id: int):
-        if not self.exist_user(user_id):
-            self.cursor.execute('''INSERT INTO users (user_id, registration_date) 
-                                 VALUES (?, CURRENT_TIMESTAMP);''', (user_id,))
-            self.conn.commit()
+            return False
+        self.users.add(user_id, result[0])
+        return True
 
-    def set_language(self, user_id: int, lang: str):
-        self.cursor.execute('''UPDATE users SET lang = ? WHERE user_id = ?;''', (lang, user_id))
-        self.conn.commit()
+    async def get_lang(self, user_id: int) -> str:
+        # get_lang вызывается на каждое сообщение и нажатие кнопки, поэтому активность отмечается здесь
+        lang = self.users.get(user_id)
+        if lang is None:
+            result = await self.fetchone(SELECT_LANG, (user_id,))
+            if result is None:
+                # Если пользователь не найден, добавляем его с языком по умолчанию
+                await self.add_user(user_id)
+                lang = 'en'
+            else:
+                lang = result[0]
+                self.users.add(user_id, lang)
+        self.record_activity(user_id)
+        return lang
+
+    async def add_user(self, user_id: int):
+        if await self.execute_write(INSERT_USER, (user_id,)) > 0:
+            self.users.add(user_id, 'en')
+
+    async def set_language(self, user_id: int, lang: str):
+        if await self.execute_write(UPDATE_LANG, (lang, user_id)) > 0:
+            self.users.set(user_id, lang)
+
+    async def get_media_cache(self) -> list:
+        """[(path, file_hash, file_id)] всех загруженных картинок"""
+        return await self.fetchall(SELECT_MEDIA)
+
+    async def save_media(self, path: str, file_hash: str, file_id: str):
+        await self.execute_write(UPSERT_MEDIA, (path, file_hash, file_id))
+
+    async def delete_media(self, path: str):
+        await self.execute_write(DELETE_MEDIA, (path,))
+
+    async def get_users_amount_hour(self) -> int:
+        return (await self.fetchone(COUNT_USERS_SINCE, ('-1 hours',)))[0]
+
+    async def get_users_amount_day(self) -> int:
+        return (await self.fetchone(COUNT_USERS_SINCE, ('-1 days',)))[0]
+
+    async def get_users_amount_whole(self) -> int:
+        result = await self.fetchone(SELECT_COUNTER, ('users',))
+        return result[0] if result else 0
+
+    async def get_users_by_language(self) -> list:
+        """[(язык, пользователей)] по счётчикам, от самого частого"""
+        return await self.fetchall(SELECT_LANG_COUNTERS)
+
+    async def get_active_today_by_language(self) -> list:
+        """[(язык, пользователей)] активных сегодня (UTC); язык - на момент первой активности за день"""
+        return await self.fetchall(SELECT_DAILY_ACTIVE)
+
+    async def log_events(self, rows: list) -> int:
+        """Пачка событий одним executemany: [(created_at, kind, user_id, node, endpoint, latency_ms, ok, detail, error)]"""
+        return await self.writer.submit(INSERT_EVENT, rows, 'many')
+
+    async def delete_old_events(self, days: int) -> int:
+        return await self.execute_write(DELETE_OLD_EVENTS, (f'-{days} days',))
+
+    async def get_top_nodes(self, hours: int, limit: int = 10) -> list:
+        """[(callback_data, нажатий, пользователей)] за последние hours часов"""
+        return await self.fetchall(SELECT_TOP_NODES, (f'-{hours} hours', limit))
+
+    async def get_question_latency(self, hours: int) -> list:
+        """[(адрес, вопросов, ошибок, среднее, p50, p95 мс)] за последние hours часов"""
+        return await self.fetchall(SELECT_QUESTION_LATENCY, (f'-{hours} hours',))
+
+    async def get_failed_questions(self, hours: int, limit: int = 10) -> list:
+        """[(время, user_id, вопрос, ошибка)] последних неудачных вопросов"""
+        return await self.fetchall(SELECT_FAILED_QUESTIONS, (f'-{hours} hours', limit))
+
+    def record_activity(self, user_id: int):
+        """Отмечает активность пользователя за сегодня; в базу пишется только первая за день.
 
-    def get_users_amount_hour(self) -> int:
-        hour_ago = datetime.now() - timedelta(hours=1)
-        return self.cursor.execute('''SELECT COUNT(*) FROM users WHERE registration_date >= ?;''', (hour_ago,)).fetchone()[0]
+        Запись уходит потоку-писателю в фоне: обработчик не ждёт SQLite.
+        """
+        day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        if day != self.active_day:
+            self.active_day = day
+            self.active_today = set()
+            self.write_in_background(DELETE_OLD_ACTIVITY, (f'-{USER_ACTIVITY_DAYS} days',))
+        if user_id in self.active_today:
+            return
+        self.active_today.add(user_id)
+        self.write_in_background(INSERT_ACTIVITY, (day, user_id))
 
-    def get_users_amount_day(self) -> int:
-        day_ago = datetime.now() - timedelta(days=1)
-        return self.cursor.execute('''SELECT COUNT(*) FROM users WHERE registration_date >= ?;''', (day_ago,)).fetchone()[0]
+    def write_in_background(self, sql: str, params: tuple = ()):
+        task = asyncio.create_task(self.execute_write(sql, params))
+        self.pending.add(task)
+        task.add_done_callback(self.write_done)
 
-    def get_users_amount_whole(self) -> int:
-        return self.cursor.execute('''SELECT COUNT(*) FROM users;''').fetchone()[0]
+    def write_done(self, task: asyncio.Task):
+        self.pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка фоновой записи в базу: {task.exception()}")
 
 
 if __name__ == '__main__':
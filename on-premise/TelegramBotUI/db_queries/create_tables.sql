@@ -12,6 +12,57 @@ CREATE TABLE IF NOT EXISTS admins (
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Создание таблицы file_id картинок, загруженных в Telegram
+CREATE TABLE IF NOT EXISTS media_cache (
+    path TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Счётчики пользователей, которые ведут триггеры: users - всего, lang:<код> - по языкам
+CREATE TABLE IF NOT EXISTS user_counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+-- Регистрации по часам (UTC, 'YYYY-MM-DD HH:00:00')
+CREATE TABLE IF NOT EXISTS registrations_hourly (
+    hour TEXT PRIMARY KEY,
+    registrations INTEGER NOT NULL DEFAULT 0
+);
+
+-- Первая активность пользователя за день (UTC)
+CREATE TABLE IF NOT EXISTS user_activity (
+    day TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+) WITHOUT ROWID;
+
+-- Активные за день пользователи по языкам
+CREATE TABLE IF NOT EXISTS daily_active (
+    day TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    users INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, lang)
+) WITHOUT ROWID;
+
+-- Журнал событий бота: навигация по меню, вопросы, команды (время UTC)
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    user_id INTEGER,
+    node TEXT,
+    endpoint TEXT,
+    latency_ms REAL,
+    ok INTEGER NOT NULL DEFAULT 1,
+    detail TEXT,
+    error TEXT
+);
+
 -- Создание индексов для оптимизации запросов
 CREATE INDEX IF NOT EXISTS idx_users_registration_date ON users(registration_date);
-CREATE INDEX IF NOT EXISTS idx_admins_added_date ON admins(added_date); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_admins_added_date ON admins(added_date);
+CREATE INDEX IF NOT EXISTS idx_events_kind_created_at ON events(kind, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_created_at ON events(created_at); 
\ No newline at end of file
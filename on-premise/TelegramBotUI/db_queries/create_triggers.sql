@@ -32,4 +32,47 @@ AFTER UPDATE OF lang ON users
 BEGIN
     INSERT INTO language_change_log (user_id, old_lang, new_lang, change_date)
     VALUES (NEW.user_id, OLD.lang, NEW.lang, CURRENT_TIMESTAMP);
-END; 
\ No newline at end of file
+END;
+
+-- Триггер для счётчиков пользователей: всего, по языку и регистрации по часам
+CREATE TRIGGER IF NOT EXISTS trg_users_counters_insert
+AFTER INSERT ON users
+BEGIN
+    INSERT INTO user_counters (name, value) VALUES ('users', 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+    INSERT INTO user_counters (name, value) VALUES ('lang:' || COALESCE(NEW.lang, 'en'), 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+    INSERT INTO registrations_hourly (hour, registrations)
+    VALUES (strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.registration_date, CURRENT_TIMESTAMP)), 1)
+    ON CONFLICT(hour) DO UPDATE SET registrations = registrations + 1;
+END;
+
+-- Триггер для переноса пользователя между счётчиками языков
+CREATE TRIGGER IF NOT EXISTS trg_users_counters_lang
+AFTER UPDATE OF lang ON users
+WHEN OLD.lang IS NOT NEW.lang
+BEGIN
+    UPDATE user_counters SET value = value - 1
+    WHERE name = 'lang:' || COALESCE(OLD.lang, 'en');
+    INSERT INTO user_counters (name, value) VALUES ('lang:' || COALESCE(NEW.lang, 'en'), 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+
+-- Триггер для счётчиков при удалении пользователя
+CREATE TRIGGER IF NOT EXISTS trg_users_counters_delete
+AFTER DELETE ON users
+BEGIN
+    UPDATE user_counters SET value = value - 1
+    WHERE name IN ('users', 'lang:' || COALESCE(OLD.lang, 'en'));
+    UPDATE registrations_hourly SET registrations = registrations - 1
+    WHERE hour = strftime('%Y-%m-%d %H:00:00', OLD.registration_date);
+END;
+
+-- Триггер для дневных итогов активных пользователей по языкам
+CREATE TRIGGER IF NOT EXISTS trg_user_activity
+AFTER INSERT ON user_activity
+BEGIN
+    INSERT INTO daily_active (day, lang, users)
+    VALUES (NEW.day, COALESCE((SELECT lang FROM users WHERE user_id = NEW.user_id), 'en'), 1)
+    ON CONFLICT(day, lang) DO UPDATE SET users = users + 1;
+END;
\ No newline at end of file
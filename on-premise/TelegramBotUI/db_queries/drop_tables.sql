@@ -1,7 +1,15 @@
 -- Удаление индексов
 DROP INDEX IF EXISTS idx_users_registration_date;
 DROP INDEX IF EXISTS idx_admins_added_date;
+DROP INDEX IF EXISTS idx_events_kind_created_at;
+DROP INDEX IF EXISTS idx_events_created_at;
 
 -- Удаление таблиц
+DROP TABLE IF EXISTS events;
+DROP TABLE IF EXISTS daily_active;
+DROP TABLE IF EXISTS user_activity;
+DROP TABLE IF EXISTS registrations_hourly;
+DROP TABLE IF EXISTS user_counters;
+DROP TABLE IF EXISTS media_cache;
 DROP TABLE IF EXISTS admins;
 DROP TABLE IF EXISTS users; 
\ No newline at end of file
@@ -1,27 +1,43 @@
-from aiogram import types
-from aiogram.types import InputMediaPhoto, Message, CallbackQuery, FSInputFile
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from aiogram.exceptions import TelegramAPIError
 from db import Database
+from media_cache import MediaCache
+from llm_client import LLM_STREAMING, LLMClient, LLMError
+from answer_stream import AnswerStream
+from analytics import EventLog
+from middlewares.question_limit import QuestionLimitMiddleware
 from tree_structure import ButtonTree
 from config import MAIN_MENU_DIR, AUTH_FILE, BACK_BUTTON_FILE
+import asyncio
 import json
+from contextlib import aclosing
 import os
-import aiohttp
-from decouple import config
+import time
 from loguru import logger
 db = Database()
+media_cache = MediaCache(db)
 
 
 ENDPOINTS = [
     "http://llm_agent-backend:8001/ask",
     "http://localhost:8001/ask"
 ]
+# Один клиент на процесс: пул соединений и состояние адресов общие для всех сообщений
+llm_client = LLMClient(ENDPOINTS)
+# Очередь вопросов: подключается в routers.py, статистика показывается в /stat
+question_limit = QuestionLimitMiddleware()
+# Журнал событий: обработчики только кладут события в буфер, запись в базу - фоновой задачей из main.py
+event_log = EventLog(db)
 
 
 
+with open(BACK_BUTTON_FILE, 'r', encoding='utf-8') as f:
+    back_button_texts = json.load(f)
+
+
 with open(AUTH_FILE, 'r', encoding='utf-8') as f:
     auth_config = json.load(f)
-auth_tree = ButtonTree.from_json(auth_config)
+auth_tree = ButtonTree.from_json(auth_config, back_button_texts, languages=['en'])
 
 
 menu_trees = {}
@@ -32,19 +48,16 @@ for filename in os.listdir(menu_dir):
         lang = filename.replace(f'{dir_name}_', '').replace('.json', '')  
         with open(os.path.join(menu_dir, filename), 'r', encoding='utf-8') as f:
             menu_config = json.load(f)
-            menu_trees[lang] = ButtonTree.from_json(menu_config)
-
-
-with open(BACK_BUTTON_FILE, 'r', encoding='utf-8') as f:
-    back_button_texts = json.load(f)
+            # Клавиатуры всех узлов строятся при загрузке, callback только берёт готовую
+            menu_trees[lang] = ButtonTree.from_json(menu_config, back_button_texts, languages=[lang])
 
 async def start(message: Message):
     """Обработчик команды /start"""
     user_id = message.from_user.id
+    event_log.log('command', user_id, node='/start')
     
-    
-    if db.exist_user(user_id) and db.get_lang(user_id):
-        lang = db.get_lang(user_id)
+    if await db.exist_user(user_id):
+        lang = await db.get_lang(user_id)
         menu_tree = menu_trees[lang]
         
         await message.answer(
@@ -64,11 +77,10 @@ async def process_language_callback(callback_query: CallbackQuery):
     """Обработчик выбора языка"""
     user_id = callback_query.from_user.id
     lang = callback_query.data.split('_')[1]  
+    event_log.log('language', user_id, node=lang)
     
-    
-    if not db.exist_user(user_id):
-        db.add_user(user_id)
-    db.set_language(user_id, lang)
+    await db.add_user(user_id)
+    await db.set_language(user_id, lang)
     
     
     menu_tree = menu_trees[lang]
@@ -83,36 +95,22 @@ async def process_callback(callback_query: CallbackQuery):
     """Обработчик всех остальных callback-запросов"""
     user_id = callback_query.from_user.id
     callback_data = callback_query.data
+    started = time.perf_counter()
     
-    
-    lang = db.get_lang(user_id)
+    lang = await db.get_lang(user_id)
     current_tree = menu_trees[lang] if lang else auth_tree
     
     
     node = current_tree.get_node(callback_data)
     if not node:
         await callback_query.answer("❌ Ошибка: кнопка не найдена")
+        event_log.log('callback', user_id, node=callback_data, ok=False, error="node not found")
         return
 
     
     if node.content.img:
         
-        media = []
-        for i, img_path in enumerate(node.content.img):
-            
-            if i == 0:
-                media.append(InputMediaPhoto(
-                    media=FSInputFile(img_path),
-                    caption=node.content.text,
-                    parse_mode='Markdown'
-                ))
-            else:
-                media.append(InputMediaPhoto(
-                    media=FSInputFile(img_path)
-                ))
-        
-        
-        await callback_query.message.answer_media_group(media=media)
+        await media_cache.answer_media_group(callback_query.message, node.content.img, node.content.text)
         
         
         await callback_query.message.answer(
@@ -132,10 +130,12 @@ async def process_callback(callback_query: CallbackQuery):
         )
     
     await callback_query.answer()
+    event_log.log('callback', user_id, node=callback_data, latency_ms=(time.perf_counter() - started) * 1000)
 
 async def info(message: Message):
     user_id = message.from_user.id
-    lang = db.get_lang(user_id)
+    event_log.log('command', user_id, node='/info')
+    lang = await db.get_lang(user_id)
     if not lang:
         await message.answer("❌ Please select language first using /start")
         return
@@ -151,57 +151,167 @@ async def info(message: Message):
 
 async def stat(message: Message):
     user_id = message.from_user.id
-    if not db.is_admin(user_id):
+    if not await db.is_admin(user_id):
         return
-    hour = db.get_users_amount_hour()
-    day = db.get_users_amount_day()
-    whole = db.get_users_amount_whole()
+    # Запросы читают счётчики и идут параллельно через потоки чтения базы
+    hour, day, whole, by_language, active_today = await asyncio.gather(
+        db.get_users_amount_hour(),
+        db.get_users_amount_day(),
+        db.get_users_amount_whole(),
+        db.get_users_by_language(),
+        db.get_active_today_by_language(),
+    )
     stats_text = "📊 *Статистика регистраций*\n\n"
     stats_text += f"За последний час: {hour}\n"
     stats_text += f"За последние 24 часа: {day}\n"
-    stats_text += f"Всего: {whole}"
+    stats_text += f"Всего: {whole}\n\n"
+    active = dict(active_today)
+    stats_text += f"По языкам (активны сегодня, UTC: {sum(active.values())}):\n"
+    for lang, users in by_language:
+        stats_text += f"{lang}: {users}, активны сегодня {active.get(lang, 0)}\n"
+    stats_text += "\n"
+    cache = db.users.stats()
+    stats_text += f"Кэш языков: {cache['size']} пользователей, попадания {cache['hit_ratio']:.1%}\n"
+    stats_text += f"Картинки меню: загружено {media_cache.uploads}, из кэша file_id {media_cache.reuses}\n"
+    events = event_log.stats()
+    stats_text += (
+        f"События: записано {events['written']}, в буфере {events['buffered']}, потеряно {events['dropped']}\n"
+    )
+    queue = question_limit.stats()
+    stats_text += (
+        f"Вопросы: в работе {queue['active']}, в очереди {queue['waiting']}, заменено {queue['coalesced']}, "
+        f"отклонено {queue['rejected']}, ожидание p50 {queue['wait_p50_s']} с, p95 {queue['wait_p95_s']} с\n"
+    )
+    for endpoint in llm_client.stats():
+        stats_text += (
+            f"`{endpoint['endpoint']}`: {endpoint['state']}, запросов {endpoint['requests']}, "
+            f"ошибок {endpoint['errors']}, p50 {endpoint['p50_ms']} мс, p95 {endpoint['p95_ms']} мс\n"
+        )
     await message.answer(
         stats_text,
         parse_mode='Markdown'
     )
 
+def report_hours(message: Message) -> int:
+    """Период отчёта из аргумента команды: /top 48 - за 48 часов, по умолчанию за сутки"""
+    parts = message.text.split()
+    if len(parts) > 1 and parts[1].isdigit() and int(parts[1]) > 0:
+        return int(parts[1])
+    return 24
+
+async def top(message: Message):
+    """Самые нажимаемые кнопки меню"""
+    if not await db.is_admin(message.from_user.id):
+        return
+    hours = report_hours(message)
+    rows = await db.get_top_nodes(hours)
+    text = f"📈 Кнопки за {hours} ч:\n\n"
+    for node, hits, users in rows:
+        text += f"{node}: {hits} нажатий, {users} пользователей\n"
+    # Без разметки: в callback_data есть подчёркивания
+    await message.answer(text if rows else f"📈 За {hours} ч нажатий не было")
+
+async def latency(message: Message):
+    """Задержка ответов на вопросы по адресам сервиса ответов"""
+    if not await db.is_admin(message.from_user.id):
+        return
+    hours = report_hours(message)
+    rows = await db.get_question_latency(hours)
+    text = f"⏱ Вопросы за {hours} ч:\n\n"
+    for endpoint, questions, errors, avg_ms, p50_ms, p95_ms in rows:
+        text += (
+            f"{endpoint}: вопросов {questions}, ошибок {errors}, "
+            f"среднее {avg_ms:.0f} мс, p50 {p50_ms:.0f} мс, p95 {p95_ms:.0f} мс\n"
+        )
+    await message.answer(text if rows else f"⏱ За {hours} ч вопросов не было")
+
+async def failures(message: Message):
+    """Последние вопросы, на которые не удалось ответить"""
+    if not await db.is_admin(message.from_user.id):
+        return
+    hours = report_hours(message)
+    rows = await db.get_failed_questions(hours)
+    text = f"❌ Неудачные вопросы за {hours} ч:\n\n"
+    for created_at, user_id, question, error in rows:
+        text += f"{created_at} UTC, {user_id}: {question}\n{error}\n\n"
+    await message.answer(text[:4096] if rows else f"✅ За {hours} ч неудачных вопросов не было")
+
+def format_answer(data: dict) -> str:
+    """Текст ответа с источниками"""
+    response_text = f"{data['answer']}\n\n"
+    for source, relevance_score in data["source_documents_dict"].items():
+        response_text += f"🔍 Источник: {os.path.basename(source)}\n"
+    return response_text
+
+async def stream_answer(message: Message, processing_msg: Message, payload: dict) -> tuple:
+    """Потоковый ответ: заглушка редактируется по мере прихода текста, в конце - ответ с источниками
+
+    Исключения не выпускает: заглушка в любом случае заменяется ответом или ошибкой.
+    Возвращает (адрес, текст ошибки или None) для журнала событий.
+    """
+    stream = AnswerStream(message, processing_msg)
+    data = {}
+    try:
+        # aclosing: при ошибке Telegram поток ответа закрывается сразу, а не при сборке мусора
+        async with aclosing(llm_client.stream(payload)) as events:
+            async for event in events:
+                if "delta" in event:
+                    await stream.add(event["delta"])
+                else:
+                    data = event
+        response_text = format_answer(data)
+        await stream.finish(response_text)
+    except (LLMError, TelegramAPIError) as e:
+        logger.error(f"Ошибка потокового ответа: {e}")
+        # Текст ошибки Telegram пользователю ничего не скажет
+        error_text = str(e) if isinstance(e, LLMError) else "❌ Не удалось показать ответ, попробуйте ещё раз"
+        await show_stream_error(message, stream, error_text)
+        return data.get("endpoint"), str(e)
+    
+    logger.info(f"Потоковый ответ ({stream.edits} правок): {response_text}")
+    return data.get("endpoint"), None
+
+async def show_stream_error(message: Message, stream: AnswerStream, error_text: str):
+    """Уже показанная часть ответа остаётся, ошибка дописывается после неё"""
+    try:
+        await stream.finish(f"{stream.text}\n\n{error_text}" if stream.text else error_text)
+    except TelegramAPIError as e:
+        # Заглушку не удалось отредактировать (например, её удалили): ошибка уходит отдельным сообщением
+        logger.warning(f"Не удалось дописать ошибку в ответ: {e}")
+        try:
+            await message.answer(error_text)
+        except TelegramAPIError as e:
+            logger.error(f"Не удалось отправить ошибку пользователю: {e}")
+
 async def handle_text(message: Message):
     """Обработчик текстовых сообщений"""
     
+    started = time.perf_counter()
     processing_msg = await message.answer("🔄 Сообщение обрабатывается...")
     
-    language = db.get_lang(message.from_user.id)
-    last_error = None
-    
-    async with aiohttp.ClientSession() as session:
-        for endpoint in ENDPOINTS:
-            try:
-                async with session.post(
-                    endpoint,
-                    json={"user_id": message.from_user.id, "question": message.text, "language": language},
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        answer = data["answer"]
-                        tokens = data["tokens"]
-                        cost = data["cost"]
-                        source_documents_dict = data["source_documents_dict"]
-                        
-                        response_text = f"{answer}\n\n"
-                        for source, relevance_score in source_documents_dict.items():
-                            response_text += f"🔍 Источник: {os.path.basename(source)}\n"
-                        
-                        
-                        await processing_msg.delete()
-                        await message.answer(response_text)
-                        logger.info(f"Ответ от {endpoint}: {response_text}")
-                        return
-                    else:
-                        error_text = await response.text()
-                        last_error = f"❌ Ошибка при обработке запроса: {error_text}"
-            except Exception as e:
-                last_error = f"❌ Ошибка при подключении к {endpoint}: {str(e)}"
-                continue
-    
-    
-    await processing_msg.edit_text(last_error) 
\ No newline at end of file
+    language = await db.get_lang(message.from_user.id)
+    payload = {"user_id": message.from_user.id, "question": message.text, "language": language}
+    
+    def log_question(endpoint, error=None):
+        event_log.log('question', message.from_user.id, node=language, endpoint=endpoint,
+                      latency_ms=(time.perf_counter() - started) * 1000, ok=error is None,
+                      detail=message.text, error=error)
+    
+    if LLM_STREAMING:
+        log_question(*await stream_answer(message, processing_msg, payload))
+        return
+    
+    try:
+        endpoint, data = await llm_client.ask(payload)
+    except LLMError as e:
+        await processing_msg.edit_text(str(e))
+        log_question(None, str(e))
+        return
+    
+    response_text = format_answer(data)
+    
+    
+    await processing_msg.delete()
+    await message.answer(response_text)
+    log_question(endpoint)
+    logger.info(f"Ответ от {endpoint}: {response_text}")
\ No newline at end of file
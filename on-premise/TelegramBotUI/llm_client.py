@@ -0,0 +1,283 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+from decouple import config
+from loguru import logger
+
+# Ответ модели может идти долго, но подключение к живому сервису занимает миллисекунды
+LLM_TIMEOUT = config('LLM_TIMEOUT', default=120, cast=float)
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=3, cast=float)
+# Соединений в пуле на все адреса
+LLM_POOL_SIZE = config('LLM_POOL_SIZE', default=100, cast=int)
+# Подряд неудач, после которых адрес выключается, и на сколько секунд
+LLM_BREAKER_FAILURES = config('LLM_BREAKER_FAILURES', default=3, cast=int)
+LLM_BREAKER_COOLDOWN = config('LLM_BREAKER_COOLDOWN', default=30, cast=float)
+# Запасной адрес запрашивается, если основной отвечает дольше этого перцентиля своих задержек
+LLM_HEDGE_PERCENTILE = config('LLM_HEDGE_PERCENTILE', default=0.95, cast=float)
+# Пока замеров меньше, вместо перцентиля ждём LLM_HEDGE_DELAY секунд; 0 - без дублирования
+LLM_HEDGE_DELAY = config('LLM_HEDGE_DELAY', default=15, cast=float)
+LLM_HEDGE_MIN_DELAY = config('LLM_HEDGE_MIN_DELAY', default=0.5, cast=float)
+LLM_HEDGE_MIN_SAMPLES = 20
+# Потоковые ответы: сервис присылает текст частями (SSE или NDJSON), бот показывает их по мере прихода
+LLM_STREAMING = config('LLM_STREAMING', default=False, cast=bool)
+# Пауза в потоке дольше этого считается зависанием адреса
+LLM_STREAM_IDLE_TIMEOUT = config('LLM_STREAM_IDLE_TIMEOUT', default=30, cast=float)
+LATENCY_WINDOW = 200
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+class LLMError(Exception):
+    """Ни один адрес не вернул ответ; текст исключения показывается пользователю"""
+
+
+def check_answer(data) -> dict:
+    """Ответ сервиса без answer или source_documents_dict (например, объект ошибки) - ошибка, а не ответ"""
+    if isinstance(data, dict) and isinstance(data.get("answer"), str) \
+            and isinstance(data.get("source_documents_dict"), dict):
+        return data
+    detail = (data.get("detail") or data.get("error")) if isinstance(data, dict) else None
+    raise LLMError(f"❌ Некорректный ответ сервиса: {detail or str(data)[:200]}")
+
+
+class EndpointHealth:
+    """Состояние одного адреса: задержки последних ответов и автомат выключения (circuit breaker)
+
+    После LLM_BREAKER_FAILURES неудач подряд адрес выключается на LLM_BREAKER_COOLDOWN секунд,
+    затем пропускает один пробный запрос: успех включает адрес, неудача снова выключает.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+
+    def available(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.probing
+        return self.state == CLOSED
+
+    def started(self):
+        self.requests += 1
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def succeeded(self, latency: Optional[float] = None):
+        # Задержка потокового ответа зависит от его длины и в окно для дублирования не идёт
+        if latency is not None:
+            self.latencies.append(latency)
+        self.failures = 0
+        self.probing = False
+        if self.state != CLOSED:
+            logger.info(f"Адрес {self.endpoint} снова доступен")
+        self.state = CLOSED
+
+    def failed(self):
+        self.errors += 1
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= LLM_BREAKER_FAILURES):
+            logger.warning(f"Адрес {self.endpoint} выключен на {LLM_BREAKER_COOLDOWN:.0f} с после {self.failures} ошибок")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def cancelled(self):
+        # Запрос отменён, потому что раньше ответил другой адрес: это не ошибка этого адреса
+        self.probing = False
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Сколько ждать ответа, прежде чем продублировать запрос на следующий адрес"""
+        if LLM_HEDGE_DELAY <= 0:
+            return None
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, self.percentile(LLM_HEDGE_PERCENTILE))
+
+    def rank(self) -> Tuple[int, float]:
+        """Ключ сортировки: доступные адреса раньше, среди них - с меньшей медианой задержки"""
+        median = self.percentile(0.5)
+        return (0 if self.available() else 1, median if median is not None else float('inf'))
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "endpoint": self.endpoint,
+            "state": self.state,
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class LLMClient:
+    """Клиент сервиса ответов: общий пул соединений, выбор здорового адреса и дублирование медленных запросов"""
+
+    def __init__(self, endpoints: List[str]):
+        self.health: Dict[str, EndpointHealth] = {endpoint: EndpointHealth(endpoint) for endpoint in endpoints}
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Сессия создаётся внутри работающего event loop, при первом запросе
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=LLM_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            )
+        return self.session
+
+    def ranked(self) -> List[EndpointHealth]:
+        # sorted устойчив: при равных ключах сохраняется порядок адресов из настроек
+        ranked = sorted(self.health.values(), key=lambda health: health.rank())
+        available = [health for health in ranked if health.available()]
+        # Если выключены все, пробуем все: лучше лишняя попытка, чем отказ без попытки
+        return available or ranked
+
+    async def post(self, health: EndpointHealth, payload: dict) -> dict:
+        health.started()
+        started = time.perf_counter()
+        try:
+            async with self.get_session().post(health.endpoint, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise LLMError(f"❌ Ошибка при обработке запроса: {error_text}")
+                data = check_answer(await response.json())
+        except asyncio.CancelledError:
+            health.cancelled()
+            raise
+        except LLMError:
+            health.failed()
+            raise
+        except Exception as e:
+            health.failed()
+            raise LLMError(f"❌ Ошибка при подключении к {health.endpoint}: {str(e)}")
+        health.succeeded(time.perf_counter() - started)
+        return data
+
+    async def ask(self, payload: dict) -> Tuple[str, dict]:
+        """Ответ первого успешно ответившего адреса: (адрес, JSON ответа)
+
+        Запрос уходит на лучший адрес. Если тот не ответил за свой перцентиль задержки,
+        запрос дублируется на следующий; если адрес ответил ошибкой, следующий пробуется сразу.
+        Оставшиеся запросы отменяются, как только есть ответ.
+        """
+        candidates = self.ranked()
+        pending = {}
+        last_error = None
+        try:
+            while candidates or pending:
+                if candidates and not pending:
+                    health = candidates.pop(0)
+                    pending[asyncio.create_task(self.post(health, payload))] = health
+                    continue
+                # Дублирование ждёт перцентиля последнего запущенного адреса
+                timeout = list(pending.values())[-1].hedge_delay() if candidates else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    health = candidates.pop(0)
+                    logger.info(f"Нет ответа за {timeout:.1f} с, запрос дублируется на {health.endpoint}")
+                    pending[asyncio.create_task(self.post(health, payload))] = health
+                    continue
+                for task in done:
+                    health = pending.pop(task)
+                    try:
+                        return health.endpoint, task.result()
+                    except LLMError as e:
+                        last_error = str(e)
+        finally:
+            for task in pending:
+                task.cancel()
+        raise LLMError(last_error or "❌ Нет доступных адресов сервиса ответов")
+
+    async def stream(self, payload: dict) -> AsyncIterator[dict]:
+        """Потоковый ответ: события {"delta": текст}, последним - JSON ответа как у ask с ключом endpoint
+
+        Запрос не дублируется: второй поток удвоил бы расход токенов на весь ответ. Пока не пришло
+        ни одного события, ошибка или молчание дольше LLM_STREAM_IDLE_TIMEOUT переводят запрос
+        на следующий адрес; после первого события ошибка прерывает ответ.
+        Сервис без поддержки потока может ответить обычным JSON - тогда событие одно, итоговое.
+        """
+        last_error = None
+        timeout = aiohttp.ClientTimeout(total=LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT,
+                                        sock_read=LLM_STREAM_IDLE_TIMEOUT)
+        for health in self.ranked():
+            health.started()
+            started = False
+            try:
+                async with self.get_session().post(
+                    health.endpoint, json={**payload, "stream": True}, timeout=timeout
+                ) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        raise LLMError(f"❌ Ошибка при обработке запроса: {error_text}")
+                    deltas = []
+                    final = None
+                    async for event in self.read_events(response):
+                        if "delta" in event:
+                            deltas.append(event["delta"])
+                        else:
+                            event = final = {**check_answer(event), "endpoint": health.endpoint}
+                        started = True
+                        yield event
+                    health.succeeded()
+                    if final is None:
+                        # Поток закончился без итогового события: ответ собирается из частей
+                        yield {"answer": "".join(deltas), "source_documents_dict": {}, "endpoint": health.endpoint}
+                    return
+            except (asyncio.CancelledError, GeneratorExit):
+                # Отмена или прерванное чтение потока вызывающим кодом
+                health.cancelled()
+                raise
+            except Exception as e:
+                health.failed()
+                last_error = str(e) if isinstance(e, LLMError) else \
+                    f"❌ Ошибка при подключении к {health.endpoint}: {str(e)}"
+                if started:
+                    raise LLMError(last_error)
+        raise LLMError(last_error or "❌ Нет доступных адресов сервиса ответов")
+
+    async def read_events(self, response: aiohttp.ClientResponse) -> AsyncIterator[dict]:
+        content_type = response.content_type
+        if content_type == 'text/event-stream':
+            # SSE: событие - строки data: до пустой строки
+            data = []
+            async for line in response.content:
+                line = line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('data:'):
+                    data.append(line[5:].lstrip(' '))
+                elif not line and data:
+                    event = '\n'.join(data)
+                    data = []
+                    if event == '[DONE]':
+                        return
+                    yield json.loads(event)
+        elif content_type == 'application/x-ndjson':
+            async for line in response.content:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield await response.json(content_type=None)
+
+    def stats(self) -> List[dict]:
+        return [health.stats() for health in self.health.values()]
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
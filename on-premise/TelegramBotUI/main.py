@@ -1,11 +1,16 @@
 
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
+from aiohttp import web
 from decouple import config
 from dotenv import load_dotenv
 import os
-from routers import text_router, callback_router
+from routers import text_router, question_router, callback_router
+from handlers import db, llm_client, event_log
+from db import USER_CACHE_TTL
+from update_queue import UPDATE_QUEUE, UPDATE_WORKERS, QueueRequestHandler, UpdateWorkers, create_update_queue
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -19,17 +24,102 @@ print("Содержимое директории:", os.listdir())
 print("BOT_TOKEN из .env:", os.getenv('BOT_TOKEN'))
 print("BOT_TOKEN из config:", config('BOT_TOKEN'))
 
+# polling - один процесс сам забирает апдейты; webhook - Telegram присылает апдейты на HTTP-сервер;
+# worker - процесс только обрабатывает апдейты из общей очереди Redis, которые принимает webhook
+BOT_MODE = config('BOT_MODE', default='polling')
+# Публичный адрес сервера webhook; пустой - webhook уже установлен и setWebhook не вызывается
+WEBHOOK_URL = config('WEBHOOK_URL', default='')
+WEBHOOK_PATH = config('WEBHOOK_PATH', default='/webhook')
+WEBHOOK_SECRET = config('WEBHOOK_SECRET', default='')
+WEBHOOK_HOST = config('WEBHOOK_HOST', default='0.0.0.0')
+WEBHOOK_PORT = config('WEBHOOK_PORT', default=8080, cast=int)
+
 # Инициализация бота и диспетчера
 bot = Bot(token=config('BOT_TOKEN'))
 dp = Dispatcher()
 
 # Регистрация роутеров
 dp.include_router(text_router)
+dp.include_router(question_router)
 dp.include_router(callback_router)
 
+async def on_startup():
+    # Фоновая запись журнала событий пачками
+    event_log.start()
+
+async def on_shutdown():
+    # Незафиксированные записи в базу дописываются до выхода, события из буфера - до закрытия базы
+    await event_log.close()
+    await db.close()
+    await llm_client.close()
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+async def wait_for_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+def warn_per_process_state():
+    """С общей очередью Redis апдейты одного пользователя попадают в разные процессы"""
+    if UPDATE_QUEUE != 'redis':
+        return
+    if not USER_CACHE_TTL:
+        logging.warning("USER_CACHE_TTL=0 с UPDATE_QUEUE=redis: смена языка не дойдёт до других процессов")
+    logging.info("Очередь вопросов и её пределы действуют в каждом процессе отдельно")
+
+async def run_webhook():
+    """HTTP-сервер webhook кладёт апдейты в очередь, обработчики этого процесса её разбирают"""
+    warn_per_process_state()
+    queue = create_update_queue()
+    workers = UpdateWorkers(dp, bot, queue)
+    app = web.Application()
+    QueueRequestHandler(dp, bot, queue, secret_token=WEBHOOK_SECRET or None).register(app, path=WEBHOOK_PATH)
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    await dp.emit_startup(bot=bot)
+    workers.start()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    logging.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    await wait_for_signal()
+    # Сначала перестаём принимать апдейты, затем дорабатываем принятые, и только потом закрываем базу
+    await runner.cleanup()
+    await workers.stop()
+    await dp.emit_shutdown(bot=bot)
+    await bot.session.close()
+
+async def run_worker():
+    """Процесс без HTTP-сервера: обрабатывает апдейты из общей очереди Redis"""
+    if UPDATE_QUEUE != 'redis':
+        raise ValueError("BOT_MODE=worker needs UPDATE_QUEUE=redis: a local queue is only visible to its webhook process")
+    warn_per_process_state()
+    workers = UpdateWorkers(dp, bot, create_update_queue())
+    await dp.emit_startup(bot=bot)
+    workers.start()
+    await wait_for_signal()
+    await workers.stop()
+    await dp.emit_shutdown(bot=bot)
+    await bot.session.close()
+
 async def main():
     # Запуск бота
-    await dp.start_polling(bot)
+    if BOT_MODE == 'webhook':
+        await run_webhook()
+    elif BOT_MODE == 'worker':
+        await run_worker()
+    else:
+        await dp.start_polling(bot, tasks_concurrency_limit=UPDATE_WORKERS)
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,100 @@
+import hashlib
+import os
+from typing import Dict, List, Tuple, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+from loguru import logger
+
+
+class MediaCache:
+    """file_id картинок меню, уже загруженных в Telegram
+
+    Первая отправка загружает файл, Telegram возвращает file_id, и дальше картинка отправляется
+    по нему без повторной загрузки. file_id хранится в таблице media_cache вместе с sha256 файла:
+    если файл заменили, хэш не совпадёт и картинка загрузится заново.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        # path -> (sha256, file_id)
+        self.file_ids: Dict[str, Tuple[str, str]] = {}
+        # path -> (mtime_ns, size, sha256): файл перечитывается только после изменения
+        self.hashes: Dict[str, Tuple[int, int, str]] = {}
+        self.loaded = False
+        self.uploads = 0
+        self.reuses = 0
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+        self.hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    async def load(self):
+        if self.loaded:
+            return
+        for path, file_hash, file_id in await self.db.get_media_cache():
+            self.file_ids[path] = (file_hash, file_id)
+        self.loaded = True
+
+    def media(self, path: str) -> Union[str, FSInputFile]:
+        """file_id, если файл не менялся с последней загрузки, иначе файл для загрузки"""
+        cached = self.file_ids.get(path)
+        if cached and cached[0] == self.file_hash(path):
+            return cached[1]
+        return FSInputFile(path)
+
+    async def remember(self, paths: List[str], messages: List[Message]):
+        """Сохраняет file_id из ответа Telegram на отправку альбома"""
+        for path, message in zip(paths, messages):
+            if not message.photo:
+                continue
+            # Последний размер - оригинал; по его file_id Telegram отдаёт все размеры
+            entry = (self.file_hash(path), message.photo[-1].file_id)
+            if self.file_ids.get(path) != entry:
+                self.file_ids[path] = entry
+                await self.db.save_media(path, *entry)
+
+    async def forget(self, paths: List[str]):
+        for path in paths:
+            if self.file_ids.pop(path, None) is not None:
+                await self.db.delete_media(path)
+
+    async def answer_media_group(self, message: Message, paths: List[str], caption: str) -> List[Message]:
+        """Отправляет картинки альбомом, по возможности по file_id"""
+        await self.load()
+        media = [self.media(path) for path in paths]
+        try:
+            sent = await message.answer_media_group(media=self.build_album(media, caption))
+        except TelegramBadRequest as e:
+            if all(isinstance(item, FSInputFile) for item in media):
+                raise
+            # file_id другого бота или удалённого файла: загружаем заново
+            logger.warning(f"Cached file_id rejected ({e}), uploading {paths} again")
+            await self.forget(paths)
+            media = [FSInputFile(path) for path in paths]
+            sent = await message.answer_media_group(media=self.build_album(media, caption))
+
+        uploaded = sum(1 for item in media if isinstance(item, FSInputFile))
+        self.uploads += uploaded
+        self.reuses += len(media) - uploaded
+        if uploaded:
+            await self.remember(paths, sent)
+        return sent
+
+    def build_album(self, media: list, caption: str) -> List[InputMediaPhoto]:
+        album = []
+        for i, item in enumerate(media):
+            if i == 0:
+                album.append(InputMediaPhoto(media=item, caption=caption, parse_mode='Markdown'))
+            else:
+                album.append(InputMediaPhoto(media=item))
+        return album
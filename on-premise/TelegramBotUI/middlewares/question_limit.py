@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Message
+from decouple import config
+from loguru import logger
+
+# Вопросов одного пользователя, которые одновременно обрабатывает сервис ответов
+QUESTION_USER_CONCURRENCY = config('QUESTION_USER_CONCURRENCY', default=1, cast=int)
+# Вопросов всех пользователей одновременно: больше сервис ответов и квота LLM не выдерживают
+QUESTION_CONCURRENCY = config('QUESTION_CONCURRENCY', default=20, cast=int)
+# Ожидающих вопросов всех пользователей; сверх этого новые вопросы отклоняются
+QUESTION_QUEUE_SIZE = config('QUESTION_QUEUE_SIZE', default=200, cast=int)
+# true: у пользователя ждёт только последний вопрос, новый заменяет ожидающий;
+# false: ждут до QUESTION_USER_QUEUE вопросов по порядку
+QUESTION_COALESCE = config('QUESTION_COALESCE', default=True, cast=bool)
+QUESTION_USER_QUEUE = config('QUESTION_USER_QUEUE', default=3, cast=int)
+WAIT_WINDOW = 1000
+
+
+class Waiter:
+    """Вопрос, ожидающий свободного места"""
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class QuestionLimitMiddleware(BaseMiddleware):
+    """Справедливая очередь вопросов к сервису ответов
+
+    Одновременно обрабатывается не больше QUESTION_USER_CONCURRENCY вопросов пользователя и
+    QUESTION_CONCURRENCY вопросов всего. Остальные ждут в очереди; освободившееся место получает
+    следующий по кругу пользователь, поэтому тот, кто прислал двадцать сообщений, не задерживает остальных.
+    Очередь живёт в памяти процесса: при N процессах на общей очереди Redis пределы действуют в каждом,
+    и пользователь может получить до N * QUESTION_USER_CONCURRENCY вопросов в работе.
+    """
+
+    def __init__(self, per_user: int = QUESTION_USER_CONCURRENCY, concurrency: int = QUESTION_CONCURRENCY,
+                 queue_size: int = QUESTION_QUEUE_SIZE, coalesce: bool = QUESTION_COALESCE,
+                 user_queue: int = QUESTION_USER_QUEUE):
+        self.per_user = per_user
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.coalesce = coalesce
+        self.user_queue = user_queue
+        self.active = 0
+        self.user_active: Dict[int, int] = {}
+        # Пользователи в порядке обхода: у каждого своя очередь вопросов
+        self.waiting: "OrderedDict[int, Deque[Waiter]]" = OrderedDict()
+        self.waiting_count = 0
+        self.wait_times = deque(maxlen=WAIT_WINDOW)
+        self.started = 0
+        self.queued = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        user_id = event.from_user.id
+        notice = None
+        if user_id not in self.waiting and self.can_start(user_id):
+            self.acquire(user_id, 0.0)
+        else:
+            waiter = self.enqueue(user_id, event)
+            if waiter is None:
+                self.rejected += 1
+                await event.answer("⚠️ Слишком много вопросов в очереди, попробуйте через минуту")
+                return None
+            started, notice = await self.wait(waiter)
+            if not started:
+                await self.update_notice(notice, "⏭ Отвечу на ваш следующий вопрос")
+                return None
+        try:
+            if notice is not None:
+                await self.update_notice(notice, None)
+            return await handler(event, data)
+        finally:
+            self.release(user_id)
+
+    def can_start(self, user_id: int) -> bool:
+        return self.active < self.concurrency and self.user_active.get(user_id, 0) < self.per_user
+
+    def acquire(self, user_id: int, waited: float):
+        self.active += 1
+        self.user_active[user_id] = self.user_active.get(user_id, 0) + 1
+        self.started += 1
+        self.wait_times.append(waited)
+
+    def release(self, user_id: int):
+        self.active -= 1
+        self.user_active[user_id] -= 1
+        if not self.user_active[user_id]:
+            del self.user_active[user_id]
+        self.dispatch()
+
+    def enqueue(self, user_id: int, message: Message) -> Optional[Waiter]:
+        queue = self.waiting.get(user_id)
+        if queue and self.coalesce:
+            # Ожидающий вопрос заменяется новым на том же месте в очереди
+            previous = queue.pop()
+            previous.future.set_result(False)
+            self.coalesced += 1
+            self.waiting_count -= 1
+        elif self.waiting_count >= self.queue_size or (queue and len(queue) >= self.user_queue):
+            return None
+        waiter = Waiter(message)
+        self.waiting.setdefault(user_id, deque()).append(waiter)
+        self.waiting_count += 1
+        self.queued += 1
+        return waiter
+
+    def dispatch(self):
+        """Отдаёт свободные места ожидающим: по одному вопросу каждому пользователю по кругу"""
+        for user_id in list(self.waiting):
+            if self.active >= self.concurrency:
+                return
+            if self.user_active.get(user_id, 0) >= self.per_user:
+                continue
+            queue = self.waiting.pop(user_id)
+            waiter = queue.popleft()
+            self.waiting_count -= 1
+            if queue:
+                # Пользователь с оставшимися вопросами уходит в конец круга
+                self.waiting[user_id] = queue
+            self.acquire(user_id, time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(True)
+
+    def position(self, waiter: Waiter) -> int:
+        """Примерное место в очереди: вопросы, ожидающие дольше этого"""
+        return 1 + sum(1 for queue in self.waiting.values() for other in queue
+                       if other.enqueued_at < waiter.enqueued_at)
+
+    async def wait(self, waiter: Waiter) -> Tuple[bool, Optional[Message]]:
+        """Ждёт места: (False, ...) - вопрос заменён более новым и обрабатываться не будет"""
+        notice = None
+        try:
+            try:
+                notice = await waiter.message.answer(f"⏳ Вопрос в очереди, место {self.position(waiter)}")
+            except TelegramAPIError as e:
+                logger.warning(f"Не удалось сообщить место в очереди: {e}")
+            return await waiter.future, notice
+        except asyncio.CancelledError:
+            self.cancel(waiter)
+            raise
+
+    async def update_notice(self, notice: Optional[Message], text: Optional[str]):
+        """Сообщение о месте в очереди удаляется, когда вопрос начал обрабатываться, или заменяется текстом"""
+        if notice is None:
+            return
+        try:
+            if text is None:
+                await notice.delete()
+            else:
+                await notice.edit_text(text)
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить сообщение об очереди: {e}")
+
+    def cancel(self, waiter: Waiter):
+        user_id = waiter.message.from_user.id
+        if waiter.future.done() and waiter.future.result():
+            # Место уже выдано, но обработчик не запустится
+            self.release(user_id)
+            return
+        queue = self.waiting.get(user_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.waiting_count -= 1
+            if not queue:
+                del self.waiting[user_id]
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+
+        def percentile(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))], 2) if waits else 0.0
+
+        return {
+            "active": self.active,
+            "waiting": self.waiting_count,
+            "started": self.started,
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "wait_p50_s": percentile(0.5),
+            "wait_p95_s": percentile(0.95),
+            "wait_max_s": round(waits[-1], 2) if waits else 0.0,
+        }
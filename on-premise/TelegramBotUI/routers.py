@@ -3,18 +3,25 @@ from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from handlers import (
     start, process_language_callback, process_callback,
-    info, stat, handle_text
+    info, stat, top, latency, failures, handle_text, question_limit
 )
 
 # Создаем роутеры
 text_router = Router()
+question_router = Router()
 callback_router = Router()
 
 # Регистрируем обработчики для текстовых сообщений
 text_router.message.register(start, Command("start"))
 text_router.message.register(info, Command("info"))
 text_router.message.register(stat, Command("stat"))
-text_router.message.register(handle_text, F.text)
+text_router.message.register(top, Command("top"))
+text_router.message.register(latency, Command("latency"))
+text_router.message.register(failures, Command("failures"))
+
+# Вопросы к сервису ответов проходят через очередь: middleware роутера срабатывает только для его обработчиков
+question_router.message.middleware(question_limit)
+question_router.message.register(handle_text, F.text)
 
 # Регистрируем обработчики для callback-запросов
 callback_router.callback_query.register(process_language_callback, F.data.startswith('lang_'))
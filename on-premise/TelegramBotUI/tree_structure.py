@@ -1,8 +1,10 @@
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from db import Database as db
+from config import BACK_BUTTON_FILE
 import json
 import os
 
@@ -73,13 +75,16 @@ class Node:
 
 class ButtonTree:
     """Класс для работы с деревом кнопок"""
-    def __init__(self, root: Node):
+    def __init__(self, root: Node, back_button_texts: Dict[str, Any] = None, languages: List[str] = None):
         self.root = root
         self.nodes = {}
         self._build_node_dict(root)
-        # Загружаем тексты кнопки "Назад"
-        with open('input_files/back_button.json', 'r', encoding='utf-8') as f:
-            self.back_button_texts = json.load(f)
+        # Тексты кнопки "Назад" читаются с диска один раз на процесс, а не на каждое дерево
+        self.back_button_texts = back_button_texts or load_back_button_texts()
+        # Клавиатура зависит только от узла и языка, поэтому строится один раз: (callback_data, lang) -> markup
+        self.keyboards: Dict[Tuple[str, str], InlineKeyboardMarkup] = {}
+        for lang in languages or []:
+            self.precompile(lang)
 
     def _build_node_dict(self, node: Node):
         """Строит карту callback -> node и массив ключей"""
@@ -88,16 +93,33 @@ class ButtonTree:
             self._build_node_dict(child)
 
     @classmethod
-    def from_json(cls, json_data: Dict[str, Any]) -> 'ButtonTree':
+    def from_json(cls, json_data: Dict[str, Any], back_button_texts: Dict[str, Any] = None,
+                  languages: List[str] = None) -> 'ButtonTree':
         """Создание дерева из JSON данных"""
         root = Node.from_dict(json_data)
-        return cls(root)
+        return cls(root, back_button_texts, languages)
 
     def get_node(self, callback_data: str) -> Optional[Node]:
         """Получить узел по callback_data"""
         return self.nodes.get(callback_data)
 
+    def precompile(self, lang: str):
+        """Строит клавиатуры всех узлов дерева для языка"""
+        for callback_data, node in self.nodes.items():
+            self.keyboards[(callback_data, lang)] = self.build_keyboard(node, lang)
+
     def create_keyboard(self, node: Node, user_id: int = None, lang: str = 'en') -> InlineKeyboardMarkup:
+        """Клавиатура для узла из заранее построенных; для незнакомого языка строится и запоминается"""
+        if self.nodes.get(node.callback_data) is not node:
+            # Узел с повторяющимся callback_data не попал в карту узлов: ключ кэша ему не принадлежит
+            return self.build_keyboard(node, lang)
+        key = (node.callback_data, lang)
+        keyboard = self.keyboards.get(key)
+        if keyboard is None:
+            keyboard = self.keyboards[key] = self.build_keyboard(node, lang)
+        return keyboard
+
+    def build_keyboard(self, node: Node, lang: str = 'en') -> InlineKeyboardMarkup:
         """Создает клавиатуру для узла"""
         builder = InlineKeyboardBuilder()
         
@@ -117,4 +139,10 @@ class ButtonTree:
             builder.button(text=main_menu_text, callback_data="main_menu")
         
         builder.adjust(2)
-        return builder.as_markup()
\ No newline at end of file
+        return builder.as_markup()
+
+
+@lru_cache(maxsize=None)
+def load_back_button_texts() -> Dict[str, Any]:
+    with open(BACK_BUTTON_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
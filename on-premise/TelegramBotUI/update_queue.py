@@ -0,0 +1,164 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from decouple import config
+from loguru import logger
+
+# local - очередь в памяти процесса с webhook; redis - общий список, который разбирают все процессы
+UPDATE_QUEUE = config('UPDATE_QUEUE', default='local')
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+UPDATE_QUEUE_KEY = config('UPDATE_QUEUE_KEY', default='telegram:updates')
+# Апдейтов в локальной очереди; когда она полна, webhook отвечает Telegram с задержкой
+UPDATE_QUEUE_SIZE = config('UPDATE_QUEUE_SIZE', default=10000, cast=int)
+# Апдейтов, которые процесс обрабатывает одновременно
+UPDATE_WORKERS = config('UPDATE_WORKERS', default=64, cast=int)
+# Сколько секунд при остановке ждать завершения начатых апдейтов
+UPDATE_DRAIN_TIMEOUT = config('UPDATE_DRAIN_TIMEOUT', default=30, cast=float)
+# Как часто обработчик без работы проверяет, не пора ли остановиться
+POLL_INTERVAL = 1
+
+
+class LocalUpdateQueue:
+    """Очередь апдейтов в памяти: webhook и обработчики в одном процессе"""
+
+    def __init__(self, max_size: int = UPDATE_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=max_size)
+
+    async def put(self, update: Dict[str, Any]):
+        await self.queue.put(update)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def size(self) -> int:
+        return self.queue.qsize()
+
+    async def close(self):
+        pass
+
+
+class RedisUpdateQueue:
+    """Очередь апдейтов в списке Redis (или совместимого сервера): её разбирают все процессы бота
+
+    Апдейт забирает ровно один процесс (BRPOP). Если процесс упал во время обработки, апдейт
+    теряется так же, как при обычном polling; при штатной остановке начатые апдейты дорабатываются.
+    """
+
+    def __init__(self, url: str = REDIS_URL, key: str = UPDATE_QUEUE_KEY):
+        # redis нужен только в этом режиме
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.key = key
+
+    async def put(self, update: Dict[str, Any]):
+        await self.redis.lpush(self.key, json.dumps(update, ensure_ascii=False))
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        item = await self.redis.brpop([self.key], timeout=timeout)
+        if item is None:
+            return None
+        return json.loads(item[1])
+
+    def size(self) -> Optional[int]:
+        # Длина общего списка - в Redis; локально известна только своя работа
+        return None
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_update_queue():
+    if UPDATE_QUEUE == 'redis':
+        return RedisUpdateQueue()
+    if UPDATE_QUEUE != 'local':
+        raise ValueError(f"Unknown UPDATE_QUEUE: {UPDATE_QUEUE}")
+    return LocalUpdateQueue()
+
+
+class UpdateWorkers:
+    """Обработчики апдейтов из очереди: UPDATE_WORKERS корутин передают апдейты в диспетчер
+
+    Остановка не прерывает начатые апдейты: обработчики перестают брать новые и дорабатывают свои.
+    Локальная очередь существует только в памяти, поэтому её остаток тоже дорабатывается до выхода.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, queue, workers: int = UPDATE_WORKERS):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.queue = queue
+        self.workers = workers
+        self.tasks = []
+        self.stopping = False
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        logger.info(f"Запущено обработчиков апдейтов: {self.workers}, очередь {type(self.queue).__name__}")
+
+    async def work(self):
+        while True:
+            if self.stopping and not (isinstance(self.queue, LocalUpdateQueue) and self.queue.size()):
+                return
+            update = await self.queue.get(POLL_INTERVAL)
+            if update is None:
+                continue
+            self.in_flight += 1
+            try:
+                result = await self.dispatcher.feed_raw_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}")
+            finally:
+                self.in_flight -= 1
+
+    async def stop(self, timeout: float = UPDATE_DRAIN_TIMEOUT):
+        self.stopping = True
+        logger.info(f"Остановка: дорабатываются {self.in_flight} апдейтов")
+        done, pending = await asyncio.wait(self.tasks, timeout=timeout) if self.tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Не доработаны за {timeout:.0f} с: {self.in_flight} апдейтов")
+        await self.queue.close()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": self.queue.size(),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+class QueueRequestHandler(SimpleRequestHandler):
+    """Webhook aiogram, который только кладёт апдейт в очередь и сразу отвечает Telegram"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, queue, secret_token: Optional[str] = None):
+        super().__init__(dispatcher=dispatcher, bot=bot, secret_token=secret_token)
+        self.queue = queue
+
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        await self.queue.put(await request.json(loads=bot.session.json_loads))
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self):
+        # Сессию бота закрывает main.py после того, как обработчики доработают апдейты
+        pass